@@ -1,742 +1,974 @@
 import streamlit as st
 import os
-import glob
 import importlib.util
 import datetime
 import time
-import concurrent.futures
-from code_editor import code_editor
-import shutil
-import pandas as pd
+from contextlib import nullcontext
 
 # --- ИМПОРТЫ ---
+# Тяжелые зависимости (pandas, code_editor, мастера, синхронизация, SDK моделей и Google)
+# импортируются там, где используются: первый экран не ждет того, что пользователь не открыл.
 from modules.settings import *
 from modules.utils import load_json, save_json
-from modules.data_loader import sync_single_source
-from modules.wizards import wizard_create_chart, wizard_manage_sources, wizard_manage_pages, wizard_manage_llm
 
 # !!! НОВЫЕ ИМПОРТЫ ДЛЯ ИНТЕГРАЦИЙ !!!
-from modules.llm_manager import get_providers, ask_llm
+from modules.llm_manager import get_providers, ask_llm_stream, LLMError
+from modules.chart_runtime import validate_chart_code, build_render_args, run_chart_sandboxed
+from modules.code_patch import EDIT_FORMAT_PROMPT, REFACTOR_SYSTEM_PROMPT, build_refactor_prompt, PatchError, split_header, parse_edit_blocks, apply_edit_blocks, estimate_tokens
 from modules.auth import is_authenticated, logout_user, login_redirect, check_auth_code
+from modules.profiling import RenderProfiler, render_profile_panel
+from modules.profiling import start_rerun_profile, finish_rerun_profile, request_rerun_profile, render_rerun_profile_panel
+
+# Профилирование прохода по запросу (кнопка "🔬" в сайдбаре). Когда выключено — None.
+_rerun_prof = start_rerun_profile()
+_run_error = None
+
+# Тело прохода — в try: профилировщик останавливается при любом завершении (st.rerun(), st.stop(), исключение)
+try:
+    # --- INIT ---
+    titles_conf_init = load_json(TITLES_CONFIG_FILE, {})
+    APP_TITLE = titles_conf_init.get("app_title", "GenAI DashBoard v0.1")
+
+    # --- 2. INIT ---
+    st.set_page_config(page_title=APP_TITLE, layout="wide")
+    init_project_structure()
+
+    # ==================== SIDEBAR ====================
+    with st.sidebar:
+        # --- ИСПОЛЬЗУЕМ ДИНАМИЧЕСКОЕ НАЗВАНИЕ ---
+        st.title(f"📊 {APP_TITLE}")
+
+    # !!! ВАЖНО: ПРОВЕРКА КОДА ОТ GOOGLE !!!
+    check_auth_code()
+    # -------------------------------------
+
+    # --- HELPER: SYNC TASK ---
+
+    def with_google_creds(src):
+        """Копия источника для фоновой синхронизации: токен Google из сессии (в потоке пула session_state нет)."""
+        task = src.copy()
+        task["config"] = src.get("config", {}).copy()
+        if "google_creds" in st.session_state:
+            task["config"]["_injected_creds"] = st.session_state.google_creds
+        return task
+
+    # --- LOAD CONFIGS ---
+    s_conf = load_json(SOURCES_CONFIG_FILE, {})
+    pages_conf = load_json(PAGES_CONFIG_FILE, {})
+    titles_conf = load_json(TITLES_CONFIG_FILE, {}) 
+    app_settings = load_json(APP_SETTINGS_FILE, {})
+
+    if "General" in pages_conf:
+        pages_conf["Главная страница"] = pages_conf.pop("General")
+        save_json(PAGES_CONFIG_FILE, pages_conf)
+
+    if not pages_conf:
+        all_charts = sorted([f for f in os.listdir(CHARTS_FOLDER) if f.endswith(".py")])
+        pages_conf = {"Главная страница": all_charts}
+        save_json(PAGES_CONFIG_FILE, pages_conf)
+
+    # --- HELPER: FORMAT TITLE ---
+    def get_chart_display_name(filename):
+        return titles_conf.get(filename, filename)
+
+    # ==================== SIDEBAR ====================
+    # ==================== SIDEBAR ====================
+    with st.sidebar:
+        # --- 1. ВЫБОР ДАШБОРДА ---
+        st.header("📑 Дашборды")
+
+        page_names = list(pages_conf.keys())
+
+        # Логика выбора страницы через URL или по умолчанию
+        query_params = st.query_params
+        default_index = 0
+        if "page" in query_params:
+            url_page = query_params["page"]
+            if url_page in page_names:
+                default_index = page_names.index(url_page)
+
+        current_page = st.selectbox(
+            "Выберите страницу:", 
+            page_names, 
+            index=default_index, 
+            label_visibility="collapsed"
+        )
+
+        # Обновляем URL
+        st.query_params["page"] = current_page
+
+        # --- ПАНЕЛЬ УПРАВЛЕНИЯ СТРАНИЦЕЙ (Rename + Settings) ---
+        c_info, c_ren, c_set = st.columns([0.6, 0.2, 0.2], vertical_alignment="center")
+
+        # 1. Информация о кол-ве графиков
+        c_info.caption(f"Графиков: {len(pages_conf.get(current_page, []))}")
+
+        # 2. Кнопка ПЕРЕИМЕНОВАТЬ (✏️)
+        with c_ren:
+            with st.popover("✏️", help="Переименовать эту страницу", use_container_width=True):
+                st.write(f"**Переименовать**")
+                new_page_name = st.text_input("Название:", value=current_page, key="new_page_name_input")
+
+                if st.button("Сохранить", type="primary", use_container_width=True):
+                    if not new_page_name:
+                        st.error("Имя не может быть пустым")
+                    elif new_page_name in pages_conf and new_page_name != current_page:
+                        st.error("Такое имя уже есть!")
+                    elif new_page_name == current_page:
+                        st.info("Имя не изменилось")
+                    else:
+                        # Магия смены ключа в словаре
+                        pages_conf[new_page_name] = pages_conf.pop(current_page)
+                        save_json(PAGES_CONFIG_FILE, pages_conf)
 
-# --- INIT ---
-titles_conf_init = load_json(TITLES_CONFIG_FILE, {})
-APP_TITLE = titles_conf_init.get("app_title", "GenAI DashBoard v0.1")
-
-# --- 2. INIT ---
-st.set_page_config(page_title=APP_TITLE, layout="wide")
-init_project_structure()
-
-# ==================== SIDEBAR ====================
-with st.sidebar:
-    # --- ИСПОЛЬЗУЕМ ДИНАМИЧЕСКОЕ НАЗВАНИЕ ---
-    st.title(f"📊 {APP_TITLE}")
-
-# !!! ВАЖНО: ПРОВЕРКА КОДА ОТ GOOGLE !!!
-check_auth_code()
-# -------------------------------------
-
-# --- HELPER: PARALLEL UPDATE ---
-
-def run_updates_in_parallel(sources_to_update, ui_placeholders):
-    results_log = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_source = {
-            executor.submit(sync_single_source, src): (i, src) 
-            for i, src in sources_to_update.items()
-        }
-        for future in concurrent.futures.as_completed(future_to_source):
-            idx, src = future_to_source[future]
-            fname = src.get('filename')
-            container = ui_placeholders[idx]
-            try:
-                ok, msg, _ = future.result()
-                if ok:
-                    container.success(f"✅ {fname}")
-                    results_log.append(f"✅ {fname}: OK")
-                else:
-                    # --- ИСПРАВЛЕНИЕ: Выводим текст ошибки (msg) ---
-                    container.error(f"❌ {fname}\n\n**Ошибка:** `{msg}`")
-                    results_log.append(f"❌ {fname}: {msg}")
-            except Exception as e:
-                container.error(f"❌ {fname}: {e}")
-                results_log.append(f"❌ {fname}: {e}")
-    return results_log
-
-# --- LOAD CONFIGS ---
-s_conf = load_json(SOURCES_CONFIG_FILE, {})
-pages_conf = load_json(PAGES_CONFIG_FILE, {})
-titles_conf = load_json(TITLES_CONFIG_FILE, {}) 
-
-if "General" in pages_conf:
-    pages_conf["Главная страница"] = pages_conf.pop("General")
-    save_json(PAGES_CONFIG_FILE, pages_conf)
-
-if not pages_conf:
-    all_charts = sorted([f for f in os.listdir(CHARTS_FOLDER) if f.endswith(".py")])
-    pages_conf = {"Главная страница": all_charts}
-    save_json(PAGES_CONFIG_FILE, pages_conf)
-
-# --- HELPER: FORMAT TITLE ---
-def get_chart_display_name(filename):
-    return titles_conf.get(filename, filename)
-
-# ==================== SIDEBAR ====================
-# ==================== SIDEBAR ====================
-with st.sidebar:
-    # --- 1. ВЫБОР ДАШБОРДА ---
-    st.header("📑 Дашборды")
-    
-    page_names = list(pages_conf.keys())
-    
-    # Логика выбора страницы через URL или по умолчанию
-    query_params = st.query_params
-    default_index = 0
-    if "page" in query_params:
-        url_page = query_params["page"]
-        if url_page in page_names:
-            default_index = page_names.index(url_page)
-
-    current_page = st.selectbox(
-        "Выберите страницу:", 
-        page_names, 
-        index=default_index, 
-        label_visibility="collapsed"
-    )
-    
-    # Обновляем URL
-    st.query_params["page"] = current_page
-    
-    # --- ПАНЕЛЬ УПРАВЛЕНИЯ СТРАНИЦЕЙ (Rename + Settings) ---
-    c_info, c_ren, c_set = st.columns([0.6, 0.2, 0.2], vertical_alignment="center")
-    
-    # 1. Информация о кол-ве графиков
-    c_info.caption(f"Графиков: {len(pages_conf.get(current_page, []))}")
-
-    # 2. Кнопка ПЕРЕИМЕНОВАТЬ (✏️)
-    with c_ren:
-        with st.popover("✏️", help="Переименовать эту страницу", use_container_width=True):
-            st.write(f"**Переименовать**")
-            new_page_name = st.text_input("Название:", value=current_page, key="new_page_name_input")
-            
-            if st.button("Сохранить", type="primary", use_container_width=True):
-                if not new_page_name:
-                    st.error("Имя не может быть пустым")
-                elif new_page_name in pages_conf and new_page_name != current_page:
-                    st.error("Такое имя уже есть!")
-                elif new_page_name == current_page:
-                    st.info("Имя не изменилось")
-                else:
-                    # Магия смены ключа в словаре
-                    pages_conf[new_page_name] = pages_conf.pop(current_page)
-                    save_json(PAGES_CONFIG_FILE, pages_conf)
-                    
-                    # Обновляем URL и перезагружаем
-                    st.query_params["page"] = new_page_name
-                    st.toast(f"✅ Переименовано в '{new_page_name}'")
-                    time.sleep(0.5)
-                    st.rerun()
+                        # Обновляем URL и перезагружаем
+                        st.query_params["page"] = new_page_name
+                        st.toast(f"✅ Переименовано в '{new_page_name}'")
+                        time.sleep(0.5)
+                        st.rerun()
+
+        # 3. Кнопка НАСТРОЙКИ (⚙️) - управление составом графиков
+        if c_set.button("⚙️", help="Добавить/Удалить графики на странице", use_container_width=True):
+            from modules.wizards import wizard_manage_pages
+            wizard_manage_pages()
 
-    # 3. Кнопка НАСТРОЙКИ (⚙️) - управление составом графиков
-    if c_set.button("⚙️", help="Добавить/Удалить графики на странице", use_container_width=True):
-        wizard_manage_pages()
-
-    st.divider()
-    # --- 2. ДАННЫЕ (NEW DESIGN: CONTROL CENTER) ---
-    # --- 2. ДАННЫЕ (SCROLLABLE LIST) ---
-    if GUIDE_URL: st.link_button("📘 Инструкция", GUIDE_URL, use_container_width=True)
-    
-    c_h1, c_h2 = st.columns([0.7, 0.3], vertical_alignment="center")
-    c_h1.header("☁️ Данные")
-    
-# 1. AUTH POPOVER
-    with st.popover("🔐 Настройка доступа (Google)", use_container_width=True):
-        st.write("**Статус подключений**")
-        
-        if is_authenticated():
-            st.success("Google: ✅ OK")
-            
-            # Проверка: если токен лежит на диске - пугаем пользователя
-            if os.path.exists(USER_TOKEN_FILE):
-                st.warning("Ваш личный токен сохранен в файле `user_token.json`.", icon="⚠️")
-                st.caption("🔴 **НИКОГДА НЕ ПЕРЕДАВАЙТЕ ЭТОТ ФАЙЛ НИКОМУ!** Он дает полный доступ к вашим таблицам.")
-            
-            if st.button("Выйти (и удалить токен)", use_container_width=True):
-                logout_user() # Это теперь удаляет и файл
-        else:
-            st.error("Google: ❌ Off")
-            login_redirect() # Рисует кнопку входа
-            
         st.divider()
-        st.caption("Настройки в меню ⚙️")
+        # --- 2. ДАННЫЕ (NEW DESIGN: CONTROL CENTER) ---
+        # --- 2. ДАННЫЕ (SCROLLABLE LIST) ---
+        if GUIDE_URL: st.link_button("📘 Инструкция", GUIDE_URL, use_container_width=True)
 
-    # 2. СПИСОК ИСТОЧНИКОВ (Scrollable)
-    def get_conn_icon(c_id):
-        icons = {"google_sheets": "📄", "ytsaurus": "🦖", "superset": "📊", "base": "📁"}
-        return icons.get(c_id, "❓")
+        c_h1, c_h2 = st.columns([0.7, 0.3], vertical_alignment="center")
+        c_h1.header("☁️ Данные")
 
-    active_sources = [s for s in s_conf.get("sources", []) if s.get("active", True)]
-    status_placeholders = {}
+    # 1. AUTH POPOVER
+        with st.popover("🔐 Настройка доступа (Google)", use_container_width=True):
+            st.write("**Статус подключений**")
 
-    search_q = st.text_input("Поиск источника", placeholder="🔍 Найти файл...", label_visibility="collapsed")
+            if is_authenticated():
+                st.success("Google: ✅ OK")
 
-    with st.container(height=200, border=True):
-        if not active_sources:
-            st.caption("Нет источников.")
-        else:
-            c_n, c_act = st.columns([0.75, 0.25])
-            c_n.caption("**Источник**")
-            c_act.caption("**Обн.**")
-            
-            for i, src in enumerate(active_sources):
-                fname = src.get('filename', 'no_name')
-                if search_q and (search_q.lower() not in fname.lower()): continue
-
-                c_id = src.get("connector_id", "base")
-                icon = get_conn_icon(c_id)
-                
-                r_c1, r_c2 = st.columns([0.75, 0.25], vertical_alignment="center")
-                display_name = (fname[:16] + '..') if len(fname) > 18 else fname
-                r_c1.markdown(f"{icon} `{display_name}`", help=f"{c_id}: {fname}")
-                
-                # КНОПКА ОБНОВЛЕНИЯ ОДНОГО ФАЙЛА
-                if r_c2.button("↻", key=f"upd_s_{i}"):
-                    status_placeholders[i] = st.empty()
-                    status_placeholders[i].info("⏳")
-                    
-                    # --- FIX: Подготовка задачи с кредами ---
-                    task_src = src.copy()
-                    task_src["config"] = src.get("config", {}).copy()
-                    if "google_creds" in st.session_state:
-                        task_src["config"]["_injected_creds"] = st.session_state.google_creds
-                    # ----------------------------------------
-
-                    logs = run_updates_in_parallel({i: task_src}, status_placeholders)
-                    
-                    if not any("❌" in log for log in logs):
-                        time.sleep(0.5); st.rerun()
-                    else:
-                        st.toast(f"Ошибка: {fname}", icon="❌")
-
-                if i not in status_placeholders:
-                    status_placeholders[i] = st.empty()
-
-    # 3. КНОПКИ ДЕЙСТВИЙ
-    c_all, c_set = st.columns([0.7, 0.3])
-    
-    if c_all.button("🚀 Обновить ВСЕ", type="primary", use_container_width=True):
-        for i in range(len(active_sources)): status_placeholders[i].info("⏳")
-        
-        # --- FIX: Подготовка ВСЕХ задач с кредами ---
-        tasks = {}
-        creds = st.session_state.get("google_creds")
-        
-        for i, src in enumerate(active_sources):
-            s_copy = src.copy()
-            s_copy["config"] = src.get("config", {}).copy()
-            if creds:
-                s_copy["config"]["_injected_creds"] = creds
-            tasks[i] = s_copy
-        # --------------------------------------------
-        
-        logs = run_updates_in_parallel(tasks, status_placeholders)
-        
-        s_conf["last_updated"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_json(SOURCES_CONFIG_FILE, s_conf)
-        
-        if not any("❌" in log for log in logs):
-            st.toast("✅ Готово!"); time.sleep(1); st.rerun()
-        else: st.warning("Ошибки в логе.")
-
-    if c_set.button("⚙️", help="Настройки", use_container_width=True): 
-        wizard_manage_sources()
-        
-    if "last_updated" in s_conf:
-        st.caption(f"Last update: {s_conf['last_updated']}")
-
-    st.divider()
-    
-    # --- 3. AI НАСТРОЙКИ ---
-    st.header("🧠 AI Настройки")
-    if st.button("⚙️ Управление моделями", use_container_width=True):
-        wizard_manage_llm()
-    st.divider()
-
-    # --- 4. ГРАФИКИ ---
-    st.header("📊 Графики")
-    if st.button("➕ Новый график", use_container_width=True): wizard_create_chart()
-
-    page_charts = pages_conf.get(current_page, [])
-    existing_charts = [f for f in page_charts if os.path.exists(os.path.join(CHARTS_FOLDER, f))]
-    
-    sel_charts = st.multiselect(
-        "Показать на экране:", 
-        existing_charts, 
-        default=existing_charts, 
-        label_visibility="collapsed",
-        format_func=get_chart_display_name 
-    )
-
-    with st.expander("📂 Файлы и Связи"):
-        st.write("**Файлы данных:**")
-        up = st.file_uploader("Upload", type=["csv", "xlsx"], label_visibility="collapsed")
-        if up:
-            with open(os.path.join(DATA_FOLDER, up.name), "wb") as f: f.write(up.getbuffer())
+                # Проверка: если токен лежит на диске - пугаем пользователя
+                if os.path.exists(USER_TOKEN_FILE):
+                    st.warning("Ваш личный токен сохранен в файле `user_token.json`.", icon="⚠️")
+                    st.caption("🔴 **НИКОГДА НЕ ПЕРЕДАВАЙТЕ ЭТОТ ФАЙЛ НИКОМУ!** Он дает полный доступ к вашим таблицам.")
+
+                if st.button("Выйти (и удалить токен)", use_container_width=True):
+                    logout_user() # Это теперь удаляет и файл
+            else:
+                st.error("Google: ❌ Off")
+                login_redirect() # Рисует кнопку входа
+
+            st.divider()
+            st.caption("Настройки в меню ⚙️")
+
+        # 2. СПИСОК ИСТОЧНИКОВ (Scrollable)
+        def get_conn_icon(c_id):
+            icons = {"google_sheets": "📄", "ytsaurus": "🦖", "superset": "📊", "base": "📁"}
+            return icons.get(c_id, "❓")
+
+        active_sources = [s for s in s_conf.get("sources", []) if s.get("active", True)]
+
+        # Поиск и сортировка — по индексу (modules/browser_index.py), виджеты — только для текущей страницы
+        from modules.browser_index import get_sources_index, data_folder_state, paginate, format_age, SORT_OPTIONS
+        files_state = data_folder_state()
+        sources_index = get_sources_index(active_sources, files_state)
+
+        search_q = st.text_input("Поиск источника", placeholder="🔍 Найти файл...", label_visibility="collapsed")
+        f_conn, f_sort = st.columns(2)
+        conn_filter = f_conn.selectbox("Тип", [None] + sorted({s.get("connector_id", "base") for s in active_sources}),
+                                       format_func=lambda c: "Все типы" if c is None else f"{get_conn_icon(c)} {c}",
+                                       label_visibility="collapsed", key="src_conn_filter")
+        src_sort = f_sort.selectbox("Порядок", list(SORT_OPTIONS), format_func=SORT_OPTIONS.get,
+                                    label_visibility="collapsed", key="src_sort")
+        found_sources = sources_index.search(search_q, connector=conn_filter, sort=src_sort)
+
+        # Новый запрос/фильтр — с первой страницы
+        src_view = (search_q, conn_filter, src_sort)
+        if st.session_state.get("src_view") != src_view:
+            st.session_state.src_view = src_view
+            st.session_state.src_page = 0
+        page_sources, st.session_state.src_page, src_pages = paginate(found_sources, st.session_state.get("src_page", 0))
+
+        # Синхронизация идет в фоне (modules/sync_jobs.py): пока есть активные задачи, список
+        # перерисовывается раз в секунду сам по себе, остальная страница не перезапускается
+        from modules.sync_jobs import submit_syncs, cancel_sync, get_sync_jobs, format_job, DONE_VISIBLE_SEC
+        sync_polling = bool(get_sync_jobs(active_only=True))
+
+        @st.fragment(run_every=1 if sync_polling else None)
+        def sources_panel():
+            sync_jobs = get_sync_jobs()
+            if sync_polling and not any(j["status"] in ("queued", "running") for j in sync_jobs.values()):
+                # Все задачи завершились — полный проход: новые данные в графиках, опрос выключается
+                st.rerun()
+
+            with st.container(height=200, border=True):
+                if not active_sources:
+                    st.caption("Нет источников.")
+                elif not found_sources:
+                    st.caption("Ничего не найдено.")
+                else:
+                    c_n, c_act = st.columns([0.75, 0.25])
+                    c_n.caption("**Источник**")
+                    c_act.caption("**Обн.**")
+
+                    for item in page_sources:
+                        i = item["idx"]
+                        src = active_sources[i]
+                        fname = src.get('filename', 'no_name')
+                        job = sync_jobs.get(fname)
+                        running = job is not None and job["status"] in ("queued", "running")
+
+                        c_id = src.get("connector_id", "base")
+                        icon = get_conn_icon(c_id)
+
+                        r_c1, r_c2 = st.columns([0.75, 0.25], vertical_alignment="center")
+                        display_name = (fname[:16] + '..') if len(fname) > 18 else fname
+                        r_c1.markdown(f"{icon} `{display_name}`", help=f"{c_id}: {fname} · обновлен: {format_age(item['updated'])}")
+
+                        # ОБНОВЛЕНИЕ ОДНОГО ФАЙЛА / ОТМЕНА
+                        if running:
+                            if r_c2.button("⏹", key=f"cancel_s_{i}", help="Остановить"):
+                                cancel_sync(fname)
+                                st.rerun(scope="fragment")
+                        elif r_c2.button("↻", key=f"upd_s_{i}"):
+                            submit_syncs([with_google_creds(src)])
+                            st.rerun()  # Полный проход — включить опрос фрагмента
+
+                        if job is None:
+                            continue
+                        if running:
+                            st.caption(format_job(job))
+                        elif job["status"] == "done":
+                            if time.time() - (job["finished"] or 0) < DONE_VISIBLE_SEC:
+                                st.caption(format_job(job))
+                        elif job["status"] == "cancelled":
+                            st.caption(format_job(job))
+                        else:
+                            st.error(f"❌ {fname}\n\n**Ошибка:** `{job['message']}`")
+
+            if src_pages > 1:
+                p_prev, p_info, p_next = st.columns([0.25, 0.5, 0.25], vertical_alignment="center")
+                if p_prev.button("◀", key="src_prev", disabled=st.session_state.src_page == 0, use_container_width=True):
+                    st.session_state.src_page -= 1; st.rerun()
+                p_info.caption(f"{st.session_state.src_page + 1} / {src_pages} · {len(found_sources)} шт.")
+                if p_next.button("▶", key="src_next", disabled=st.session_state.src_page >= src_pages - 1, use_container_width=True):
+                    st.session_state.src_page += 1; st.rerun()
+
+            # 3. КНОПКИ ДЕЙСТВИЙ
+            active_jobs = [j for j in sync_jobs.values() if j["status"] in ("queued", "running")]
+            if active_jobs:
+                st.caption(f"⏳ Обновляется: {len(active_jobs)} · можно смотреть графики")
+                if st.button("⏹ Остановить все", use_container_width=True):
+                    cancel_sync()
+                    st.rerun(scope="fragment")
+            elif st.button("🚀 Обновить ВСЕ", type="primary", use_container_width=True):
+                # last_updated и публикация снимков — когда завершится вся пачка
+                submit_syncs([with_google_creds(src) for src in active_sources], mark_updated=True)
+                st.rerun()
+
+        sources_panel()
+
+        if st.button("⚙️ Настройки источников", use_container_width=True): 
+            from modules.wizards import wizard_manage_sources
+            wizard_manage_sources()
+
+        if "last_updated" in s_conf:
+            st.caption(f"Last update: {s_conf['last_updated']}")
+
+        with st.expander("📈 Телеметрия синхронизаций"):
+            # Содержимое expander выполняется на каждом проходе, даже свернутое — строим графики только по запросу
+            if st.toggle("Показать", key="show_sync_telemetry"):
+                from modules.sync_metrics import render_sync_telemetry
+                render_sync_telemetry()
+
+        st.divider()
+
+        # --- 3. AI НАСТРОЙКИ ---
+        st.header("🧠 AI Настройки")
+        if st.button("⚙️ Управление моделями", use_container_width=True):
+            from modules.wizards import wizard_manage_llm
+            wizard_manage_llm()
+        st.divider()
+
+        # --- 4. ГРАФИКИ ---
+        st.header("📊 Графики")
+        if st.button("➕ Новый график", use_container_width=True):
+            from modules.wizards import wizard_create_chart
+            wizard_create_chart()
+
+        page_charts = pages_conf.get(current_page, [])
+        existing_charts = [f for f in page_charts if os.path.exists(os.path.join(CHARTS_FOLDER, f))]
+
+        sel_charts = st.multiselect(
+            "Показать на экране:", 
+            existing_charts, 
+            default=existing_charts, 
+            label_visibility="collapsed",
+            format_func=get_chart_display_name 
+        )
+
+        # Изолированный рендер: графики считаются в отдельном процессе с лимитами времени и памяти.
+        # Переключатель действует только в своей сессии; config/app_settings.json задает значение по умолчанию
+        if "sandbox_charts" not in st.session_state:
+            st.session_state.sandbox_charts = app_settings.get("sandbox_charts", False)
+        sandbox_mode = st.toggle(
+            "🛡️ Изолированный рендер", key="sandbox_charts",
+            help=f"render() выполняется в отдельном процессе (лимит {CHART_TIMEOUT_SEC} c. и {CHART_MEMORY_MB} MB). "
+                 "Зависший график не блокирует страницу, но виджеты внутри графиков работают со значениями по умолчанию."
+        )
+
+        # Быстрый просмотр: готовые снимки графиков (modules/publish.py) без запуска render(); ссылка — ?view=fast
+        fast_view = st.toggle("⚡ Быстрый просмотр", value=st.query_params.get("view") == "fast", key="fast_view",
+                              help="Показывает снимки графиков, сделанные после последней синхронизации (фильтры по умолчанию). Страница открывается мгновенно, но виджеты графиков не работают.")
+
+        render_profiling = st.toggle("⏱️ Профиль рендера", key="render_profiling",
+                                     help="Замеряет фазы каждого графика (загрузка, чтение данных, render, сериализация, экспорт) и показывает водопад под графиками.")
+        if st.button("🔬 Профилировать", use_container_width=True,
+                     help="Следующий проход страницы выполнится под cProfile: разбивка по модулям, графикам и обработчикам."):
+            request_rerun_profile()
             st.rerun()
-        
-        # --- БЭКАПЫ И ИНСТРУМЕНТЫ ---
-        BACKUP_FOLDER = os.path.join(DATA_FOLDER, "backups")
-        if not os.path.exists(BACKUP_FOLDER): os.makedirs(BACKUP_FOLDER)
-
-        for f in glob.glob(os.path.join(DATA_FOLDER, "*")):
-            if os.path.isdir(f): continue
-            f_name = os.path.basename(f)
-            backup_path = os.path.join(BACKUP_FOLDER, f_name)
-            has_backup = os.path.exists(backup_path)
-            
-            fc1, fc_info, fc2, fc3 = st.columns([0.45, 0.22, 0.18, 0.15], vertical_alignment="center")
-            fc1.caption(f_name)
-            with fc_info:
-                if has_backup: st.markdown(":orange[**Mod**]", help="Есть оригинал")
-            
-            with fc2:
-                icon = "🛠️" if not has_backup else "♻️"
-                with st.popover(icon, help="Обработка"):
-                    st.markdown(f"**Файл:** `{f_name}`")
-                    if has_backup:
-                        st.info("Есть оригинал.")
-                        if st.button("⏪ Вернуть", key=f"rest_{f_name}", use_container_width=True):
-                            try:
-                                shutil.copy2(backup_path, f)
-                                os.remove(backup_path)
-                                st.toast("✅ Восстановлено!")
-                                time.sleep(0.5)
-                                st.rerun()
-                            except Exception as e: st.error(f"Err: {e}")
-                        st.divider()
 
-                    handlers_list = [h for h in os.listdir(HANDLERS_FOLDER) if h.endswith(".py") and h != "__init__.py"]
-                    if not handlers_list: st.warning("Нет скриптов")
-                    else:
-                        sel_script = st.selectbox("Скрипт:", handlers_list, key=f"h_sel_{f_name}")
-                        if st.button("🚀 Запуск", key=f"run_{f_name}_{sel_script}", type="primary", use_container_width=True):
-                            try:
-                                if not has_backup: shutil.copy2(f, backup_path)
-                                if f.endswith('.csv'): df_source = pd.read_csv(f)
-                                else: df_source = pd.read_excel(f)
-                                
-                                import time
-                                script_path = os.path.join(HANDLERS_FOLDER, sel_script)
-                                unique_name = f"handler_{int(time.time())}_{f_name}"
-                                spec = importlib.util.spec_from_file_location(unique_name, script_path)
-                                mod = importlib.util.module_from_spec(spec)
-                                spec.loader.exec_module(mod)
-                                
-                                if hasattr(mod, "handle"):
-                                    df_result = mod.handle(df_source)
-                                    if df_result is not None and not df_result.empty:
-                                        if f.endswith('.csv'): df_result.to_csv(f, index=False)
-                                        else: df_result.to_excel(f, index=False)
-                                        st.toast(f"✅ Готово!")
-                                        time.sleep(1)
+        with st.expander("📂 Файлы и Связи"):
+            st.write("**Файлы данных:**")
+            up = st.file_uploader("Upload", type=["csv", "xlsx", "parquet"], label_visibility="collapsed")
+            if up:
+                # Запись порциями + индекс sha256 (тот же файл не переписывается); Arrow-копия и профиль считаются в фоне
+                from modules.ingest import ingest_upload
+                up_bar = st.progress(0.0, text=f"Загрузка {up.name}...")
+                status, _ = ingest_upload(up, progress_cb=lambda p: up_bar.progress(p, text=f"Загрузка {up.name}..."))
+                up_bar.empty()
+                # Виджет держит файл между перезапусками: "unchanged" значит, что он уже принят
+                if status != "unchanged":
+                    if status == "duplicate": st.toast("Такой же файл уже загружен под другим именем")
+                    st.rerun()
+
+            # Фоновая обработка загруженных файлов (Arrow-копия + профиль): обновляется сама, пока идет
+            from modules.ingest import get_jobs
+            @st.fragment(run_every=1 if get_jobs(active_only=True) else None)
+            def ingest_progress():
+                for job_name, job in get_jobs().items():
+                    if job["status"] in ("queued", "running"):
+                        st.progress(job["progress"], text=f"⚙️ {job_name}: подготовка данных...")
+                    elif job["status"] == "error":
+                        st.caption(f"⚠️ {job_name}: {job['message']}")
+            ingest_progress()
+
+            # --- ВЕРСИИ И ИНСТРУМЕНТЫ ---
+            # История версий — modules/snapshots.py; копии из старой папки backups переносятся туда один раз
+            from modules.snapshots import list_snapshots, take_snapshot, restore_snapshot, import_legacy_backups
+            if os.path.isdir(os.path.join(DATA_FOLDER, "backups")):
+                import_legacy_backups(os.path.join(DATA_FOLDER, "backups"))
+
+            from modules.catalog import get_profile
+            from modules.browser_index import get_files_index
+            files_index = get_files_index(files_state)
+            ff_q, ff_sort = st.columns([0.6, 0.4])
+            file_q = ff_q.text_input("Поиск файла", placeholder="🔍 Файл...", label_visibility="collapsed", key="file_q")
+            file_sort = ff_sort.selectbox("Порядок файлов", list(SORT_OPTIONS), format_func=SORT_OPTIONS.get,
+                                          label_visibility="collapsed", key="file_sort")
+            found_files = files_index.search(file_q, sort=file_sort)
+            file_view = (file_q, file_sort)
+            if st.session_state.get("file_view") != file_view:
+                st.session_state.file_view = file_view
+                st.session_state.file_page = 0
+            page_files, st.session_state.file_page, file_pages = paginate(found_files, st.session_state.get("file_page", 0))
+
+            for item in page_files:
+                f_name = item["name"]
+                f = os.path.join(DATA_FOLDER, f_name)
+                versions = list_snapshots(f_name)
+                # Самая новая версия — обычно текущий файл; откатываться имеет смысл к остальным
+                older = versions[1:] if versions and versions[0].get("version") == [os.stat(f).st_mtime_ns, os.path.getsize(f)] else versions
+
+                fc1, fc_info, fc2, fc3 = st.columns([0.45, 0.22, 0.18, 0.15], vertical_alignment="center")
+                # Размер и схема — из каталога (файл не читается)
+                profile = get_profile(f_name)
+                profile_help = None
+                if profile:
+                    profile_help = f"{profile['rows']:,} строк".replace(",", " ") + "\n\n" + ", ".join(f"`{c['name']}`" for c in profile["columns"])
+                fc1.caption(f_name, help=profile_help)
+                with fc_info:
+                    if older: st.markdown(f":orange[**v{len(versions)}**]", help="Версий в истории")
+
+                with fc2:
+                    icon = "🛠️" if not older else "♻️"
+                    with st.popover(icon, help="Обработка"):
+                        st.markdown(f"**Файл:** `{f_name}`")
+                        if older:
+                            st.caption("История версий:")
+                            for v in older[:5]:
+                                vc1, vc2 = st.columns([0.75, 0.25], vertical_alignment="center")
+                                v_time = datetime.datetime.fromtimestamp(v["created"]).strftime("%d.%m %H:%M")
+                                vc1.caption(f"{v_time} · {v['reason']} · {v['size'] / 1024:,.0f} KB".replace(",", " "))
+                                if vc2.button("⏪", key=f"rest_{f_name}_{v['id']}", help="Вернуть эту версию"):
+                                    try:
+                                        restore_snapshot(f_name, v["id"])
+                                        # Arrow-копия и профиль устарели — пересчитываются в фоне
+                                        from modules.ingest import schedule_postprocess
+                                        schedule_postprocess(f)
+                                        st.toast("✅ Восстановлено!")
+                                        time.sleep(0.5)
                                         st.rerun()
-                                    else: st.error("Пустой результат")
-                                else: st.error("Нет функции handle()")
-                            except Exception as e: st.error(f"Err: {e}")
-
-            with fc3:
-                with st.popover("✕", help="Удалить"):
-                    st.write(f"Удалить **{f_name}**?")
-                    if st.button("🔥 Да", key=f"conf_del_{f}", type="primary", use_container_width=True):
-                        os.remove(f)
-                        if os.path.exists(backup_path): os.remove(backup_path)
-                        st.rerun()
-        
-        st.divider()
-        st.write("**Связи:**")
-        conf = load_json(CONFIG_FILE, {})
-        data_files = [os.path.basename(f) for f in glob.glob(os.path.join(DATA_FOLDER, "*"))]
-        changed = False
-        for ch in sel_charts:
-            cur = [f for f in conf.get(ch, []) if f in data_files]
-            readable_name = get_chart_display_name(ch)
-            sel = st.multiselect(f"Для '{readable_name}'", data_files, default=cur, key=f"s_{ch}")
-            if sel != conf.get(ch, []):
-                conf[ch] = sel
-                changed = True
-        if changed: save_json(CONFIG_FILE, conf)
-
-    # --- 5. УНИВЕРСАЛЬНЫЙ AI ЧАТ (Вместо Legacy Gemini) ---
-    auto_open = True if ("gen_prompt" in st.session_state and st.session_state.gen_prompt) else False
-    
-    with st.expander("💬 AI Чат (Все модели)", expanded=auto_open):
-        providers = get_providers()
-        
-        if not providers:
-            st.warning("⚠️ Сначала добавьте интеграцию в настройках!")
-        else:
-            # Селекторы модели (сохраняем выбор в сессии)
-            c_p, c_m = st.columns(2)
-            p_names = list(providers.keys())
-            
-            # Выбор провайдера
-            idx_p = 0
-            if "chat_prov" in st.session_state and st.session_state.chat_prov in p_names:
-                idx_p = p_names.index(st.session_state.chat_prov)
-            sel_prov = c_p.selectbox("Провайдер", p_names, index=idx_p, key="chat_prov_sel", label_visibility="collapsed")
-            st.session_state.chat_prov = sel_prov
-            
-            # Выбор модели
-            avail_models = providers[sel_prov]["models"]
-            idx_m = 0
-            if "chat_mod" in st.session_state and st.session_state.chat_mod in avail_models:
-                idx_m = avail_models.index(st.session_state.chat_mod)
-            sel_model = c_m.selectbox("Модель", avail_models, index=idx_m, key="chat_mod_sel", label_visibility="collapsed")
-            st.session_state.chat_mod = sel_model
+                                    except Exception as e: st.error(f"Err: {e}")
+                            st.divider()
+
+                        handlers_list = [h for h in os.listdir(HANDLERS_FOLDER) if h.endswith(".py") and h != "__init__.py"]
+                        if not handlers_list: st.warning("Нет скриптов")
+                        else:
+                            sel_script = st.selectbox("Скрипт:", handlers_list, key=f"h_sel_{f_name}")
+                            if st.button("🚀 Запуск", key=f"run_{f_name}_{sel_script}", type="primary", use_container_width=True):
+                                try:
+                                    from modules.storage import read_table, write_columnar
+                                    # Версия до обработки (если файл уже в истории — только проверка mtime)
+                                    take_snapshot(f, reason="before handler")
+                                    df_source = read_table(f)
+
+                                    import time
+                                    script_path = os.path.join(HANDLERS_FOLDER, sel_script)
+                                    unique_name = f"handler_{int(time.time())}_{f_name}"
+                                    spec = importlib.util.spec_from_file_location(unique_name, script_path)
+                                    mod = importlib.util.module_from_spec(spec)
+                                    spec.loader.exec_module(mod)
+
+                                    if hasattr(mod, "handle"):
+                                        # Инкрементальный handle(df_new, df_prev) вручную — полный пересчет
+                                        from modules.incremental import is_incremental
+                                        df_result = mod.handle(df_source, None) if is_incremental(mod.handle) else mod.handle(df_source)
+                                        if df_result is not None and not df_result.empty:
+                                            if f.endswith('.csv'): df_result.to_csv(f, index=False)
+                                            elif f.endswith('.parquet'): df_result.to_parquet(f, index=False)
+                                            else: df_result.to_excel(f, index=False)
+                                            write_columnar(df_result, f)
+                                            from modules.catalog import update_profile
+                                            update_profile(f_name, df_result, f)
+                                            take_snapshot(f, reason=f"handler {sel_script}")
+                                            st.toast(f"✅ Готово!")
+                                            time.sleep(1)
+                                            st.rerun()
+                                        else: st.error("Пустой результат")
+                                    else: st.error("Нет функции handle()")
+                                except Exception as e: st.error(f"Err: {e}")
+
+                with fc3:
+                    with st.popover("✕", help="Удалить"):
+                        st.write(f"Удалить **{f_name}**?")
+                        if st.button("🔥 Да", key=f"conf_del_{f}", type="primary", use_container_width=True):
+                            os.remove(f)
+                            from modules.catalog import remove_profile
+                            from modules.storage import remove_columnar
+                            remove_profile(f_name)
+                            remove_columnar(f)
+                            from modules.snapshots import remove_history
+                            remove_history(f_name)
+                            from modules.incremental import clear_state
+                            clear_state(f_name)
+                            from modules.ingest import forget_file
+                            forget_file(f_name)
+                            st.rerun()
+
+            if file_pages > 1:
+                fp_prev, fp_info, fp_next = st.columns([0.25, 0.5, 0.25], vertical_alignment="center")
+                if fp_prev.button("◀", key="file_prev", disabled=st.session_state.file_page == 0, use_container_width=True):
+                    st.session_state.file_page -= 1; st.rerun()
+                fp_info.caption(f"{st.session_state.file_page + 1} / {file_pages} · {len(found_files)} шт.")
+                if fp_next.button("▶", key="file_next", disabled=st.session_state.file_page >= file_pages - 1, use_container_width=True):
+                    st.session_state.file_page += 1; st.rerun()
 
             st.divider()
+            st.write("**Связи:**")
+            conf = load_json(CONFIG_FILE, {})
+            data_files = sorted(files_state)
+            changed = False
+            for ch in sel_charts:
+                cur = [f for f in conf.get(ch, []) if f in data_files]
+                readable_name = get_chart_display_name(ch)
+                sel = st.multiselect(f"Для '{readable_name}'", data_files, default=cur, key=f"s_{ch}")
+                if sel != conf.get(ch, []):
+                    conf[ch] = sel
+                    changed = True
+            if changed: save_json(CONFIG_FILE, conf)
+
+        # --- 5. УНИВЕРСАЛЬНЫЙ AI ЧАТ (Вместо Legacy Gemini) ---
+        auto_open = True if ("gen_prompt" in st.session_state and st.session_state.gen_prompt) else False
+
+        with st.expander("💬 AI Чат (Все модели)", expanded=auto_open):
+            providers = get_providers()
+
+            if not providers:
+                st.warning("⚠️ Сначала добавьте интеграцию в настройках!")
+            else:
+                # Селекторы модели (сохраняем выбор в сессии)
+                c_p, c_m = st.columns(2)
+                p_names = list(providers.keys())
+
+                # Выбор провайдера
+                idx_p = 0
+                if "chat_prov" in st.session_state and st.session_state.chat_prov in p_names:
+                    idx_p = p_names.index(st.session_state.chat_prov)
+                sel_prov = c_p.selectbox("Провайдер", p_names, index=idx_p, key="chat_prov_sel", label_visibility="collapsed")
+                st.session_state.chat_prov = sel_prov
+
+                # Выбор модели
+                avail_models = providers[sel_prov]["models"]
+                idx_m = 0
+                if "chat_mod" in st.session_state and st.session_state.chat_mod in avail_models:
+                    idx_m = avail_models.index(st.session_state.chat_mod)
+                sel_model = c_m.selectbox("Модель", avail_models, index=idx_m, key="chat_mod_sel", label_visibility="collapsed")
+                st.session_state.chat_mod = sel_model
+
+                st.divider()
+
+                if "msgs" not in st.session_state: st.session_state.msgs = []
+                if st.button("🗑️ Очистить"): 
+                    st.session_state.msgs = []
+                    st.rerun()
 
-            if "msgs" not in st.session_state: st.session_state.msgs = []
-            if st.button("🗑️ Очистить"): 
-                st.session_state.msgs = []
-                st.rerun()
-            
-            # Отображение истории
-            for m in st.session_state.msgs: 
-                st.chat_message(m["role"]).write(m["content"])
-            
-            # --- ФУНКЦИЯ ОТПРАВКИ ---
-            def send_to_llm(prompt_text):
-                # Формируем историю для контекста (так как ask_llm stateless)
-                # Берем последние 4 сообщения
-                context_str = ""
-                for m in st.session_state.msgs[-4:]:
-                    role = "User" if m["role"] == "user" else "Assistant"
-                    context_str += f"{role}: {m['content']}\n"
-                
-                final_user_prompt = f"HISTORY:\n{context_str}\nCURRENT REQUEST:\n{prompt_text}"
-                
-                with st.spinner(f"🤖 {sel_prov} думает..."):
-                    success, resp = ask_llm(sel_prov, sel_model, "You are a helpful assistant.", final_user_prompt)
-                    
-                    if success:
+                # Отображение истории
+                for m in st.session_state.msgs: 
+                    st.chat_message(m["role"]).write(m["content"])
+
+                # --- ФУНКЦИЯ ОТПРАВКИ ---
+                def send_to_llm(prompt_text):
+                    # Формируем историю для контекста (так как ask_llm stateless)
+                    # Берем последние 4 сообщения
+                    context_str = ""
+                    for m in st.session_state.msgs[-4:]:
+                        role = "User" if m["role"] == "user" else "Assistant"
+                        context_str += f"{role}: {m['content']}\n"
+
+                    final_user_prompt = f"HISTORY:\n{context_str}\nCURRENT REQUEST:\n{prompt_text}"
+
+                    # Ответ печатается по мере генерации (st.write_stream)
+                    try:
+                        with st.chat_message("assistant"):
+                            resp = st.write_stream(ask_llm_stream(sel_prov, sel_model, "You are a helpful assistant.", final_user_prompt))
                         st.session_state.msgs.append({"role": "assistant", "content": resp})
                         st.rerun()
-                    else:
-                        st.error(f"Ошибка: {resp}")
+                    except LLMError as e:
+                        st.error(f"Ошибка: {e}")
+
+                # 1. ОБРАБОТКА ЧЕРНОВИКА (из Визарда)
+                if "gen_prompt" in st.session_state and st.session_state.gen_prompt:
+                    st.markdown("---")
+                    st.info("✨ **Черновик запроса**")
+                    draft_prompt = st.text_area("Текст:", value=st.session_state.gen_prompt, height=200, key="draft_prompt_area")
+
+                    c_send, c_close = st.columns([0.4, 0.6])
+                    if c_send.button("🚀 Отправить", type="primary", use_container_width=True):
+                        del st.session_state.gen_prompt
+                        st.session_state.msgs.append({"role": "user", "content": draft_prompt})
+                        send_to_llm(draft_prompt)
+
+                    if c_close.button("❌ Сбросить", use_container_width=True):
+                        del st.session_state.gen_prompt
+                        st.rerun()
 
-            # 1. ОБРАБОТКА ЧЕРНОВИКА (из Визарда)
-            if "gen_prompt" in st.session_state and st.session_state.gen_prompt:
-                st.markdown("---")
-                st.info("✨ **Черновик запроса**")
-                draft_prompt = st.text_area("Текст:", value=st.session_state.gen_prompt, height=200, key="draft_prompt_area")
-                
-                c_send, c_close = st.columns([0.4, 0.6])
-                if c_send.button("🚀 Отправить", type="primary", use_container_width=True):
-                    del st.session_state.gen_prompt
-                    st.session_state.msgs.append({"role": "user", "content": draft_prompt})
-                    send_to_llm(draft_prompt)
-
-                if c_close.button("❌ Сбросить", use_container_width=True):
-                    del st.session_state.gen_prompt
-                    st.rerun()
+                # 2. ОБЫЧНЫЙ ЧАТ
+                if p := st.chat_input("Вопрос..."):
+                    st.session_state.msgs.append({"role": "user", "content": p})
+                    send_to_llm(p)
 
-            # 2. ОБЫЧНЫЙ ЧАТ
-            if p := st.chat_input("Вопрос..."):
-                st.session_state.msgs.append({"role": "user", "content": p})
-                send_to_llm(p)
-
-# ==================== MAIN ====================
-st.title(f"📊 {current_page}")
-
-tab_charts, tab_etl = st.tabs(["📈 Просмотр Графиков", "🛠️ Редактор ETL (Обработчики)"])
-
-
-
-# --- TAB 1: CHARTS ---
-with tab_charts:
-    if not sel_charts: 
-        st.info("На этой странице нет графиков или они скрыты. Добавьте их через настройки ⚙️ или создайте новый.")
-    
-    chart_config = load_json(CONFIG_FILE, {})
-    if "chart_backups" not in st.session_state: st.session_state.chart_backups = {}
-
-    for fname in sel_charts:
-        fpath = os.path.join(CHARTS_FOLDER, fname)
-        st.markdown("---")
-        display_name = get_chart_display_name(fname)
-        
-        # [SYNC FIX 1] Инициализируем счетчик версий для принудительного обновления редактора
-        ver_key = f"ver_{fname}"
-        if ver_key not in st.session_state: st.session_state[ver_key] = 0
-        
-        # [SYNC FIX 2] Ключ редактора теперь зависит от версии. 
-        # Если версия изменится (после AI или Undo), создастся НОВЫЙ редактор с новым текстом.
-        editor_key = f"ed_{fname}_{st.session_state[ver_key]}"
-
-        # Определяем тему
-        is_dark = st.session_state.get("wiz_active_dark", True)
-        current_theme = "plotly_dark" if is_dark else "plotly_white"
-
-        # 1. ЗАГРУЗКА МОДУЛЯ
-        try:
-            spec = importlib.util.spec_from_file_location(fname[:-3], fpath)
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)
-        except Exception as e:
-            st.error(f"Ошибка загрузки модуля {fname}: {e}")
-            continue
-
-        # 2. ИНТЕРФЕЙС
-        c_title, c_edit, c_ai, c_exp, c_del = st.columns([0.68, 0.08, 0.08, 0.08, 0.08], vertical_alignment="center")
-        
-        with c_title: st.subheader(f"📌 {display_name}")
-            
-        with c_edit:
-            with st.popover("✏️", help="Переименовать", use_container_width=True):
-                new_title_input = st.text_input("Новое имя:", value=display_name, key=f"ren_input_{fname}")
-                if st.button("Сохранить", key=f"save_ren_{fname}", type="primary"):
-                    titles_conf[fname] = new_title_input
-                    save_json(TITLES_CONFIG_FILE, titles_conf)
-                    st.rerun()
+    # ==================== MAIN ====================
+    st.title(f"📊 {current_page}")
 
-        # ЗАГОТОВКА ПОД КНОПКУ ЭКСПОРТА
-        with c_exp:
-            export_placeholder = st.empty()
-
-        # --- AI REFACTORING ---
-        with c_ai:
-            has_backup = fname in st.session_state.chart_backups
-            ai_icon = "✨"
-            with st.popover(ai_icon, help="AI Редактор (+Откат)", use_container_width=True):
-                if has_backup:
-                    st.warning("Доступна предыдущая версия кода")
-                    if st.button("↩️ Вернуть как было", key=f"undo_{fname}", use_container_width=True):
-                        old_code = st.session_state.chart_backups[fname]
-                        with open(fpath, "w", encoding="utf-8") as f: f.write(old_code)
-                        del st.session_state.chart_backups[fname]
-                        
-                        # [SYNC FIX 3] Увеличиваем версию, чтобы редактор обновился
-                        st.session_state[ver_key] += 1
-                        
-                        st.toast("✅ Изменения отменены!")
-                        time.sleep(0.5)
+    tab_charts, tab_etl = st.tabs(["📈 Просмотр Графиков", "🛠️ Редактор ETL (Обработчики)"])
+
+
+
+    # --- TAB 1: CHARTS ---
+    with tab_charts:
+        if not sel_charts: 
+            st.info("На этой странице нет графиков или они скрыты. Добавьте их через настройки ⚙️ или создайте новый.")
+
+        chart_config = load_json(CONFIG_FILE, {})
+        if "chart_backups" not in st.session_state: st.session_state.chart_backups = {}
+
+        # Профилировщик создается только по запросу, иначе фазы оборачиваются в пустой контекст
+        profiler = RenderProfiler(current_page) if render_profiling else None
+        def prof_phase(chart, phase):
+            return profiler.phase(chart, phase) if profiler else nullcontext()
+
+        if fast_view:
+            from modules.publish import get_published_page, get_publish_state
+            published_at, published = get_published_page(current_page)
+            if published_at is None:
+                st.info("Снимков этой страницы еще нет: они появятся после синхронизации данных.")
+            else:
+                state = "· обновляется..." if get_publish_state()["running"] else ""
+                st.caption(f"⚡ Снимок от {datetime.datetime.fromtimestamp(published_at):%d.%m %H:%M} {state}")
+            for chart_name, figure, message in published:
+                if chart_name not in sel_charts: continue
+                st.markdown("---")
+                st.subheader(get_chart_display_name(chart_name))
+                if figure: st.plotly_chart(figure, use_container_width=True, key=f"fast_fig_{chart_name}")
+                else: st.warning(f"Нет снимка: {message}")
+
+        # В быстром просмотре графики не исполняются
+        for fname in ([] if fast_view else sel_charts):
+            fpath = os.path.join(CHARTS_FOLDER, fname)
+            st.markdown("---")
+            display_name = get_chart_display_name(fname)
+
+            # [SYNC FIX 1] Инициализируем счетчик версий для принудительного обновления редактора
+            ver_key = f"ver_{fname}"
+            if ver_key not in st.session_state: st.session_state[ver_key] = 0
+
+            # [SYNC FIX 2] Ключ редактора теперь зависит от версии. 
+            # Если версия изменится (после AI или Undo), создастся НОВЫЙ редактор с новым текстом.
+            editor_key = f"ed_{fname}_{st.session_state[ver_key]}"
+
+            # Определяем тему
+            is_dark = st.session_state.get("wiz_active_dark", True)
+            current_theme = "plotly_dark" if is_dark else "plotly_white"
+
+            # 1. ЗАГРУЗКА МОДУЛЯ (в изолированном режиме модуль грузит дочерний процесс)
+            mod = None
+            if not sandbox_mode:
+                try:
+                    with prof_phase(fname, "load"):
+                        spec = importlib.util.spec_from_file_location(fname[:-3], fpath)
+                        mod = importlib.util.module_from_spec(spec)
+                        spec.loader.exec_module(mod)
+                except Exception as e:
+                    st.error(f"Ошибка загрузки модуля {fname}: {e}")
+                    continue
+
+            # 2. ИНТЕРФЕЙС
+            c_title, c_edit, c_ai, c_exp, c_del = st.columns([0.68, 0.08, 0.08, 0.08, 0.08], vertical_alignment="center")
+
+            with c_title: st.subheader(f"📌 {display_name}")
+
+            with c_edit:
+                with st.popover("✏️", help="Переименовать", use_container_width=True):
+                    new_title_input = st.text_input("Новое имя:", value=display_name, key=f"ren_input_{fname}")
+                    if st.button("Сохранить", key=f"save_ren_{fname}", type="primary"):
+                        titles_conf[fname] = new_title_input
+                        save_json(TITLES_CONFIG_FILE, titles_conf)
                         st.rerun()
-                    st.divider()
-
-                st.write(f"**AI Рефакторинг: {display_name}**")
-                
-                providers = get_providers()
-                if not providers:
-                    st.error("Нет AI интеграций!")
-                    llm_ok = False
-                else:
-                    llm_ok = True
-                    rp_names = list(providers.keys())
-                    r_prov = st.selectbox("Провайдер", rp_names, key=f"r_prov_{fname}", label_visibility="collapsed")
-                    r_models = providers[r_prov]["models"]
-                    r_mod = st.selectbox("Модель", r_models, key=f"r_mod_{fname}", label_visibility="collapsed")
-
-                ai_request = st.text_area("Запрос к AI", placeholder="Сделай красным...", key=f"aireq_{fname}", height=100)
-                
-                if st.button("🚀 Выполнить", key=f"do_ai_{fname}", type="primary", use_container_width=True, disabled=not llm_ok):
-                    if not ai_request:
-                        st.warning("Напишите запрос.")
+
+            # ЗАГОТОВКА ПОД КНОПКУ ЭКСПОРТА
+            with c_exp:
+                export_placeholder = st.empty()
+
+            # --- AI REFACTORING ---
+            with c_ai:
+                has_backup = fname in st.session_state.chart_backups
+                ai_icon = "✨"
+                with st.popover(ai_icon, help="AI Редактор (+Откат)", use_container_width=True):
+                    if has_backup:
+                        st.warning("Доступна предыдущая версия кода")
+                        if st.button("↩️ Вернуть как было", key=f"undo_{fname}", use_container_width=True):
+                            old_code = st.session_state.chart_backups[fname]
+                            with open(fpath, "w", encoding="utf-8") as f: f.write(old_code)
+                            del st.session_state.chart_backups[fname]
+
+                            # [SYNC FIX 3] Увеличиваем версию, чтобы редактор обновился
+                            st.session_state[ver_key] += 1
+
+                            st.toast("✅ Изменения отменены!")
+                            time.sleep(0.5)
+                            st.rerun()
+                        st.divider()
+
+                    st.write(f"**AI Рефакторинг: {display_name}**")
+
+                    providers = get_providers()
+                    if not providers:
+                        st.error("Нет AI интеграций!")
+                        llm_ok = False
                     else:
-                        try:
-                            with open(fpath, "r", encoding="utf-8") as f: current_code = f.read()
-                            st.session_state.chart_backups[fname] = current_code
-                        except: current_code = ""
-
-                        # Данные
-                        data_context = "Нет данных"
-                        try:
-                            linked_files = chart_config.get(fname, [])
-                            if linked_files:
-                                d_path = os.path.join(DATA_FOLDER, linked_files[0])
-                                if d_path.endswith('.csv'): df_p = pd.read_csv(d_path, nrows=3)
-                                else: df_p = pd.read_excel(d_path, nrows=3)
-                                data_context = "\n".join([f"- {c} ({t})" for c, t in zip(df_p.columns, df_p.dtypes)])
-                        except: pass
-
-                        refactor_prompt = (
-                            f"### ТЕКУЩИЙ КОД:\n```python\n{current_code}\n```\n\n"
-                            f"### ДАННЫЕ:\n{data_context}\n\n"
-                            f"### ЗАПРОС ПОЛЬЗОВАТЕЛЯ:\n\"{ai_request}\"\n"
-                        )
-                        
-                        system_msg = ("Ты Senior Python Developer. "
-                                      "Верни ТОЛЬКО валидный Python код модуля (def render). "
-                                      "ВАЖНО: В конце функции верни объект `fig`.")
-
-                        with st.spinner(f"🤖 {r_prov} переписывает код..."):
-                            success, result_text = ask_llm(r_prov, r_mod, system_msg, refactor_prompt)
-                            
-                            if success:
-                                new_code = result_text
-                                if "```python" in new_code: new_code = new_code.split("```python")[1].split("```")[0]
-                                elif "```" in new_code: new_code = new_code.split("```")[1]
-                                new_code = new_code.strip()
-                                
+                        llm_ok = True
+                        rp_names = list(providers.keys())
+                        r_prov = st.selectbox("Провайдер", rp_names, key=f"r_prov_{fname}", label_visibility="collapsed")
+                        r_models = providers[r_prov]["models"]
+                        r_mod = st.selectbox("Модель", r_models, key=f"r_mod_{fname}", label_visibility="collapsed")
+
+                    ai_request = st.text_area("Запрос к AI", placeholder="Сделай красным...", key=f"aireq_{fname}", height=100)
+                    r_use_cache = st.checkbox("♻️ Кэш ответов", value=True, key=f"r_cache_{fname}")
+                    r_diff_mode = st.checkbox("✂️ Только правки (экономия токенов)", value=True, key=f"r_diff_{fname}",
+                                              help="Модель возвращает блоки SEARCH/REPLACE вместо всего модуля. Если правки не применятся — автоматически будет полная перезапись.")
+
+                    # Отчет о токенах прошлого запроса (после успешной правки страница перезагружается)
+                    report = st.session_state.get(f"refactor_report_{fname}")
+                    if report:
+                        st.caption(report)
+
+                    if st.button("🚀 Выполнить", key=f"do_ai_{fname}", type="primary", use_container_width=True, disabled=not llm_ok):
+                        if not ai_request:
+                            st.warning("Напишите запрос.")
+                        else:
+                            try:
+                                with open(fpath, "r", encoding="utf-8") as f: current_code = f.read()
+                                st.session_state.chart_backups[fname] = current_code
+                            except: current_code = ""
+
+                            # Данные
+                            data_context = "Нет данных"
+                            try:
+                                linked_files = chart_config.get(fname, [])
+                                if linked_files:
+                                    # Профиль из каталога: схема, диапазоны и пример строк без чтения файла
+                                    from modules.catalog import describe_for_prompt
+                                    data_context = describe_for_prompt(os.path.join(DATA_FOLDER, linked_files[0]))
+                            except: pass
+
+                            # Docstring с исходным промптом модели не нужен — отрезаем и вернем на место после правки
+                            code_header, code_body = split_header(current_code)
+
+                            def stream_answer(system_text, prompt_text):
+                                """Печатает ответ по мере генерации. Возвращает (success, text)."""
+                                try:
+                                    with st.container(height=250):
+                                        return True, st.write_stream(ask_llm_stream(r_prov, r_mod, system_text, prompt_text, use_cache=r_use_cache))
+                                except LLMError as e:
+                                    return False, str(e)
+
+                            refactor_prompt = build_refactor_prompt(code_body, data_context, ai_request)
+                            system_msg = REFACTOR_SYSTEM_PROMPT
+
+                            new_body = None
+                            success, result_text = False, ""
+                            tokens_report = ""
+
+                            # 1. Режим правок: модель присылает только изменения
+                            if r_diff_mode:
+                                st.caption(f"🤖 {r_prov} готовит правки...")
+                                success, result_text = stream_answer(EDIT_FORMAT_PROMPT, refactor_prompt)
+                                if success:
+                                    try:
+                                        new_body = apply_edit_blocks(code_body, parse_edit_blocks(result_text))
+                                        is_valid, v_msg = validate_chart_code(new_body)
+                                        if not is_valid: raise PatchError(v_msg)
+                                        full_estimate = estimate_tokens(new_body)
+                                        tokens_report = (
+                                            f"✂️ Правки: промпт ~{estimate_tokens(EDIT_FORMAT_PROMPT + refactor_prompt)} ток., "
+                                            f"ответ ~{estimate_tokens(result_text)} ток. "
+                                            f"(полная перезапись: ответ ~{full_estimate} ток.)"
+                                        )
+                                    except PatchError as e:
+                                        st.info(f"Правки не применились ({e}). Переписываю модуль целиком...")
+                                        new_body = None
+
+                            # 2. Полная перезапись (или запасной вариант)
+                            if new_body is None and (success or not r_diff_mode):
+                                st.caption(f"🤖 {r_prov} переписывает код...")
+                                diff_tokens = estimate_tokens(result_text) if r_diff_mode else 0
+                                success, result_text = stream_answer(system_msg, refactor_prompt)
+                                if success:
+                                    from modules.wizards import clean_gemini_code
+                                    new_body = clean_gemini_code(result_text)
+                                    tokens_report = (
+                                        f"📄 Полная перезапись: промпт ~{estimate_tokens(system_msg + refactor_prompt)} ток., "
+                                        f"ответ ~{estimate_tokens(result_text)} ток."
+                                        + (f" (неудачные правки: ~{diff_tokens} ток.)" if r_diff_mode else "")
+                                    )
+
+                            if success and new_body is not None:
+                                new_code = code_header + new_body.strip() + "\n"
+
                                 with open(fpath, "w", encoding="utf-8") as f: 
                                     f.write(new_code)
                                     f.flush()
                                     os.fsync(f.fileno())
-                                
+
                                 # [SYNC FIX 4] Увеличиваем версию, чтобы редактор подхватил НОВЫЙ код из файла
                                 st.session_state[ver_key] += 1
-                                    
+                                st.session_state[f"refactor_report_{fname}"] = tokens_report
+
                                 st.toast("✨ Готово!")
                                 time.sleep(0.5)
                                 st.rerun()
                             else:
                                 st.error(f"Ошибка AI: {result_text}")
 
-        with c_del:
-            with st.popover("🗑️", help="Удалить график", use_container_width=True):
-                st.write(f"Удалить **{display_name}**?")
-                if st.button("🔥 Да", key=f"del_chart_btn_{fname}", type="primary"):
-                    if os.path.exists(fpath): os.remove(fpath)
-                    if fname in titles_conf: del titles_conf[fname]; save_json(TITLES_CONFIG_FILE, titles_conf)
-                    if fname in chart_config: del chart_config[fname]; save_json(CONFIG_FILE, chart_config)
-                    p_conf = load_json(PAGES_CONFIG_FILE, {})
-                    for p_nm, ch_list in p_conf.items():
-                        if fname in ch_list: ch_list.remove(fname)
-                    save_json(PAGES_CONFIG_FILE, p_conf)
-                    st.rerun()
+            with c_del:
+                with st.popover("🗑️", help="Удалить график", use_container_width=True):
+                    st.write(f"Удалить **{display_name}**?")
+                    if st.button("🔥 Да", key=f"del_chart_btn_{fname}", type="primary"):
+                        if os.path.exists(fpath): os.remove(fpath)
+                        if fname in titles_conf: del titles_conf[fname]; save_json(TITLES_CONFIG_FILE, titles_conf)
+                        if fname in chart_config: del chart_config[fname]; save_json(CONFIG_FILE, chart_config)
+                        p_conf = load_json(PAGES_CONFIG_FILE, {})
+                        for p_nm, ch_list in p_conf.items():
+                            if fname in ch_list: ch_list.remove(fname)
+                        save_json(PAGES_CONFIG_FILE, p_conf)
+                        st.rerun()
 
-        # --- CODE EDITOR ---
-        code_content = ""
-        file_read_error = False
-        
-        if os.path.exists(fpath):
-            try:
-                with open(fpath, "r", encoding="utf-8") as f: code_content = f.read()
-            except Exception as e: st.error(f"Ошибка чтения: {e}"); file_read_error = True
-        else: st.error(f"Файл не найден: {fname}"); file_read_error = True
-
-        if file_read_error: continue 
-
-        with st.expander(f"Редактировать код: {display_name}"):
-            try:
-                # [SYNC FIX 5] Используем динамический editor_key
-                res = code_editor(code_content, lang="python", height=[8, 15], key=editor_key, buttons=[{"name": "Save", "feather": "Save", "hasText": True, "commands": ["submit"]}])
-                
-                if res['type'] == "submit" and res['text'] != code_content:
-                    with open(fpath, "w", encoding="utf-8") as f: f.write(res['text'])
-                    
-                    # При ручном сохранении тоже полезно обновить версию, чтобы синхронизировать состояние
-                    st.session_state[ver_key] += 1
-                    st.rerun()
-            except Exception as e: st.warning(f"Ошибка редактора: {e}")
+            # --- CODE EDITOR ---
+            code_content = ""
+            file_read_error = False
 
-        # --- ФИНАЛЬНЫЙ РЕНДЕР И ЭКСПОРТ ---
-        current_fig = None
-        
-        if "st.set_page_config" in code_content:
-            st.error("Это не модуль, а приложение! Убери `st.set_page_config`.")
-        else:
-            try:
-                if mod and hasattr(mod, "render"):
-                    source_files_paths = [os.path.join(DATA_FOLDER, f) for f in chart_config.get(fname, [])]
-                    
-                    # УМНЫЙ ВЫЗОВ
-                    import inspect
-                    sig = inspect.signature(mod.render)
-                    call_args = {"files": source_files_paths}
-                    
-                    if "chart_key" in sig.parameters: call_args["chart_key"] = fname
-                    if "theme" in sig.parameters: call_args["theme"] = current_theme
-                    if "return_fig" in sig.parameters: call_args["return_fig"] = False 
-
-                    current_fig = mod.render(**call_args)
-                    
-                else: st.warning("Нет функции `render(files)`.")
-            except Exception as e: st.error(f"Ошибка выполнения: {e}")
-
-        # --- НАПОЛНЕНИЕ КНОПКИ ЭКСПОРТА ---
-        if current_fig:
-            try:
-                from modules.utils import ChartExporter
-                with export_placeholder:
-                    with st.popover("📦", use_container_width=True):
-                        html_data = ChartExporter.export_to_html(current_fig, app_theme_is_dark=is_dark)
-                        st.download_button(
-                            label="Скачать HTML", 
-                            data=html_data, 
-                            file_name=f"{fname[:-3]}.html",
-                            mime="text/html",
-                            key=f"dl_btn_{fname}"
-                        )
-            except ImportError:
-                pass
-# --- TAB 2: ETL EDITOR ---
-with tab_etl:
-    st.write("🛠️ **Редактор скриптов обработки (ETL)**")
-    
-    if not os.path.exists(HANDLERS_FOLDER): os.makedirs(HANDLERS_FOLDER)
-    handlers = sorted([f for f in os.listdir(HANDLERS_FOLDER) if f.endswith(".py") and f != "__init__.py"])
-
-    c_sel, c_new, c_ren, c_del = st.columns([0.6, 0.13, 0.13, 0.13], vertical_alignment="bottom")
-    sel_handler = c_sel.selectbox("Выберите скрипт:", handlers, label_visibility="collapsed", key="etl_selector")
-
-    with c_new:
-        with st.popover("➕", use_container_width=True, help="Создать новый"):
-            st.write("**Новый скрипт**")
-            new_h_name = st.text_input("Имя файла (лат):", placeholder="clean_sales", key="new_h_input")
-            if st.button("Создать", type="primary", key="create_h_btn"):
-                if new_h_name:
-                    if not new_h_name.endswith(".py"): new_h_name += ".py"
-                    new_path = os.path.join(HANDLERS_FOLDER, new_h_name)
-                    if os.path.exists(new_path): st.error("Файл существует!")
-                    else:
-                        template_code = '"""\nЗадача: обработка df\n"""\nimport pandas as pd\n\ndef handle(df):\n    return df\n'
-                        with open(new_path, "w", encoding="utf-8") as f: f.write(template_code)
-                        st.toast(f"✅ Создан: {new_h_name}")
-                        time.sleep(0.5)
+            if os.path.exists(fpath):
+                try:
+                    with open(fpath, "r", encoding="utf-8") as f: code_content = f.read()
+                except Exception as e: st.error(f"Ошибка чтения: {e}"); file_read_error = True
+            else: st.error(f"Файл не найден: {fname}"); file_read_error = True
+
+            if file_read_error: continue 
+
+            with st.expander(f"Редактировать код: {display_name}"):
+                try:
+                    from code_editor import code_editor
+                    # [SYNC FIX 5] Используем динамический editor_key
+                    res = code_editor(code_content, lang="python", height=[8, 15], key=editor_key, buttons=[{"name": "Save", "feather": "Save", "hasText": True, "commands": ["submit"]}])
+
+                    if res['type'] == "submit" and res['text'] != code_content:
+                        with open(fpath, "w", encoding="utf-8") as f: f.write(res['text'])
+
+                        # При ручном сохранении тоже полезно обновить версию, чтобы синхронизировать состояние
+                        st.session_state[ver_key] += 1
                         st.rerun()
+                except Exception as e: st.warning(f"Ошибка редактора: {e}")
+
+            # --- ФИНАЛЬНЫЙ РЕНДЕР И ЭКСПОРТ ---
+            current_fig = None
+
+            if "st.set_page_config" in code_content:
+                st.error("Это не модуль, а приложение! Убери `st.set_page_config`.")
+            elif sandbox_mode:
+                source_files_paths = [os.path.join(DATA_FOLDER, f) for f in chart_config.get(fname, [])]
+                with prof_phase(fname, "render"):
+                    status, payload = run_chart_sandboxed(fpath, source_files_paths, chart_key=fname, theme=current_theme)
+                if status == "ok":
+                    import plotly.io as pio
+                    with prof_phase(fname, "serialize"):
+                        current_fig = pio.from_json(payload)
+                    if profiler: profiler.set_payload(fname, len(payload.encode("utf-8")))
+                    st.plotly_chart(current_fig, use_container_width=True, key=f"sandbox_fig_{fname}")
+                elif status in ("timeout", "memory"):
+                    with st.container(border=True):
+                        st.error(f"⛔ **Превышен бюджет:** {payload}")
+                        st.caption("График остановлен, чтобы не блокировать страницу. Упростите расчеты или отфильтруйте данные (✨ AI Редактор).")
+                elif status == "empty":
+                    st.warning(payload)
+                else:
+                    st.error(f"Ошибка выполнения: {payload}")
+            else:
+                try:
+                    if mod and hasattr(mod, "render"):
+                        source_files_paths = [os.path.join(DATA_FOLDER, f) for f in chart_config.get(fname, [])]
+
+                        # УМНЫЙ ВЫЗОВ
+                        call_args = build_render_args(mod.render, source_files_paths, chart_key=fname, theme=current_theme)
+                        with (profiler.render_phase(fname) if profiler else nullcontext()):
+                            current_fig = mod.render(**call_args)
+
+                        # Размер фигуры ≈ объем данных, который уходит в браузер
+                        if profiler and current_fig is not None and hasattr(current_fig, "to_json"):
+                            with prof_phase(fname, "serialize"):
+                                profiler.set_payload(fname, len(current_fig.to_json().encode("utf-8")))
+
+                    else: st.warning("Нет функции `render(files)`.")
+                except Exception as e: st.error(f"Ошибка выполнения: {e}")
+
+            # --- НАПОЛНЕНИЕ КНОПКИ ЭКСПОРТА ---
+            if current_fig:
+                try:
+                    from modules.utils import ChartExporter
+                    with export_placeholder:
+                        with st.popover("📦", use_container_width=True):
+                            with prof_phase(fname, "export"):
+                                html_data = ChartExporter.export_to_html(current_fig, app_theme_is_dark=is_dark)
+                            st.download_button(
+                                label="Скачать HTML", 
+                                data=html_data, 
+                                file_name=f"{fname[:-3]}.html",
+                                mime="text/html",
+                                key=f"dl_btn_{fname}"
+                            )
+                except ImportError:
+                    pass
+
+            if profiler: profiler.set_code(fname, code_content)
+
+        # --- ПАНЕЛЬ ПРОФИЛЯ СТРАНИЦЫ ---
+        if profiler:
+            profiler.save()
+            st.markdown("---")
+            with st.expander("⏱️ Профиль рендера страницы", expanded=True):
+                render_profile_panel(profiler, titles=titles_conf)
+
+    # --- TAB 2: ETL EDITOR ---
+    with tab_etl:
+        st.write("🛠️ **Редактор скриптов обработки (ETL)**")
+
+        if not os.path.exists(HANDLERS_FOLDER): os.makedirs(HANDLERS_FOLDER)
+        handlers = sorted([f for f in os.listdir(HANDLERS_FOLDER) if f.endswith(".py") and f != "__init__.py"])
+
+        c_sel, c_new, c_ren, c_del = st.columns([0.6, 0.13, 0.13, 0.13], vertical_alignment="bottom")
+        sel_handler = c_sel.selectbox("Выберите скрипт:", handlers, label_visibility="collapsed", key="etl_selector")
+
+        with c_new:
+            with st.popover("➕", use_container_width=True, help="Создать новый"):
+                st.write("**Новый скрипт**")
+                new_h_name = st.text_input("Имя файла (лат):", placeholder="clean_sales", key="new_h_input")
+                if st.button("Создать", type="primary", key="create_h_btn"):
+                    if new_h_name:
+                        if not new_h_name.endswith(".py"): new_h_name += ".py"
+                        new_path = os.path.join(HANDLERS_FOLDER, new_h_name)
+                        if os.path.exists(new_path): st.error("Файл существует!")
+                        else:
+                            template_code = ('"""\nЗадача: обработка df\n\n'
+                                             'Для дорогих построчных преобразований: def handle(df_new, df_prev) — придут только\n'
+                                             'новые/измененные строки (колонку _row_key не удалять), df_prev — прошлый результат.\n'
+                                             '"""\nimport pandas as pd\n\ndef handle(df):\n    return df\n')
+                            with open(new_path, "w", encoding="utf-8") as f: f.write(template_code)
+                            st.toast(f"✅ Создан: {new_h_name}")
+                            time.sleep(0.5)
+                            st.rerun()
+
+        with c_ren:
+            with st.popover("✏️", use_container_width=True, help="Переименовать"):
+                if sel_handler:
+                    st.write(f"Переименовать **{sel_handler}**")
+                    ren_name = st.text_input("Новое имя:", value=sel_handler, key="ren_h_input")
+                    if st.button("Сохранить", key="ren_h_btn"):
+                        if ren_name and ren_name != sel_handler:
+                            if not ren_name.endswith(".py"): ren_name += ".py"
+                            os.rename(os.path.join(HANDLERS_FOLDER, sel_handler), os.path.join(HANDLERS_FOLDER, ren_name))
+                            st.rerun()
 
-    with c_ren:
-        with st.popover("✏️", use_container_width=True, help="Переименовать"):
-            if sel_handler:
-                st.write(f"Переименовать **{sel_handler}**")
-                ren_name = st.text_input("Новое имя:", value=sel_handler, key="ren_h_input")
-                if st.button("Сохранить", key="ren_h_btn"):
-                    if ren_name and ren_name != sel_handler:
-                        if not ren_name.endswith(".py"): ren_name += ".py"
-                        os.rename(os.path.join(HANDLERS_FOLDER, sel_handler), os.path.join(HANDLERS_FOLDER, ren_name))
+        with c_del:
+            with st.popover("🗑️", use_container_width=True, help="Удалить"):
+                if sel_handler:
+                    st.write(f"Удалить **{sel_handler}**?")
+                    if st.button("🔥 Да", type="primary", key="del_h_btn"):
+                        os.remove(os.path.join(HANDLERS_FOLDER, sel_handler))
                         st.rerun()
 
-    with c_del:
-        with st.popover("🗑️", use_container_width=True, help="Удалить"):
-            if sel_handler:
-                st.write(f"Удалить **{sel_handler}**?")
-                if st.button("🔥 Да", type="primary", key="del_h_btn"):
-                    os.remove(os.path.join(HANDLERS_FOLDER, sel_handler))
-                    st.rerun()
+        st.divider()
+
+        if sel_handler:
+            h_path = os.path.join(HANDLERS_FOLDER, sel_handler)
+            buffer_key = "etl_code_buffer"
+            last_file_key = "etl_last_loaded_file"
+
+            if (last_file_key not in st.session_state) or (st.session_state[last_file_key] != sel_handler):
+                if os.path.exists(h_path):
+                    with open(h_path, "r", encoding="utf-8") as f: st.session_state[buffer_key] = f.read()
+                else: st.session_state[buffer_key] = ""
+                st.session_state[last_file_key] = sel_handler
+
+            from code_editor import code_editor
+            custom_buttons = [{"name": "Save", "feather": "Save", "hasText": True, "alwaysOn": True, "commands": ["submit"], "style": {"top": "0.46rem", "right": "0.4rem", "background-color": "#FF4B4B", "color": "white", "border-radius": "4px"}}]
+            res_h = code_editor(st.session_state[buffer_key], lang="python", height=[20, 30], key=f"editor_component_{sel_handler}", buttons=custom_buttons)
+
+            if res_h['text'] is not None and res_h['text'] != st.session_state[buffer_key]:
+                st.session_state[buffer_key] = res_h['text']
+
+            if res_h['type'] == "submit":
+                if res_h['text']:
+                    with open(h_path, "w", encoding="utf-8") as f: f.write(res_h['text'])
+                    st.toast(f"✅ Сохранено!")
+        else:
+            st.info("👈 Выберите скрипт.")
+
+except BaseException as e:
+    _run_error = e
+    raise
+
+finally:
+    # --- ПРОФИЛЬ ПРОХОДА (если был запрошен) ---
+    finish_rerun_profile(_rerun_prof, interrupted_by=_run_error)
 
-    st.divider()
-
-    if sel_handler:
-        h_path = os.path.join(HANDLERS_FOLDER, sel_handler)
-        buffer_key = "etl_code_buffer"
-        last_file_key = "etl_last_loaded_file"
-
-        if (last_file_key not in st.session_state) or (st.session_state[last_file_key] != sel_handler):
-            if os.path.exists(h_path):
-                with open(h_path, "r", encoding="utf-8") as f: st.session_state[buffer_key] = f.read()
-            else: st.session_state[buffer_key] = ""
-            st.session_state[last_file_key] = sel_handler
-
-        custom_buttons = [{"name": "Save", "feather": "Save", "hasText": True, "alwaysOn": True, "commands": ["submit"], "style": {"top": "0.46rem", "right": "0.4rem", "background-color": "#FF4B4B", "color": "white", "border-radius": "4px"}}]
-        res_h = code_editor(st.session_state[buffer_key], lang="python", height=[20, 30], key=f"editor_component_{sel_handler}", buttons=custom_buttons)
-        
-        if res_h['text'] is not None and res_h['text'] != st.session_state[buffer_key]:
-            st.session_state[buffer_key] = res_h['text']
-
-        if res_h['type'] == "submit":
-            if res_h['text']:
-                with open(h_path, "w", encoding="utf-8") as f: f.write(res_h['text'])
-                st.toast(f"✅ Сохранено!")
-    else:
-        st.info("👈 Выберите скрипт.")
\ No newline at end of file
+render_rerun_profile_panel()
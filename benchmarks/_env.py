@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+
+# Корень репозитория (чтобы `modules.*` импортировались при запуске из любой папки)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def isolated_workspace(prefix="genai_bench_"):
+    """
+    Создает временную рабочую папку и делает ее текущей.
+
+    modules/settings.py строит все пути от os.getcwd() в момент импорта,
+    поэтому функцию нужно вызвать ДО первого импорта `modules.*`:
+    бенчмарк не тронет реальные config/, charts/ и data_sources/.
+    """
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workdir)
+    return workdir
+
+
+def use_repo_connectors():
+    """Коннекторы ищутся в BASE_DIR/modules/connectors — в рабочей папке их нет, направляем в репозиторий."""
+    from modules import connector_loader
+    connector_loader.CONNECTORS_DIR = os.path.join(REPO_DIR, "modules", "connectors")
@@ -0,0 +1,180 @@
+"""
+Локальные заменители внешних систем для бенчмарков: YT-клиент, Superset HTTP API и gspread.
+Коннекторы из modules/connectors работают с ними без изменений кода и без сети.
+"""
+import sys
+import json
+import types
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+# Наборы данных, которые отдают заменители: ключ — путь YT / SQL-запрос / ссылка на таблицу
+FAKE_DATASETS = {}
+
+
+# ==========================================
+# СИНТЕТИЧЕСКИЕ ДАННЫЕ
+# ==========================================
+
+def make_dataset(rows, cols=10, seed=42, shape="mixed"):
+    """
+    Генерирует DataFrame заданного размера.
+
+    shape:
+        "mixed"   — числа, категории, даты и строки вперемешку (похоже на выгрузки продаж);
+        "numeric" — только числа (узкие быстрые колонки);
+        "text"    — длинные строки (тяжелые для CSV/XLSX).
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = shape if shape != "mixed" else ["int", "float", "category", "date", "text"][i % 5]
+        name = f"col_{i}_{kind}"
+        if kind in ("int", "numeric"):
+            data[name] = rng.integers(0, 1_000_000, rows)
+        elif kind == "float":
+            data[name] = rng.normal(1000, 250, rows).round(2)
+        elif kind == "category":
+            data[name] = rng.choice(["Москва", "Казань", "Новосибирск", "Самара", "Пермь"], rows)
+        elif kind == "date":
+            data[name] = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+        else:
+            data[name] = [f"item-{x:08d}-" + "x" * 24 for x in rng.integers(0, 10**8, rows)]
+    return pd.DataFrame(data)
+
+
+def _records(df):
+    """Строки в том виде, в каком их отдают API (даты — строками)."""
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+# ==========================================
+# 1. YTsaurus: подменяем модуль yt.wrapper
+# ==========================================
+
+class FakeTablePath:
+    def __init__(self, path, ranges=None, columns=None):
+        self.path = path
+        self.ranges = ranges
+        self.columns = columns
+
+
+class FakeYtClient:
+    def __init__(self, config=None):
+        self.config = config
+
+    def exists(self, path):
+        return _yt_key(path) in FAKE_DATASETS
+
+    def read_table(self, table_path, format=None):
+        df = FAKE_DATASETS[_yt_key(table_path)]
+        if isinstance(table_path, FakeTablePath):
+            if table_path.ranges:
+                upper = table_path.ranges[0].get("upper_limit", {}).get("row_index")
+                if upper is not None:
+                    df = df.iloc[:upper]
+            if table_path.columns:
+                df = df[[c for c in table_path.columns if c in df.columns]]
+        # Настоящий клиент отдает итератор строк
+        return iter(_records(df))
+
+
+def _yt_key(path):
+    return path.path if isinstance(path, FakeTablePath) else path
+
+
+def install_fake_yt():
+    yt_pkg = types.ModuleType("yt")
+    wrapper = types.ModuleType("yt.wrapper")
+    wrapper.YtClient = FakeYtClient
+    wrapper.TablePath = FakeTablePath
+    yt_pkg.wrapper = wrapper
+    sys.modules["yt"] = yt_pkg
+    sys.modules["yt.wrapper"] = wrapper
+
+
+# ==========================================
+# 2. Superset: HTTP-сервер с login и sqllab/execute
+# ==========================================
+
+class _SupersetHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.startswith("/api/v1/security/login"):
+            self._send_json({"access_token": "fake-token"})
+        elif self.path.startswith("/api/v1/sqllab/execute"):
+            df = FAKE_DATASETS.get(req.get("sql", ""))
+            if df is None:
+                self._send_json({"errors": [{"message": "unknown query"}]}, status=400)
+            else:
+                self._send_json({"data": _records(df)})
+        else:
+            self._send_json({"message": "not found"}, status=404)
+
+
+def start_fake_superset(host="127.0.0.1", port=0):
+    """Запускает заглушку Superset в фоне. Возвращает (server, host_url)."""
+    server = ThreadingHTTPServer((host, port), _SupersetHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# ==========================================
+# 3. Google Sheets: подменяем модуль gspread
+# ==========================================
+
+class _FakeWorksheet:
+    def __init__(self, df):
+        self.df = df
+
+    def get_all_records(self):
+        return _records(self.df)
+
+
+class _FakeSpreadsheet:
+    def __init__(self, df):
+        self.df = df
+
+    def get_worksheet(self, index):
+        return _FakeWorksheet(self.df)
+
+
+class _FakeGspreadClient:
+    def open_by_url(self, url):
+        if url not in FAKE_DATASETS:
+            raise _gspread_exceptions.SpreadsheetNotFound(url)
+        return _FakeSpreadsheet(FAKE_DATASETS[url])
+
+    def open_by_key(self, key):
+        return self.open_by_url(key)
+
+
+_gspread_exceptions = types.ModuleType("gspread.exceptions")
+_gspread_exceptions.APIError = type("APIError", (Exception,), {})
+_gspread_exceptions.SpreadsheetNotFound = type("SpreadsheetNotFound", (Exception,), {})
+
+
+def install_fake_gspread():
+    gspread = types.ModuleType("gspread")
+    gspread.authorize = lambda creds: _FakeGspreadClient()
+    gspread.exceptions = _gspread_exceptions
+    sys.modules["gspread"] = gspread
+    sys.modules["gspread.exceptions"] = _gspread_exceptions
@@ -0,0 +1,263 @@
+"""
+Бенчмарк LLM-сценариев на локальной заглушке (без сети): генерация графика мастером,
+✨ AI-правка графика и чат. Каждый сценарий повторяет путь приложения целиком —
+сборка промпта, потоковый ответ, извлечение/применение кода, запись файла.
+
+Запуск из корня репозитория:
+    python -m benchmarks.llm_bench --iterations 20 --latency 0.3 --token-rate 80
+    python -m benchmarks.llm_bench --api openai,gemini --cache both --unique 5 --fail-rate 0.1
+
+--unique задает число разных запросов в серии: при включенном кэше повторы должны
+отдаваться из него (видно по hit_rate и числу запросов, дошедших до заглушки).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import statistics
+
+from benchmarks._env import isolated_workspace
+from benchmarks.render_bench import CHART_TEMPLATE, _percentile
+
+# Исходный график для сценария правки и правка, которую "присылает модель"
+BASE_CHART = CHART_TEMPLATE.format(index=0)
+TITLE_LINE = '    fig = px.line(agg, x="col_3_date", y="col_1_float", template=theme, title="Chart 0")'
+EDIT_REPLY = (
+    "<<<<<<< SEARCH\n" + TITLE_LINE + "\n=======\n"
+    + TITLE_LINE.replace('title="Chart 0"', 'title="Выручка по дням", color_discrete_sequence=["#EE1C25"]')
+    + "\n>>>>>>> REPLACE"
+)
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant."
+
+
+def stub_reply(system_text, user_text):
+    """Ответ заглушки по типу запроса (у Gemini системный промпт приходит внутри текста)."""
+    text = system_text + "\n" + user_text
+    if "<<<<<<< SEARCH" in text:
+        return EDIT_REPLY
+    if CHAT_SYSTEM_PROMPT in text:
+        return "Судя по данным, выручка растет по понедельникам. " * 8
+    return "Вот код графика:\n```python\n" + CHART_TEMPLATE.format(index=1) + "```\n"
+
+
+def _consume(stream):
+    """Читает поток до конца. Возвращает (текст, время до первого куска в мс)."""
+    t0 = time.perf_counter()
+    ttft, parts = None, []
+    for piece in stream:
+        if ttft is None:
+            ttft = (time.perf_counter() - t0) * 1000
+        parts.append(piece)
+    return "".join(parts), ttft
+
+
+class _Timer:
+    """Суммирует время по фазам сценария (фаза может повторяться, например llm при запасном пути)."""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+
+# --- СЦЕНАРИИ (повторяют код мастера, попапа ✨ и чата) ---
+
+def run_wizard(provider, model, request_no, data_path, use_cache):
+    from modules.llm_manager import ask_llm_stream
+    from modules.wizards import CHART_SYSTEM_PROMPT, build_chart_prompt, clean_gemini_code, save_generated_chart
+    from modules.catalog import describe_for_prompt
+    from modules.chart_runtime import validate_chart_code
+
+    t = _Timer()
+    py_name = f"wiz_chart_{request_no}.py"
+    with t.phase("prompt"):
+        cols_info = describe_for_prompt(data_path)
+        prompt = build_chart_prompt(py_name, cols_info, f"Динамика выручки, вариант {request_no}",
+                                    "Линейный график", "Фильтр по городу", ["#EE1C25", "#231F20", "#eae7e7"], True)
+    with t.phase("llm"):
+        text, ttft = _consume(ask_llm_stream(provider, model, CHART_SYSTEM_PROMPT, prompt, use_cache=use_cache))
+    with t.phase("extract"):
+        code = clean_gemini_code(text)
+        valid, msg = validate_chart_code(code)
+        if not valid:
+            raise RuntimeError(msg)
+    with t.phase("write"):
+        save_generated_chart(py_name, code, provider, model, prompt)
+    return t.phases, ttft
+
+
+def run_refactor(provider, model, request_no, data_path, use_cache):
+    from modules.llm_manager import ask_llm_stream
+    from modules.settings import CHARTS_FOLDER
+    from modules.wizards import clean_gemini_code
+    from modules.catalog import describe_for_prompt
+    from modules.chart_runtime import validate_chart_code
+    from modules.code_patch import (EDIT_FORMAT_PROMPT, REFACTOR_SYSTEM_PROMPT, PatchError, build_refactor_prompt,
+                                    split_header, parse_edit_blocks, apply_edit_blocks)
+
+    fpath = os.path.join(CHARTS_FOLDER, "refactor_target.py")
+    with open(fpath, "w", encoding="utf-8") as f:
+        f.write(BASE_CHART)
+
+    t = _Timer()
+    with t.phase("prompt"):
+        with open(fpath, "r", encoding="utf-8") as f:
+            current_code = f.read()
+        code_header, code_body = split_header(current_code)
+        prompt = build_refactor_prompt(code_body, describe_for_prompt(data_path),
+                                       f"Сделай заголовок понятнее и линию красной ({request_no})")
+    with t.phase("llm"):
+        text, ttft = _consume(ask_llm_stream(provider, model, EDIT_FORMAT_PROMPT, prompt, use_cache=use_cache))
+    with t.phase("extract"):
+        try:
+            new_body = apply_edit_blocks(code_body, parse_edit_blocks(text))
+            valid, msg = validate_chart_code(new_body)
+            if not valid:
+                raise PatchError(msg)
+        except PatchError:
+            new_body = None
+    if new_body is None:
+        # Запасной путь, как в приложении: полная перезапись модуля
+        with t.phase("llm"):
+            text, _ = _consume(ask_llm_stream(provider, model, REFACTOR_SYSTEM_PROMPT, prompt, use_cache=use_cache))
+        with t.phase("extract"):
+            new_body = clean_gemini_code(text)
+    with t.phase("write"):
+        with open(fpath, "w", encoding="utf-8") as f:
+            f.write(code_header + new_body.strip() + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    return t.phases, ttft
+
+
+_CHAT_HISTORY = []
+
+
+def run_chat(provider, model, request_no, data_path, use_cache):
+    from modules.llm_manager import ask_llm_stream
+
+    t = _Timer()
+    question = f"Что видно на графике выручки? (вопрос {request_no})"
+    with t.phase("prompt"):
+        _CHAT_HISTORY.append({"role": "user", "content": question})
+        context_str = ""
+        for m in _CHAT_HISTORY[-4:]:
+            role = "User" if m["role"] == "user" else "Assistant"
+            context_str += f"{role}: {m['content']}\n"
+        prompt = f"HISTORY:\n{context_str}\nCURRENT REQUEST:\n{question}"
+    with t.phase("llm"):
+        text, ttft = _consume(ask_llm_stream(provider, model, CHAT_SYSTEM_PROMPT, prompt, use_cache=use_cache))
+    _CHAT_HISTORY.append({"role": "assistant", "content": text})
+    return t.phases, ttft
+
+
+SCENARIOS = {"wizard": run_wizard, "refactor": run_refactor, "chat": run_chat}
+
+
+def bench_path(name, provider, model, iterations, unique, data_path, use_cache, stub):
+    from modules import llm_cache
+    from modules.llm_manager import LLMError
+
+    llm_cache.clear()
+    _CHAT_HISTORY.clear()
+    requests_before = stub.requests
+
+    totals, ttfts, errors, phases = [], [], [], {}
+    for i in range(iterations):
+        if name == "chat" and i % unique == 0:
+            _CHAT_HISTORY.clear()  # Новый диалог — те же вопросы могут повториться слово в слово
+        t0 = time.perf_counter()
+        try:
+            ph, ttft = SCENARIOS[name](provider, model, i % unique, data_path, use_cache)
+        except (LLMError, RuntimeError) as e:
+            errors.append(str(e)[:200])
+            continue
+        totals.append((time.perf_counter() - t0) * 1000)
+        if ttft is not None:
+            ttfts.append(ttft)
+        for k, v in ph.items():
+            phases.setdefault(k, []).append(v)
+
+    stats = llm_cache.get_stats()
+    return {
+        "path": name,
+        "provider": provider,
+        "cache": use_cache,
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(totals), 1) if totals else None,
+        "p95_ms": round(_percentile(totals, 95), 1) if totals else None,
+        "ttft_p50_ms": round(statistics.median(ttfts), 1) if ttfts else None,
+        "phases_mean_ms": {k: round(statistics.mean(v), 2) for k, v in phases.items()},
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "cache_hit_rate": round(stats["hit_rate"], 3),
+        "stub_requests": stub.requests - requests_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM paths benchmark against a local stub")
+    parser.add_argument("--paths", default="wizard,refactor,chat")
+    parser.add_argument("--api", default="openai", help="openai, gemini или оба через запятую")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--unique", type=int, default=5, help="Разных запросов в серии (повторы идут по кругу)")
+    parser.add_argument("--cache", default="both", choices=["on", "off", "both"])
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка до первого токена, сек")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="Токенов в секунду")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=500)
+    parser.add_argument("--abort-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    args = parser.parse_args()
+    launch_dir = os.getcwd()
+
+    isolated_workspace(prefix="genai_llm_bench_")
+    from modules.settings import init_project_structure, DATA_FOLDER
+    from modules import llm_manager
+    from benchmarks.fakes import make_dataset
+    from benchmarks.llm_stub import StubConfig, start_in_background, gemini_url
+
+    init_project_structure()
+    data_path = os.path.join(DATA_FOLDER, "llm_bench.csv")
+    make_dataset(2000, cols=5).to_csv(data_path, index=False)
+
+    stub_conf = StubConfig(latency=args.latency, reply=stub_reply, token_rate=args.token_rate,
+                           fail_rate=args.fail_rate, fail_status=args.fail_status, abort_rate=args.abort_rate)
+    server, stub, base_url = start_in_background(stub_conf)
+    llm_manager.save_provider("stub-openai", "openai", "sk-stub", base_url, "stub-model")
+    llm_manager.save_provider("stub-gemini", "gemini", "stub-key", "", "stub-model", api_endpoint=gemini_url(base_url))
+
+    cache_modes = {"on": [True], "off": [False], "both": [False, True]}[args.cache]
+    results = []
+    for api in [a.strip() for a in args.api.split(",") if a.strip()]:
+        provider = f"stub-{api}"
+        for path in [p.strip() for p in args.paths.split(",") if p.strip()]:
+            for use_cache in cache_modes:
+                r = bench_path(path, provider, "stub-model", args.iterations, max(1, args.unique),
+                               data_path, use_cache, stub)
+                results.append(r)
+                print(f"{provider:<12} {path:<9} cache={'on ' if use_cache else 'off'} "
+                      f"p50 {r['p50_ms'] or 0:>8.0f} ms  p95 {r['p95_ms'] or 0:>8.0f} ms  "
+                      f"ttft {r['ttft_p50_ms'] or 0:>7.0f} ms  hit {r['cache_hit_rate']:.0%}  "
+                      f"errors {r['errors']}", file=sys.stderr)
+
+    server.shutdown()
+    report = {"params": vars(args), "stub": {"failures": stub.failures, "aborts": stub.aborts}, "results": results}
+    if args.output:
+        out = args.output if os.path.isabs(args.output) else os.path.join(launch_dir, args.output)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
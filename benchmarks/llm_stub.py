@@ -0,0 +1,260 @@
+"""
+Локальная заглушка LLM API для бенчмарков (без сети).
+
+Понимает:
+    POST /v1/chat/completions                        — OpenAI-совместимый (обычный и stream=True, SSE);
+    POST /v1beta/models/<model>:generateContent      — Gemini REST;
+    POST /v1beta/models/<model>:streamGenerateContent — Gemini REST, поток (JSON-массив или ?alt=sse).
+
+Поведение настраивается StubConfig: задержка до первого токена, скорость выдачи токенов,
+доля ошибок (HTTP-статус) и обрывов потока на середине.
+
+Запуск отдельно:
+    python -m benchmarks.llm_stub --port 8765 --latency 0.2 --token-rate 50 --fail-rate 0.1
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubConfig:
+    def __init__(self, latency=0.0, reply="```python\ndef render(files):\n    return None\n```",
+                 token_rate=0.0, fail_rate=0.0, fail_status=500, abort_rate=0.0, chunk_tokens=4, seed=0):
+        self.latency = latency          # Задержка до первого токена, сек
+        self.reply = reply              # Текст ответа или функция (system, user) -> текст
+        self.token_rate = token_rate    # Токенов в секунду (0 — весь ответ сразу)
+        self.fail_rate = fail_rate      # Доля запросов, на которые отвечаем ошибкой
+        self.fail_status = fail_status  # HTTP-статус ошибки (500, 429, 503...)
+        self.abort_rate = abort_rate    # Доля потоков, обрываемых на середине
+        self.chunk_tokens = chunk_tokens
+        self.requests = 0
+        self.connections = 0
+        self.failures = 0
+        self.aborts = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def make_reply(self, system_text, user_text):
+        return self.reply(system_text, user_text) if callable(self.reply) else self.reply
+
+
+def split_tokens(text, size=4):
+    """Грубое деление на "токены" (~4 символа), чтобы выдавать ответ с заданной скоростью."""
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1: соединение остается открытым (keep-alive), как у настоящих API
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят отдельными записями: без TCP_NODELAY на keep-alive соединении
+    # Nagle + delayed ACK дают ~40 мс задержки, и переиспользованное соединение выглядит медленнее нового
+    disable_nagle_algorithm = True
+    config = None  # Подставляется в make_server
+
+    def setup(self):
+        super().setup()
+        self.config.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # --- Потоковая выдача (chunked transfer encoding) ---
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _pieces(self, text):
+        """Куски ответа с паузами по token_rate. None в конце — сигнал обрыва потока."""
+        cfg = self.config
+        tokens = split_tokens(text)
+        abort_at = len(tokens) // 2 if cfg.roll(cfg.abort_rate) else None
+        step = max(1, cfg.chunk_tokens)
+        for i in range(0, len(tokens), step):
+            if abort_at is not None and i >= abort_at:
+                cfg.count("aborts")
+                yield None
+                return
+            if cfg.token_rate > 0:
+                time.sleep(step / cfg.token_rate)
+            yield "".join(tokens[i:i + step])
+
+    def _generation_time(self, text):
+        cfg = self.config
+        return len(split_tokens(text)) / cfg.token_rate if cfg.token_rate > 0 else 0.0
+
+    # --- Маршрутизация ---
+
+    def do_POST(self):
+        req = self._read_json()
+        cfg = self.config
+        cfg.count("requests")
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+
+        is_openai = path.endswith("/chat/completions")
+        is_gemini = ":generateContent" in path or ":streamGenerateContent" in path
+        if not (is_openai or is_gemini):
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+            return
+
+        time.sleep(cfg.latency)
+        if cfg.roll(cfg.fail_rate):
+            cfg.count("failures")
+            self._send_json({"error": {"code": cfg.fail_status, "message": "Injected failure"}}, status=cfg.fail_status)
+            return
+
+        if is_openai:
+            self._openai(req)
+        else:
+            model = path.rsplit("/", 1)[-1].split(":")[0]
+            stream = ":streamGenerateContent" in path
+            sse = parse_qs(url.query).get("alt", [""])[0] == "sse"
+            self._gemini(req, model, stream, sse)
+
+    def _openai(self, req):
+        messages = req.get("messages", [])
+        system_text = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user_text = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        text = self.config.make_reply(system_text, user_text)
+        model = req.get("model", "stub")
+        base = {"id": f"chatcmpl-{self.config.requests}", "created": int(time.time()), "model": model}
+
+        if not req.get("stream"):
+            time.sleep(self._generation_time(text))
+            self._send_json(dict(base, object="chat.completion", choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }], usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}))
+            return
+
+        self._start_chunked("text/event-stream")
+        for piece in self._pieces(text):
+            if piece is None:
+                self.close_connection = True
+                return
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        done = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self._write_chunk(f"data: {json.dumps(done)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _gemini(self, req, model, stream, sse):
+        parts = [p.get("text", "") for c in req.get("contents", []) for p in c.get("parts", [])]
+        text = self.config.make_reply("", "\n".join(parts))
+
+        def candidate(piece, finished):
+            item = {"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}
+            if finished:
+                item["finishReason"] = "STOP"
+            return {"candidates": [item], "modelVersion": model}
+
+        if not stream:
+            time.sleep(self._generation_time(text))
+            self._send_json(candidate(text, True))
+            return
+
+        # REST-клиент Gemini читает поток как JSON-массив, с ?alt=sse — как события SSE
+        self._start_chunked("text/event-stream" if sse else "application/json")
+        first = True
+        for piece in self._pieces(text):
+            if piece is None:
+                self.close_connection = True
+                return
+            payload = json.dumps(candidate(piece, False), ensure_ascii=False)
+            if sse:
+                self._write_chunk(f"data: {payload}\r\n\r\n")
+            else:
+                self._write_chunk(("[" if first else ",\r\n") + payload)
+            first = False
+        last = json.dumps(candidate("", True))
+        if sse:
+            self._write_chunk(f"data: {last}\r\n\r\n")
+        else:
+            self._write_chunk(("[" if first else ",\r\n") + last + "]")
+        self._end_chunked()
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    """Создает сервер-заглушку. port=0 — взять любой свободный."""
+    config = config or StubConfig()
+    handler = type("StubHandler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, config
+
+
+def start_in_background(config=None, host="127.0.0.1", port=0):
+    """
+    Запускает заглушку в фоновом потоке. Возвращает (server, config, base_url).
+    base_url — для OpenAI-совместимых провайдеров; для Gemini нужен api_endpoint без /v1 (gemini_url).
+    """
+    server, config = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, config, base_url
+
+
+def gemini_url(base_url):
+    """Адрес заглушки для провайдера типа gemini (SDK сам добавляет /v1beta/...)."""
+    return base_url[:-len("/v1")] if base_url.endswith("/v1") else base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI/Gemini-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка до первого токена, сек")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Токенов в секунду (0 — мгновенно)")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=500)
+    parser.add_argument("--abort-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, token_rate=args.token_rate, fail_rate=args.fail_rate,
+                        fail_status=args.fail_status, abort_rate=args.abort_rate)
+    server, _ = make_server(config, args.host, args.port)
+    print(f"Stub listening on http://{args.host}:{args.port}/v1 (Gemini: http://{args.host}:{args.port})")
+    server.serve_forever()
@@ -0,0 +1,64 @@
+"""
+Время до первого байта (TTFB) для ask_llm: пул клиентов против нового клиента на каждый вызов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.llm_ttfb --calls 50
+"""
+import json
+import time
+import argparse
+import statistics
+
+from benchmarks._env import isolated_workspace
+
+
+def _measure(ask_llm, calls, before_call=None):
+    timings = []
+    for i in range(calls):
+        if before_call:
+            before_call()
+        t0 = time.perf_counter()
+        ok, content = ask_llm("stub", "stub-model", "system", f"prompt {i}", use_cache=False)
+        timings.append(time.perf_counter() - t0)
+        if not ok:
+            raise RuntimeError(content)
+    return {
+        "calls": calls,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ask_llm TTFB: pooled vs fresh clients")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.0, help="Искусственная задержка заглушки, сек")
+    args = parser.parse_args()
+
+    isolated_workspace()
+    from modules.settings import init_project_structure
+    from modules import llm_manager
+    from benchmarks.llm_stub import StubConfig, start_in_background
+
+    init_project_structure()
+    server, stub, base_url = start_in_background(StubConfig(latency=args.latency))
+    llm_manager.save_provider("stub", "openai", "sk-stub", base_url, "stub-model")
+
+    # "До": клиент и соединение создаются заново на каждый вызов
+    stub.connections = 0
+    fresh = _measure(llm_manager.ask_llm, args.calls, before_call=llm_manager.invalidate_clients)
+    fresh["connections"] = stub.connections
+
+    # "После": клиент из пула, соединение переиспользуется
+    llm_manager.invalidate_clients()
+    stub.connections = 0
+    pooled = _measure(llm_manager.ask_llm, args.calls)
+    pooled["connections"] = stub.connections
+
+    server.shutdown()
+    print(json.dumps({"fresh_client": fresh, "pooled_client": pooled}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
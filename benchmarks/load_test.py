@@ -0,0 +1,189 @@
+"""
+Нагрузочный тест: N одновременных сессий дашборда в одном процессе (как один сервер Streamlit).
+
+Каждая сессия — отдельный AppTest в своем потоке. Сценарий пользователя: открыть дашборд,
+затем по кругу переключать страницы и менять фильтр в графике, с паузой "на подумать".
+Все сессии делят кэши модулей и память процесса, поэтому цифры годятся для подбора
+размера контейнера и проверки кэширования.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_test --sessions 30 --actions 10
+    python -m benchmarks.load_test --sessions 50 --pages 3 --charts 6 --rows 50000 --output load.json
+
+Отчет: p50/p95/p99 времени прохода (всего и по типам действий), проходов в секунду,
+загрузка CPU процессом и RSS (средний и пиковый).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+import concurrent.futures
+
+from benchmarks._env import REPO_DIR, isolated_workspace
+from benchmarks.render_bench import build_workspace, _percentile, _peak_rss_mb
+
+PAGE_SELECT_LABEL = "Выберите страницу:"
+
+
+def _current_rss_mb():
+    """Текущий RSS процесса: /proc (Linux) или psutil, если установлен."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+class ResourceSampler:
+    """Фоновый замер RSS раз в interval секунд."""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            rss = _current_rss_mb()
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _page_select(at):
+    return next(s for s in at.sidebar.selectbox if s.label == PAGE_SELECT_LABEL)
+
+
+def run_session(session_id, pages_conf, actions, think_time, timeout, start_delay):
+    """Сценарий одного пользователя. Возвращает список (действие, мс, ошибка)."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(session_id)
+    time.sleep(start_delay)
+    timings = []
+
+    def step(action, at):
+        t0 = time.perf_counter()
+        try:
+            at.run(timeout=timeout)
+            error = at.exception[0].message if at.exception else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        timings.append((action, (time.perf_counter() - t0) * 1000, error))
+
+    at = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=timeout)
+    step("open", at)
+
+    page_names = list(pages_conf)
+    for i in range(actions):
+        time.sleep(rng.uniform(0, think_time * 2))
+        current = _page_select(at).value
+        charts = pages_conf.get(current, [])
+        if len(page_names) > 1 and (i % 2 == 0 or not charts):
+            _page_select(at).set_value(rng.choice([p for p in page_names if p != current]))
+            step("page_switch", at)
+        elif charts:
+            flt = at.selectbox(key=f"flt_{rng.choice(charts)}")
+            flt.set_value(rng.choice(list(flt.options)))
+            step("filter", at)
+        else:
+            step("rerun", at)
+    return timings
+
+
+def _latency_stats(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(statistics.median(values), 1) if values else None,
+        "p95_ms": round(_percentile(values, 95), 1) if values else None,
+        "p99_ms": round(_percentile(values, 99), 1) if values else None,
+        "max_ms": round(max(values), 1) if values else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent dashboard sessions load test via Streamlit AppTest")
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--actions", type=int, default=10, help="Действий на сессию после открытия")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--charts", type=int, default=4, help="Графиков на странице")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--think-time", type=float, default=1.0, help="Средняя пауза между действиями, сек")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="За сколько секунд стартуют все сессии")
+    parser.add_argument("--timeout", type=float, default=300, help="Лимит на один проход, сек")
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    isolated_workspace(prefix="genai_load_test_")
+    pages_conf = build_workspace(args.charts, args.rows, pages=args.pages)
+
+    # Импорт заранее, чтобы первая сессия не платила за него в замерах
+    import streamlit.testing.v1  # noqa: F401
+
+    rss_before = _current_rss_mb()
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    with ResourceSampler() as sampler:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            futures = [
+                executor.submit(run_session, i, pages_conf, args.actions, args.think_time, args.timeout,
+                                args.ramp_up * i / max(1, args.sessions))
+                for i in range(args.sessions)
+            ]
+            all_timings = [t for f in concurrent.futures.as_completed(futures) for t in f.result()]
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    ok = [ms for _, ms, err in all_timings if not err]
+    errors = [err for _, ms, err in all_timings if err]
+    by_action = {}
+    for action, ms, err in all_timings:
+        if not err:
+            by_action.setdefault(action, []).append(ms)
+
+    report = {
+        "params": vars(args),
+        "wall_s": round(wall, 2),
+        "reruns_per_s": round(len(ok) / wall, 2) if wall else None,
+        "latency": _latency_stats(ok),
+        "by_action": {a: _latency_stats(v) for a, v in by_action.items()},
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        # process_time суммирует все потоки: 200% = два ядра заняты полностью
+        "cpu_percent": round(cpu / wall * 100, 1) if wall else None,
+        "rss_start_mb": round(rss_before, 1) if rss_before else None,
+        "rss_mean_mb": round(statistics.mean(sampler.samples), 1) if sampler.samples else None,
+        "rss_peak_mb": round(max(sampler.samples), 1) if sampler.samples else _peak_rss_mb(),
+    }
+
+    lat = report["latency"]
+    print(f"{args.sessions} сессий, {len(ok)} проходов за {wall:.1f} c: p50 {lat['p50_ms']} ms, "
+          f"p95 {lat['p95_ms']} ms, p99 {lat['p99_ms']} ms; CPU {report['cpu_percent']}%, "
+          f"RSS пик {report['rss_peak_mb']} MB; ошибок {len(errors)}", file=sys.stderr)
+
+    if args.output:
+        with open(os.path.join(REPO_DIR, args.output) if not os.path.isabs(args.output) else args.output,
+                  "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
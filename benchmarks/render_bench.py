@@ -0,0 +1,205 @@
+"""
+Бенчмарк рендера дашборда: app.py прогоняется без браузера через streamlit.testing.v1.AppTest
+на странице из N сгенерированных графиков поверх данных из M строк.
+
+Каждая комбинация (графики × строки) запускается в отдельном процессе, чтобы холодный старт
+включал импорты, а пиковая память не копилась между прогонами.
+
+Запуск из корня репозитория:
+    python -m benchmarks.render_bench --charts 1,5,20 --rows 1000,100000
+    python -m benchmarks.render_bench --budgets benchmarks/render_budgets.json --output render.json
+
+Замеры:
+    cold_ms      — первый проход новой сессии в свежем процессе (импорты + чтение + рендер);
+    warm_*       — повторные проходы без изменений (как после клика по любой кнопке);
+    widget_*     — проходы после смены фильтра внутри первого графика;
+    peak_rss_mb  — пиковый RSS процесса (Unix).
+С --budgets скрипт завершается с кодом 1, если какой-то замер вышел за бюджет.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from benchmarks._env import REPO_DIR, isolated_workspace
+
+PAGE_NAME = "Bench"
+
+# Шаблон графика в стиле сгенерированных мастером: фильтр-виджет, агрегация, Plotly-фигура
+CHART_TEMPLATE = '''"""
+--- GENERATED BY render_bench ---
+"""
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+
+def render(files, chart_key="chart", theme="plotly_dark"):
+    df = pd.read_csv(files[0])
+    cities = ["Все"] + sorted(df["col_2_category"].unique().tolist())
+    city = st.selectbox("Город", cities, key=f"flt_{{chart_key}}")
+    if city != "Все":
+        df = df[df["col_2_category"] == city]
+    agg = df.groupby("col_3_date", as_index=False)["col_1_float"].sum()
+    fig = px.line(agg, x="col_3_date", y="col_1_float", template=theme, title="Chart {index}")
+    st.plotly_chart(fig, use_container_width=True, key=f"fig_{{chart_key}}")
+    return fig
+'''
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдает KB, macOS — байты
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        return None
+
+
+def build_workspace(charts, rows, pages=1):
+    """Раскладывает в рабочей папке данные, модули графиков (charts на страницу) и конфиги страниц."""
+    from modules.settings import (init_project_structure, CHARTS_FOLDER, DATA_FOLDER,
+                                  CONFIG_FILE, PAGES_CONFIG_FILE)
+    from modules.utils import save_json
+    from benchmarks.fakes import make_dataset
+
+    init_project_structure()
+    data_name = f"bench_{rows}.csv"
+    make_dataset(rows, cols=5, seed=rows).to_csv(os.path.join(DATA_FOLDER, data_name), index=False)
+
+    pages_conf = {}
+    for p in range(pages):
+        page_name = PAGE_NAME if pages == 1 else f"{PAGE_NAME} {p + 1}"
+        pages_conf[page_name] = []
+        for i in range(charts):
+            name = f"bench_chart_{p:02d}_{i:03d}.py"
+            with open(os.path.join(CHARTS_FOLDER, name), "w", encoding="utf-8") as f:
+                f.write(CHART_TEMPLATE.format(index=i))
+            pages_conf[page_name].append(name)
+
+    save_json(PAGES_CONFIG_FILE, pages_conf)
+    save_json(CONFIG_FILE, {name: [data_name] for names in pages_conf.values() for name in names})
+    return pages_conf
+
+
+def _run(at, timeout):
+    t0 = time.perf_counter()
+    at.run(timeout=timeout)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if at.exception:
+        raise RuntimeError(f"Исключение в app.py: {at.exception[0].message}")
+    return elapsed
+
+
+def run_case(charts, rows, warm_reruns, widget_reruns, timeout):
+    """Код дочернего процесса: одна комбинация, результат — словарь замеров."""
+    isolated_workspace(prefix="genai_render_bench_")
+    chart_names = build_workspace(charts, rows)[PAGE_NAME]
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=timeout)
+    cold_ms = _run(at, timeout)
+
+    warm = [_run(at, timeout) for _ in range(warm_reruns)]
+
+    widget = []
+    if chart_names:
+        flt = at.selectbox(key=f"flt_{chart_names[0]}")
+        options = list(flt.options)
+        for i in range(widget_reruns):
+            flt.set_value(options[1 + i % (len(options) - 1)] if len(options) > 1 else options[0])
+            widget.append(_run(at, timeout))
+            flt = at.selectbox(key=f"flt_{chart_names[0]}")
+
+    return {
+        "charts": charts,
+        "rows": rows,
+        "cold_ms": round(cold_ms, 1),
+        "warm_p50_ms": round(statistics.median(warm), 1) if warm else None,
+        "warm_p95_ms": round(_percentile(warm, 95), 1) if warm else None,
+        "widget_p50_ms": round(statistics.median(widget), 1) if widget else None,
+        "widget_p95_ms": round(_percentile(widget, 95), 1) if widget else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def check_budgets(results, budgets):
+    """Сравнивает замеры с бюджетами {"cold_ms": ..., "warm_p95_ms": ..., ...}. Возвращает список нарушений."""
+    violations = []
+    for r in results:
+        for metric, limit in budgets.items():
+            value = r.get(metric)
+            if value is not None and value > limit:
+                violations.append(f"charts={r['charts']} rows={r['rows']}: {metric}={value} > {limit}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard rerun benchmark via Streamlit AppTest")
+    parser.add_argument("--charts", default="1,5,20", help="Число графиков на странице через запятую")
+    parser.add_argument("--rows", default="1000,100000", help="Строк в наборе данных через запятую")
+    parser.add_argument("--warm-reruns", type=int, default=5)
+    parser.add_argument("--widget-reruns", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300, help="Лимит на один проход, сек")
+    parser.add_argument("--budgets", help="JSON с бюджетами замеров (см. benchmarks/render_budgets.json)")
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    parser.add_argument("--worker", nargs=2, type=int, metavar=("CHARTS", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_case(*args.worker, args.warm_reruns, args.widget_reruns, args.timeout)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for charts in [int(c) for c in args.charts.split(",") if c.strip()]:
+        for rows in [int(r) for r in args.rows.split(",") if r.strip()]:
+            cmd = [sys.executable, "-m", "benchmarks.render_bench", "--worker", str(charts), str(rows),
+                   "--warm-reruns", str(args.warm_reruns), "--widget-reruns", str(args.widget_reruns),
+                   "--timeout", str(args.timeout)]
+            proc = subprocess.run(cmd, cwd=REPO_DIR, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"charts={charts} rows={rows}: ошибка\n{proc.stderr[-2000:]}", file=sys.stderr)
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            print(f"charts={charts:<4} rows={rows:<8} cold {r['cold_ms']:>8.0f} ms  "
+                  f"warm p50 {r['warm_p50_ms'] or 0:>7.0f} ms  widget p50 {r['widget_p50_ms'] or 0:>7.0f} ms  "
+                  f"rss {r['peak_rss_mb'] or 0:>7.0f} MB", file=sys.stderr)
+
+    report = {"results": results}
+    violations = []
+    if args.budgets:
+        with open(args.budgets, "r", encoding="utf-8") as f:
+            budgets = json.load(f)
+        violations = check_budgets(results, budgets)
+        report["budgets"] = budgets
+        report["violations"] = violations
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    for v in violations:
+        print(f"⛔ Бюджет превышен: {v}", file=sys.stderr)
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Холодный старт app.py: сколько стоит первый проход новой сессии в свежем процессе
+и какие тяжелые библиотеки он успевает загрузить.
+
+Каждый замер — отдельный процесс, запущенный с `-X importtime`; из его лога берутся
+самые дорогие импорты верхнего уровня.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup_bench --repeat 5
+    python -m benchmarks.startup_bench --charts 3 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from benchmarks._env import REPO_DIR
+
+# Что не должно грузиться, пока пользователь только смотрит дашборд без графиков
+HEAVY_MODULES = [
+    "pandas", "numpy", "plotly", "code_editor", "openai", "google.generativeai",
+    "google_auth_oauthlib", "google.oauth2", "gspread", "yt.wrapper", "requests",
+]
+
+
+def worker(workdir):
+    """Код дочернего процесса: один холодный проход app.py в подготовленной папке."""
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - t0) * 1000
+
+    at = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=300)
+    t0 = time.perf_counter()
+    at.run()
+    first_run_ms = (time.perf_counter() - t0) * 1000
+
+    return {
+        "streamlit_import_ms": round(streamlit_ms, 1),
+        "first_run_ms": round(first_run_ms, 1),
+        "exception": at.exception[0].message if at.exception else None,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+
+
+def parse_importtime(stderr, top=15):
+    """Самые дорогие импорты верхнего уровня из лога -X importtime (cumulative, мс)."""
+    costs = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        if name.startswith(" ") and not name.startswith("  "):
+            # Один пробел перед именем — импорт верхнего уровня (вложенные сдвинуты сильнее)
+            costs[name.strip()] = costs.get(name.strip(), 0) + int(cumulative_us) / 1000
+    return sorted(({"module": k, "ms": round(v, 1)} for k, v in costs.items()), key=lambda x: -x["ms"])[:top]
+
+
+def prepare_workspace(charts, rows):
+    """Рабочая папка с конфигами (и при charts > 0 — с графиками и данными)."""
+    import tempfile
+    workdir = tempfile.mkdtemp(prefix="genai_startup_bench_")
+    code = (
+        "import os, sys; sys.path.insert(0, sys.argv[1]); os.chdir(sys.argv[2]);"
+        "from benchmarks.render_bench import build_workspace, PAGE_NAME;"
+        "from modules.settings import init_project_structure, PAGES_CONFIG_FILE;"
+        "from modules.utils import save_json;"
+        f"build_workspace({charts}, {rows}) if {charts} else (init_project_structure(), save_json(PAGES_CONFIG_FILE, {{PAGE_NAME: []}}))"
+    )
+    # Отдельный процесс: settings.py фиксирует пути от cwd при импорте
+    subprocess.run([sys.executable, "-c", code, REPO_DIR, workdir], check=True)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start time of app.py")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--charts", type=int, default=0, help="Графиков на странице (0 — только каркас приложения)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker)))
+        return
+
+    workdir = prepare_workspace(args.charts, args.rows)
+    runs, import_costs = [], None
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "benchmarks.startup_bench", "--worker", workdir],
+                              cwd=REPO_DIR, capture_output=True, text=True)
+        process_ms = (time.perf_counter() - t0) * 1000
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:], file=sys.stderr)
+            sys.exit(1)
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        r["process_ms"] = round(process_ms, 1)
+        runs.append(r)
+        import_costs = parse_importtime(proc.stderr)
+
+    report = {
+        "charts": args.charts,
+        "repeat": args.repeat,
+        "first_run_p50_ms": round(statistics.median(r["first_run_ms"] for r in runs), 1),
+        "process_p50_ms": round(statistics.median(r["process_ms"] for r in runs), 1),
+        "streamlit_import_p50_ms": round(statistics.median(r["streamlit_import_ms"] for r in runs), 1),
+        "heavy_loaded": runs[-1]["heavy_loaded"],
+        "exception": runs[-1]["exception"],
+        "top_imports": import_costs,
+        "runs": runs,
+    }
+    print(f"Первый проход app.py: p50 {report['first_run_p50_ms']} ms (процесс целиком {report['process_p50_ms']} ms); "
+          f"загружены: {', '.join(report['heavy_loaded']) or '—'}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
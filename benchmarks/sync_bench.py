@@ -0,0 +1,181 @@
+"""
+Бенчмарк синхронизации: sync_single_source на синтетических данных через локальные заменители
+(YT-клиент, Superset HTTP, gspread). Сеть не нужна.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sync_bench --rows 10000,100000 --formats csv,xlsx --concurrency 1,4
+    python -m benchmarks.sync_bench --output new.json --compare old.json
+
+Результат — JSON (по записи на комбинацию коннектор × строки × формат × параллельность):
+время end-to-end, пиковая память Python (tracemalloc), байты на диске, строки/с.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import concurrent.futures
+
+from benchmarks._env import isolated_workspace, use_repo_connectors
+
+
+def _csv_list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def build_sources(connector, rows, cols, shape, fmt, count, superset_url):
+    """Готовит count источников одного типа, каждый со своим набором данных."""
+    from benchmarks.fakes import FAKE_DATASETS, make_dataset
+
+    sources = []
+    for i in range(count):
+        df = make_dataset(rows, cols, seed=i, shape=shape)
+        filename = f"bench_{connector}_{rows}_{i}.{fmt}"
+        if connector == "ytsaurus":
+            key = f"//home/bench/{filename}"
+            config = {"proxy": "fake", "token": "fake", "path": key, "limit": 0}
+        elif connector == "superset":
+            key = f"SELECT * FROM bench_{i}_{rows}_{cols}_{shape}"
+            config = {"host": superset_url, "username": "u", "password": "p", "database_id": 1, "query": key}
+        else:
+            key = f"https://docs.google.com/spreadsheets/d/bench_{i}_{rows}_{cols}_{shape}"
+            config = {"url": key, "_injected_creds": object()}
+        FAKE_DATASETS[key] = df
+        sources.append({"connector_id": connector, "filename": filename, "config": config, "handler": "None"})
+    return sources
+
+
+def run_sources(sources, concurrency):
+    """Запускает синхронизацию пачкой, как run_updates_in_parallel в app.py."""
+    from modules.data_loader import sync_single_source
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(sync_single_source, sources))
+    failed = [msg for ok, msg, _ in results if not ok]
+    if failed:
+        raise RuntimeError(f"Синхронизация упала: {failed[0]}")
+    return results
+
+
+def bench_case(connector, rows, cols, shape, fmt, concurrency, sources_count, superset_url, repeat, trace_memory):
+    from modules.settings import DATA_FOLDER
+
+    sources = build_sources(connector, rows, cols, shape, fmt, sources_count, superset_url)
+
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run_sources(sources, concurrency)
+        timings.append(time.perf_counter() - t0)
+
+    # Отдельный проход под tracemalloc, чтобы трассировка не искажала время
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        run_sources(sources, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = round(peak / (1024 * 1024), 2)
+
+    bytes_written = sum(os.path.getsize(os.path.join(DATA_FOLDER, s["filename"])) for s in sources)
+    best = min(timings)
+    total_rows = rows * sources_count
+    return {
+        "connector": connector,
+        "rows": rows,
+        "cols": cols,
+        "shape": shape,
+        "format": fmt,
+        "concurrency": concurrency,
+        "sources": sources_count,
+        "best_s": round(best, 4),
+        "mean_s": round(sum(timings) / len(timings), 4),
+        "rows_per_s": round(total_rows / best, 1),
+        "peak_mem_mb": peak_mb,
+        "bytes_written": bytes_written,
+    }
+
+
+def case_key(r):
+    return (r["connector"], r["rows"], r["cols"], r["shape"], r["format"], r["concurrency"], r["sources"])
+
+
+def compare(current, previous_path):
+    """Печатает изменение времени относительно прошлого прогона (по совпадающим комбинациям)."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {case_key(r): r for r in json.load(f)["results"]}
+    print(f"\n{'case':<60} {'old, s':>9} {'new, s':>9} {'delta':>8}")
+    for r in current:
+        old = previous.get(case_key(r))
+        if not old:
+            continue
+        delta = (r["best_s"] - old["best_s"]) / old["best_s"] * 100 if old["best_s"] else 0.0
+        name = f"{r['connector']} rows={r['rows']} fmt={r['format']} x{r['concurrency']}"
+        print(f"{name:<60} {old['best_s']:>9.3f} {r['best_s']:>9.3f} {delta:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sync_single_source benchmark with local stand-in connectors")
+    parser.add_argument("--connectors", default="ytsaurus,superset,google_sheets")
+    parser.add_argument("--rows", default="10000,100000", help="Размеры наборов через запятую")
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--shape", default="mixed", choices=["mixed", "numeric", "text"])
+    parser.add_argument("--formats", default="csv,xlsx", help="Форматы хранения (расширение имени файла)")
+    parser.add_argument("--concurrency", default="1,4", help="Число потоков синхронизации")
+    parser.add_argument("--sources", type=int, default=4, help="Источников в одном прогоне")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Не замерять пиковую память")
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    workdir = isolated_workspace()
+    from modules.settings import init_project_structure
+    from benchmarks.fakes import install_fake_yt, install_fake_gspread, start_fake_superset
+
+    init_project_structure()
+    use_repo_connectors()
+    install_fake_yt()
+    install_fake_gspread()
+    superset_server, superset_url = start_fake_superset()
+
+    results = []
+    for connector in _csv_list(args.connectors):
+        for rows in _csv_list(args.rows, int):
+            for fmt in _csv_list(args.formats):
+                for conc in _csv_list(args.concurrency, int):
+                    r = bench_case(connector, rows, args.cols, args.shape, fmt, conc, args.sources,
+                                   superset_url, args.repeat, not args.no_memory)
+                    results.append(r)
+                    print(f"{connector:<14} rows={rows:<8} fmt={fmt:<5} x{conc:<3} "
+                          f"{r['best_s']:>8.3f} s  {r['rows_per_s']:>12.0f} rows/s  "
+                          f"{(r['peak_mem_mb'] or 0):>8.1f} MB peak  {r['bytes_written'] / 1024 / 1024:>8.2f} MB disk",
+                          file=sys.stderr)
+
+    superset_server.shutdown()
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workdir": workdir,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output if os.path.isabs(args.output) else os.path.join(_launch_dir, args.output), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.compare:
+        compare(results, args.compare if os.path.isabs(args.compare) else os.path.join(_launch_dir, args.compare))
+
+
+# Папка запуска: isolated_workspace меняет cwd, а пути --output/--compare задаются относительно нее
+_launch_dir = os.getcwd()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Локальный HTTP API: фигуры графиков и наборы данных для других инструментов.
+
+    GET /api/health
+    GET /api/charts                              — список графиков (страницы, файлы, версия)
+    GET /api/charts/<chart.py>?theme=plotly_dark — фигура Plotly (JSON)
+    GET /api/datasets                            — список файлов данных (размер, строки, колонки)
+    GET /api/datasets/<file>?format=parquet|arrow|csv|json&columns=a,b
+    GET /api/published/<страница>.html           — статический снимок страницы (modules/publish.py)
+
+У каждого ответа есть ETag и Last-Modified от версий кода и данных. Клиент, который
+опрашивает API с If-None-Match, получает 304 без рендера и чтения файлов; готовые ответы
+хранятся в памяти сервера. Графики рендерятся в изолированном процессе (как "Изолированный
+рендер" в интерфейсе), виджеты внутри render() — со значениями по умолчанию.
+
+Запуск из папки проекта:
+    python -m modules.api_server
+    python -m modules.api_server --host 0.0.0.0 --port 8601 --token SECRET
+"""
+import os
+import io
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import email.utils
+import collections
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.settings import (
+    CHARTS_FOLDER, DATA_FOLDER, PUBLISH_FOLDER, CONFIG_FILE, PAGES_CONFIG_FILE, TITLES_CONFIG_FILE,
+    API_HOST, API_PORT, API_CACHE_MB,
+)
+from modules.utils import load_json
+
+DATASET_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+PUBLISHED_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+STREAM_CHUNK = 1024 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """LRU готовых ответов: ключ -> (etag, last_modified, content_type, body). Ограничение по байтам."""
+
+    def __init__(self, max_mb=API_CACHE_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self._items = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] == etag:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+            self.misses += 1
+            return None
+
+    def put(self, key, item):
+        body = item[3]
+        if len(body) > self.max_bytes // 4:
+            return  # Очень большой ответ вытеснил бы все остальное
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old:
+                self._size -= len(old[3])
+            self._items[key] = item
+            self._size += len(body)
+            while self._size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted[3])
+
+    def key_lock(self, key):
+        """Один расчет на ключ: параллельные запросы того же графика ждут первый, а не рендерят заново."""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "mb": round(self._size / (1024 * 1024), 2),
+                    "hits": self.hits, "misses": self.misses}
+
+
+CACHE = ResponseCache()
+
+
+def _etag(*parts):
+    return '"' + hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _safe_name(folder, name):
+    """Только имя файла внутри папки (без ../ и подпапок)."""
+    name = urllib.parse.unquote(name)
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        raise ApiError(404, f"Not found: {name}")
+    path = os.path.join(folder, name)
+    if not os.path.isfile(path):
+        raise ApiError(404, f"Not found: {name}")
+    return name, path
+
+
+# --- ГРАФИКИ ---
+
+def list_charts():
+    chart_config = load_json(CONFIG_FILE, {})
+    titles = load_json(TITLES_CONFIG_FILE, {})
+    pages = load_json(PAGES_CONFIG_FILE, {})
+    from modules.chart_runtime import chart_version
+    result = []
+    for name in sorted(os.listdir(CHARTS_FOLDER)) if os.path.isdir(CHARTS_FOLDER) else []:
+        if not name.endswith(".py") or name == "__init__.py":
+            continue
+        result.append({
+            "name": name,
+            "title": titles.get(name, name[:-3]),
+            "pages": [p for p, charts in pages.items() if name in charts],
+            "files": chart_config.get(name, []),
+            "version": chart_version(name),
+        })
+    return result
+
+
+def chart_figure(name, theme=None):
+    """(etag, last_modified, content_type, body) фигуры; рендер только если версия изменилась."""
+    from modules.chart_runtime import chart_version, chart_data_files, render_chart_json
+
+    name, path = _safe_name(CHARTS_FOLDER, name)
+    etag = f'"{chart_version(name, theme)}"'
+    last_modified = max([os.path.getmtime(path)] + [os.path.getmtime(p) for p in chart_data_files(name) if os.path.exists(p)])
+    key = ("chart", name, theme)
+
+    cached = CACHE.get(key, etag)
+    if cached:
+        return cached
+    with CACHE.key_lock(key):
+        cached = CACHE.get(key, etag)
+        if cached:
+            return cached
+        status, payload = render_chart_json(name, theme=theme)
+        if status == "ok":
+            item = (etag, last_modified, "application/json; charset=utf-8", payload.encode("utf-8"))
+            CACHE.put(key, item)
+            return item
+        if status in ("timeout", "memory"):
+            raise ApiError(503, payload)  # Может пройти при следующем запросе — не кэшируем
+        raise ApiError(500 if status == "error" else 422, payload)
+
+
+# --- НАБОРЫ ДАННЫХ ---
+
+def list_datasets():
+    from modules.catalog import get_profile
+    result = []
+    for name in sorted(os.listdir(DATA_FOLDER)) if os.path.isdir(DATA_FOLDER) else []:
+        path = os.path.join(DATA_FOLDER, name)
+        if not os.path.isfile(path) or name.startswith(".") or name.endswith(".tmp"):
+            continue
+        st = os.stat(path)
+        profile = get_profile(name) or {}
+        result.append({
+            "name": name,
+            "bytes": st.st_size,
+            "modified": email.utils.formatdate(st.st_mtime, usegmt=True),
+            "rows": profile.get("rows"),
+            "columns": [c["name"] for c in profile.get("columns", [])] or None,
+        })
+    return result
+
+
+def dataset_response(name, fmt="parquet", columns=None):
+    """
+    Returns: (etag, last_modified, content_type, body | путь к файлу).
+    Файл на диске, который уже в нужном формате (свежая Arrow-копия, исходный Parquet/CSV), отдается как есть.
+    Остальное собирается из общей Arrow-копии (memory map) без чтения оригинала в pandas.
+    """
+    from modules.storage import PYARROW_AVAILABLE, is_columnar_fresh, columnar_path, open_dataset, read_table
+
+    if fmt not in DATASET_FORMATS:
+        raise ApiError(400, f"Unknown format: {fmt}. Use one of: {', '.join(DATASET_FORMATS)}")
+    if fmt in ("parquet", "arrow") and not PYARROW_AVAILABLE:
+        raise ApiError(501, "pyarrow is not installed")
+
+    name, path = _safe_name(DATA_FOLDER, name)
+    st = os.stat(path)
+    etag = _etag(name, st.st_mtime_ns, st.st_size, fmt, ",".join(columns or []))
+    content_type = DATASET_FORMATS[fmt]
+
+    if not columns:
+        if fmt == "parquet" and path.endswith(".parquet"):
+            return etag, st.st_mtime, content_type, path
+        if fmt == "arrow" and is_columnar_fresh(path):
+            return etag, st.st_mtime, content_type, columnar_path(path)
+        if fmt == "csv" and path.endswith(".csv"):
+            return etag, st.st_mtime, content_type, path
+
+    key = ("dataset", name, fmt, tuple(columns or ()))
+    cached = CACHE.get(key, etag)
+    if cached:
+        return cached
+    with CACHE.key_lock(key):
+        cached = CACHE.get(key, etag)
+        if cached:
+            return cached
+        buf = io.BytesIO()
+        with open_dataset(path) as handle:
+            try:
+                if fmt in ("parquet", "arrow"):
+                    import pyarrow as pa
+                    if handle is not None:
+                        table = handle.table.select(columns) if columns else handle.table
+                    else:
+                        table = pa.Table.from_pandas(read_table(path, columns=columns), preserve_index=False)
+                else:
+                    df = read_table(path, columns=columns)
+            except (KeyError, ValueError) as e:
+                raise ApiError(400, f"Bad columns: {e}")
+            if fmt == "parquet":
+                import pyarrow.parquet as pq
+                pq.write_table(table, buf)
+            elif fmt == "arrow":
+                with pa.ipc.new_file(buf, table.schema) as writer:
+                    writer.write_table(table)
+            elif fmt == "csv":
+                buf.write(df.to_csv(index=False).encode("utf-8"))
+            else:
+                buf.write(df.to_json(orient="records", date_format="iso", force_ascii=False).encode("utf-8"))
+        item = (etag, st.st_mtime, content_type, buf.getvalue())
+        CACHE.put(key, item)
+        return item
+
+
+def published_file(name):
+    """Файл статического снимка отдается с диска; ETag — от его версии."""
+    name, path = _safe_name(PUBLISH_FOLDER, name)
+    content_type = PUBLISHED_TYPES.get(os.path.splitext(name)[1])
+    if not content_type:
+        raise ApiError(404, f"Not found: {name}")
+    st = os.stat(path)
+    return _etag(name, st.st_mtime_ns, st.st_size), st.st_mtime, content_type, path
+
+
+# --- HTTP ---
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "GenAIDashboardAPI/1.0"
+    token = None
+
+    def log_message(self, fmt, *args):
+        print(f"{self.address_string()} {fmt % args}", file=sys.stderr)
+
+    def do_HEAD(self):
+        self._dispatch(send_body=False)
+
+    def do_GET(self):
+        self._dispatch(send_body=True)
+
+    def _dispatch(self, send_body):
+        try:
+            if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+                raise ApiError(401, "Unauthorized")
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            parts = [p for p in url.path.split("/") if p]
+            if parts[:1] != ["api"]:
+                raise ApiError(404, "Not found")
+            route = parts[1:]
+
+            if route == ["health"]:
+                self._send_json({"ok": True, "cache": CACHE.stats()}, send_body)
+            elif route == ["charts"]:
+                self._send_json(list_charts(), send_body)
+            elif len(route) == 2 and route[0] == "charts":
+                theme = query.get("theme", [None])[0]
+                self._send(chart_figure(route[1], theme), send_body)
+            elif route == ["datasets"]:
+                self._send_json(list_datasets(), send_body)
+            elif len(route) == 2 and route[0] == "datasets":
+                fmt = query.get("format", ["parquet"])[0]
+                columns = [c for c in query.get("columns", [""])[0].split(",") if c] or None
+                self._send(dataset_response(route[1], fmt, columns), send_body, filename=route[1])
+            elif len(route) == 2 and route[0] == "published":
+                self._send(published_file(route[1]), send_body)
+            else:
+                raise ApiError(404, "Not found")
+        except ApiError as e:
+            self._send_error(e.status, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self._send_error(500, f"{type(e).__name__}: {e}")
+
+    def _not_modified(self, etag, last_modified):
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+            return "*" in tags or etag in tags
+        ims = self.headers.get("If-Modified-Since")
+        if ims and last_modified:
+            try:
+                return int(last_modified) <= email.utils.parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, item, send_body, filename=None):
+        etag, last_modified, content_type, body = item
+        if self._not_modified(etag, last_modified):
+            self.send_response(304)
+            self._validators(etag, last_modified)
+            self.end_headers()
+            return
+
+        is_file = isinstance(body, str)
+        length = os.path.getsize(body) if is_file else len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        if filename and not content_type.startswith("application/json"):
+            self.send_header("Content-Disposition", f"inline; filename*=UTF-8''{urllib.parse.quote(filename)}")
+        self._validators(etag, last_modified)
+        self.end_headers()
+        if not send_body:
+            return
+        if is_file:
+            with open(body, "rb") as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        else:
+            self.wfile.write(body)
+
+    def _validators(self, etag, last_modified):
+        self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", email.utils.formatdate(last_modified, usegmt=True))
+        # Кэшировать можно, но перед использованием — спросить сервер (дешевый 304)
+        self.send_header("Cache-Control", "no-cache")
+
+    def _send_json(self, data, send_body):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send((_etag(hashlib.sha256(body).hexdigest()), None, "application/json; charset=utf-8", body), send_body)
+
+    def _send_error(self, status, message):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def make_server(host=API_HOST, port=API_PORT, token=None):
+    handler = type("ConfiguredApiHandler", (ApiHandler,), {"token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP API for chart figures and datasets")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--token", default=os.environ.get("GENAI_API_TOKEN"),
+                        help="Требовать заголовок 'Authorization: Bearer <token>' (или переменная GENAI_API_TOKEN)")
+    args = parser.parse_args(argv)
+
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.token:
+        print("⚠️  API доступен по сети без токена (--token)", file=sys.stderr)
+    server = make_server(args.host, args.port, args.token)
+    print(f"API: http://{args.host}:{args.port}/api/charts", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,8 @@
 import streamlit as st
 import os
 import json
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+# Библиотеки Google (google-auth, oauthlib) импортируются внутри функций:
+# они тяжелые, а нужны только при входе или при наличии сохраненного токена.
 
 # --- ИЗМЕНЕНИЕ 1: Импортируем правильные пути из settings ---
 from modules.settings import CLIENT_SECRET_FILE, USER_TOKEN_FILE
@@ -22,6 +21,7 @@ def get_flow():
     # --- ИЗМЕНЕНИЕ 3: Используем CLIENT_SECRET_FILE (из settings) ---
     if not os.path.exists(CLIENT_SECRET_FILE):
         return None
+    from google_auth_oauthlib.flow import Flow
     return Flow.from_client_secrets_file(
         CLIENT_SECRET_FILE, scopes=SCOPES, redirect_uri=REDIRECT_URI
     )
@@ -36,6 +36,7 @@ def is_authenticated():
             return True
         if creds and creds.expired and creds.refresh_token:
             try:
+                from google.auth.transport.requests import Request
                 creds.refresh(Request())
                 st.session_state.google_creds = creds
                 save_token_to_disk(creds) # Обновляем файл тоже
@@ -47,6 +48,8 @@ def is_authenticated():
     # Используем переменную из settings.py
     if os.path.exists(USER_TOKEN_FILE):
         try:
+            from google.oauth2.credentials import Credentials
+            from google.auth.transport.requests import Request
             creds = Credentials.from_authorized_user_file(USER_TOKEN_FILE, SCOPES)
             
             # Если токен протух, но есть refresh_token — обновляем
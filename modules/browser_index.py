@@ -0,0 +1,184 @@
+import os
+import re
+import time
+import bisect
+from modules.settings import DATA_FOLDER, SOURCES_CONFIG_FILE
+
+# --- ПОИСКОВЫЙ ИНДЕКС ДЛЯ СПИСКОВ ИСТОЧНИКОВ И ФАЙЛОВ ---
+# Индекс строится один раз на состояние конфига/папки данных и переживает перезапуски скрипта.
+# Поиск: префикс любого слова имени (bisect по отсортированным словам), подстрока и нечеткое
+# совпадение по триграммам (опечатки, пропущенные символы). Интерфейс рисует только текущую страницу.
+
+PAGE_SIZE = 15
+MIN_TRIGRAM_SCORE = 0.5     # Доля триграмм запроса, которые должны найтись в имени
+
+SORT_OPTIONS = {
+    "relevance": "Релевантность",
+    "fresh": "Свежие",
+    "stale": "Давно не обновлялись",
+    "name": "А-Я",
+}
+
+_CACHE = {}  # вид списка -> (сигнатура, SearchIndex)
+
+
+def _tokens(name):
+    """Слова имени: "Sales_Q3-2024.csv" -> sales, q3, 2024, csv."""
+    return [t for t in re.split(r"[^0-9a-zа-яё]+", name.lower()) if t]
+
+
+def _trigrams(text):
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Индекс по списку записей. Каждая запись — dict с ключами name, connector, updated
+    (timestamp последнего обновления или 0) и любыми другими полями для интерфейса.
+    """
+
+    def __init__(self, items):
+        self.items = list(items)
+        self._names = [it["name"].lower() for it in self.items]
+        # Отсортированные пары (слово, номер записи) — для префиксного поиска
+        self._words = sorted((tok, i) for i, name in enumerate(self._names) for tok in _tokens(name))
+        self._word_keys = [w for w, _ in self._words]
+        self._postings = {}
+        for i, name in enumerate(self._names):
+            for tri in _trigrams(name):
+                self._postings.setdefault(tri, set()).add(i)
+
+    def _prefix_hits(self, query):
+        hits = set()
+        pos = bisect.bisect_left(self._word_keys, query)
+        while pos < len(self._words) and self._word_keys[pos].startswith(query):
+            hits.add(self._words[pos][1])
+            pos += 1
+        return hits
+
+    def _scores(self, query):
+        """{номер записи: оценка}: 3 — начало имени, 2 — начало слова, 1.5 — подстрока, <1 — нечетко."""
+        scores = {}
+        if len(query) >= 3:
+            q_tri = _trigrams(query)
+            counts = {}
+            for tri in q_tri:
+                for i in self._postings.get(tri, ()):
+                    counts[i] = counts.get(i, 0) + 1
+            for i, c in counts.items():
+                share = c / len(q_tri)
+                if query in self._names[i]:
+                    scores[i] = 1.5
+                elif share >= MIN_TRIGRAM_SCORE:
+                    scores[i] = share * 0.99
+        else:
+            # Одна-две буквы: триграммы не помогают, подстрока по короткому списку имен
+            scores = {i: 1.5 for i, name in enumerate(self._names) if query in name}
+
+        for i in self._prefix_hits(query):
+            scores[i] = 2.0
+        for i, s in scores.items():
+            if self._names[i].startswith(query):
+                scores[i] = 3.0
+        return scores
+
+    def search(self, query="", connector=None, sort="relevance"):
+        """Записи, подходящие под запрос и фильтр по коннектору, в выбранном порядке."""
+        query = (query or "").strip().lower()
+        if query:
+            scores = self._scores(query)
+            found = list(scores)
+        else:
+            scores = {}
+            found = list(range(len(self.items)))
+        if connector:
+            found = [i for i in found if self.items[i].get("connector") == connector]
+
+        if sort == "fresh":
+            found.sort(key=lambda i: -self.items[i].get("updated", 0))
+        elif sort == "stale":
+            found.sort(key=lambda i: self.items[i].get("updated", 0))
+        elif sort == "relevance" and query:
+            found.sort(key=lambda i: (-scores[i], self._names[i]))
+        else:
+            found.sort(key=lambda i: self._names[i])
+        return [self.items[i] for i in found]
+
+
+def paginate(items, page, page_size=PAGE_SIZE):
+    """Срез одной страницы. Returns: (записи страницы, номер страницы после ограничения, всего страниц)."""
+    pages = max(1, -(-len(items) // page_size))
+    page = min(max(page, 0), pages - 1)
+    return items[page * page_size:(page + 1) * page_size], page, pages
+
+
+def data_folder_state():
+    """
+    {имя файла: mtime} для DATA_FOLDER одним проходом scandir.
+    Скрытые и временные файлы (.upload_*.tmp, <имя>.<поток>.tmp при записи) не показываются.
+    """
+    state = {}
+    try:
+        with os.scandir(DATA_FOLDER) as it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                    continue
+                if entry.is_file():
+                    state[entry.name] = entry.stat().st_mtime
+    except OSError:
+        pass
+    return state
+
+
+def _cached(kind, signature, build):
+    cached = _CACHE.get(kind)
+    if cached and cached[0] == signature:
+        return cached[1]
+    index = build()
+    _CACHE[kind] = (signature, index)
+    return index
+
+
+def get_sources_index(sources, files_state=None):
+    """Индекс активных источников. Поле idx — позиция в списке sources (для ключей виджетов)."""
+    files_state = data_folder_state() if files_state is None else files_state
+    try:
+        conf_mtime = os.stat(SOURCES_CONFIG_FILE).st_mtime_ns
+    except OSError:
+        conf_mtime = 0
+    names = tuple(s.get("filename", "no_name") for s in sources)
+    signature = (conf_mtime, names, tuple(files_state.get(n, 0) for n in names))
+
+    def build():
+        return SearchIndex(
+            {"name": s.get("filename", "no_name"), "connector": s.get("connector_id", "base"),
+             "updated": files_state.get(s.get("filename", ""), 0), "idx": i}
+            for i, s in enumerate(sources)
+        )
+    return _cached("sources", signature, build)
+
+
+def get_files_index(files_state=None):
+    """Индекс файлов DATA_FOLDER (connector — расширение файла)."""
+    files_state = data_folder_state() if files_state is None else files_state
+    signature = tuple(sorted(files_state.items()))
+
+    def build():
+        return SearchIndex(
+            {"name": name, "connector": os.path.splitext(name)[1].lstrip(".").lower(), "updated": mtime}
+            for name, mtime in files_state.items()
+        )
+    return _cached("files", signature, build)
+
+
+def format_age(ts):
+    """Возраст в коротком виде: "5 мин", "3 ч", "2 дн"; "—", если не обновлялся."""
+    if not ts:
+        return "—"
+    age = max(0, time.time() - ts)
+    if age < 3600:
+        return f"{int(age // 60)} мин"
+    if age < 86400:
+        return f"{int(age // 3600)} ч"
+    return f"{int(age // 86400)} дн"
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from modules.settings import CATALOG_FOLDER, DATA_FOLDER
+
+# --- КАТАЛОГ ДАННЫХ: ПРОФИЛЬ КАЖДОГО ФАЙЛА ---
+# Профиль (схема, типы, число строк, диапазоны, доля пустых, топ значений, пример строк)
+# считается один раз на версию файла: при синхронизации, загрузке и запуске обработчика.
+# Промпты и интерфейс читают маленький JSON вместо повторного чтения CSV/XLSX.
+
+TOP_VALUES = 5      # Сколько частых значений хранить для текстовых колонок
+SAMPLE_ROWS = 5     # Сколько строк примера хранить
+
+
+def _entry_path(filename):
+    return os.path.join(CATALOG_FOLDER, f"{filename}.json")
+
+
+def _file_version(path):
+    """Версия файла данных: (mtime_ns, size). Любая перезапись файла меняет ее."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _jsonable(value):
+    """Приводит значения pandas/numpy к типам, которые понимает json."""
+    import pandas as pd
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def build_profile(df):
+    """Считает профиль DataFrame (без привязки к файлу)."""
+    import pandas as pd
+
+    rows = len(df)
+    columns = []
+    for name in df.columns:
+        s = df[name]
+        col = {
+            "name": str(name),
+            "dtype": str(s.dtype),
+            "null_rate": round(float(s.isna().mean()), 4) if rows else 0.0,
+        }
+        if pd.api.types.is_bool_dtype(s):
+            col["top"] = [[_jsonable(v), int(c)] for v, c in s.value_counts().head(TOP_VALUES).items()]
+        elif pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            non_null = s.dropna()
+            if len(non_null):
+                col["min"] = _jsonable(non_null.min())
+                col["max"] = _jsonable(non_null.max())
+                if pd.api.types.is_numeric_dtype(s):
+                    col["mean"] = round(float(non_null.mean()), 4)
+        else:
+            counts = s.astype("string").value_counts()
+            col["unique"] = int(len(counts))
+            col["top"] = [[str(v), int(c)] for v, c in counts.head(TOP_VALUES).items()]
+        columns.append(col)
+
+    sample = json.loads(df.head(SAMPLE_ROWS).to_json(orient="records", date_format="iso", force_ascii=False))
+    return {"rows": rows, "columns": columns, "sample": sample}
+
+
+def update_profile(filename, df, path=None):
+    """Сохраняет профиль только что записанного файла (df — его содержимое)."""
+    path = path or os.path.join(DATA_FOLDER, filename)
+    try:
+        entry = build_profile(df)
+        entry.update({"filename": filename, "version": _file_version(path), "profiled_at": time.time()})
+        os.makedirs(CATALOG_FOLDER, exist_ok=True)
+        target = _entry_path(filename)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, target)
+        return entry
+    except Exception as e:
+        # Каталог — вспомогательная вещь: его ошибка не должна ломать синхронизацию
+        print(f"Catalog profile error ({filename}): {e}")
+        return None
+
+
+def get_profile(filename):
+    """Профиль актуальной версии файла или None (нет профиля / файл с тех пор изменился)."""
+    path = os.path.join(DATA_FOLDER, filename)
+    try:
+        with open(_entry_path(filename), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("version") != _file_version(path):
+            return None
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_profile(path):
+    """Профиль файла; если его нет или он устарел — читает файл один раз и сохраняет профиль."""
+    filename = os.path.basename(path)
+    # В каталог попадают только файлы из DATA_FOLDER (временные выборки и т.п. считаются на лету)
+    in_catalog = os.path.abspath(os.path.dirname(path)) == os.path.abspath(DATA_FOLDER)
+    if in_catalog:
+        entry = get_profile(filename)
+        if entry:
+            return entry
+
+    from modules.storage import read_table
+    df = read_table(path)
+    if in_catalog:
+        entry = update_profile(filename, df, path)
+        if entry:
+            return entry
+    return build_profile(df)
+
+
+def remove_profile(filename):
+    try:
+        os.remove(_entry_path(filename))
+    except OSError:
+        pass
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.4g}".replace(",", " ")
+    return str(value)
+
+
+def describe_for_prompt(path, with_sample=True):
+    """Описание данных для промпта LLM: колонки с типами, пустыми, диапазонами и частыми значениями."""
+    try:
+        profile = ensure_profile(path)
+    except Exception as e:
+        return f"Error reading cols: {e}"
+
+    lines = [f"Строк: {profile['rows']:,}".replace(",", " ")]
+    for col in profile["columns"]:
+        parts = [f"- `{col['name']}` ({col['dtype']})"]
+        if col.get("null_rate"):
+            parts.append(f"пусто {col['null_rate']:.1%}")
+        if "min" in col:
+            parts.append(f"{_format_value(col['min'])} … {_format_value(col['max'])}")
+        if col.get("top"):
+            top = ", ".join(f"{v}" for v, _ in col["top"][:TOP_VALUES])
+            unique = f"{col['unique']} уник., " if "unique" in col else ""
+            parts.append(f"{unique}часто: {top}")
+        lines.append(" · ".join(parts))
+
+    if with_sample and profile.get("sample"):
+        lines.append("Пример строк (JSON):")
+        lines.extend(json.dumps(r, ensure_ascii=False) for r in profile["sample"][:3])
+    return "\n".join(lines)
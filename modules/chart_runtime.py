@@ -0,0 +1,206 @@
+import os
+import ast
+import hashlib
+import inspect
+import tempfile
+import importlib.util
+
+# --- ЗАПУСК И ПРОВЕРКА МОДУЛЕЙ ГРАФИКОВ ---
+
+def build_render_args(render_func, files, chart_key=None, theme=None):
+    """Умный вызов render: передаем только те аргументы, которые функция объявила."""
+    sig = inspect.signature(render_func)
+    call_args = {"files": files}
+    if "chart_key" in sig.parameters and chart_key is not None: call_args["chart_key"] = chart_key
+    if "theme" in sig.parameters and theme is not None: call_args["theme"] = theme
+    if "return_fig" in sig.parameters: call_args["return_fig"] = False
+    return call_args
+
+
+def make_sample_files(files, sample_dir, nrows=200):
+    """
+    Делает уменьшенные копии файлов данных (первые nrows строк) в папке sample_dir
+    (обычно tempfile.TemporaryDirectory вызывающего — папку удаляет он).
+    Имена файлов сохраняются — код графика может на них опираться.
+    """
+    import pandas as pd
+    samples = []
+    for path in files:
+        dst = os.path.join(sample_dir, os.path.basename(path))
+        if path.endswith(".csv"):
+            pd.read_csv(path, nrows=nrows).to_csv(dst, index=False)
+        elif path.endswith(".xlsx"):
+            pd.read_excel(path, nrows=nrows).to_excel(dst, index=False)
+        elif path.endswith(".parquet"):
+            pd.read_parquet(path).head(nrows).to_parquet(dst, index=False)
+        else:
+            continue
+        samples.append(dst)
+    return samples
+
+
+def validate_chart_code(code, sample_files=None, chart_key="chart_check"):
+    """
+    Проверяет сгенерированный код графика:
+    1. Код парсится (нет SyntaxError).
+    2. Есть функция верхнего уровня render.
+    3. (опционально) render отрабатывает на выборке данных без исключений — в изолированном
+       процессе (run_chart_sandboxed): проверка идет из потоков race_llm, без контекста Streamlit,
+       и чужой код не должен ронять или подвешивать сервер.
+
+    Возвращает (valid: bool, message: str).
+    """
+    if not code or not code.strip():
+        return False, "Пустой код"
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return False, f"SyntaxError: {e.msg} (строка {e.lineno})"
+
+    has_render = any(isinstance(node, ast.FunctionDef) and node.name == "render" for node in tree.body)
+    if not has_render:
+        return False, "Нет функции render(files)"
+
+    if "st.set_page_config" in code:
+        return False, "Это не модуль, а приложение (st.set_page_config)"
+
+    if sample_files:
+        with tempfile.TemporaryDirectory(prefix="chart_check_") as tmp_dir:
+            chart_path = os.path.join(tmp_dir, "chart_check.py")
+            with open(chart_path, "w", encoding="utf-8") as f:
+                f.write(code)
+            status, payload = run_chart_sandboxed(chart_path, sample_files, chart_key=chart_key)
+        # "empty" — render отработал, но не вернул фигуру: для проверки этого достаточно
+        if status not in ("ok", "empty"):
+            return False, f"Ошибка пробного запуска: {payload}"
+
+    return True, "OK"
+
+
+# --- ИЗОЛИРОВАННЫЙ ЗАПУСК (ОТДЕЛЬНЫЙ ПРОЦЕСС) ---
+# Тяжелый или зависший график не должен блокировать страницу всем пользователям
+# и ронять сервер по памяти: render() выполняется в дочернем процессе с лимитами,
+# а обратно приходит только JSON фигуры.
+
+_MP_CONTEXT = None
+
+
+def _get_mp_context():
+    """forkserver (Linux/macOS) с предзагрузкой тяжелых библиотек, иначе spawn (Windows)."""
+    global _MP_CONTEXT
+    if _MP_CONTEXT is None:
+        import multiprocessing as mp
+        if "forkserver" in mp.get_all_start_methods():
+            ctx = mp.get_context("forkserver")
+            ctx.set_forkserver_preload(["pandas", "plotly.graph_objects", "streamlit"])
+        else:
+            ctx = mp.get_context("spawn")
+        _MP_CONTEXT = ctx
+    return _MP_CONTEXT
+
+
+def _sandbox_worker(conn, chart_path, files, chart_key, theme, memory_mb):
+    """Код дочернего процесса: ограничивает память, вызывает render и отправляет фигуру как JSON."""
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # Windows или лимит запрещен — остается только таймаут
+
+    try:
+        spec = importlib.util.spec_from_file_location(f"sandbox_{os.path.basename(chart_path)[:-3]}", chart_path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        if not hasattr(mod, "render"):
+            conn.send(("error", "Нет функции `render(files)`."))
+            return
+        fig = mod.render(**build_render_args(mod.render, files, chart_key=chart_key, theme=theme))
+        if fig is None or not hasattr(fig, "to_json"):
+            conn.send(("empty", "render() не вернул Plotly-фигуру"))
+        else:
+            conn.send(("ok", fig.to_json()))
+    except MemoryError:
+        conn.send(("memory", f"Превышен лимит памяти ({memory_mb} MB)"))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_chart_sandboxed(chart_path, files, chart_key=None, theme=None, timeout=None, memory_mb=None):
+    """
+    Выполняет render() графика в отдельном процессе с бюджетом по времени и памяти.
+
+    Виджеты внутри render в изолированном режиме не интерактивны (берутся значения по умолчанию).
+
+    Returns:
+        (status, payload): status — "ok" (payload = JSON фигуры), "empty", "error",
+        "timeout" или "memory" (payload = текст причины).
+    """
+    from modules.settings import CHART_TIMEOUT_SEC, CHART_MEMORY_MB
+    timeout = timeout or CHART_TIMEOUT_SEC
+    memory_mb = memory_mb or CHART_MEMORY_MB
+
+    ctx = _get_mp_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(
+        target=_sandbox_worker,
+        args=(child_conn, chart_path, files, chart_key, theme, memory_mb),
+        daemon=True
+    )
+    proc.start()
+    child_conn.close()
+
+    try:
+        if parent_conn.poll(timeout):
+            try:
+                return parent_conn.recv()
+            except EOFError:
+                # Процесс умер, ничего не отправив (обычно это OOM-killer или жесткий лимит)
+                proc.join(1)
+                return "memory", f"Процесс графика аварийно завершился (код {proc.exitcode}), вероятно, по памяти"
+        return "timeout", f"render() не уложился в {timeout} c."
+    finally:
+        parent_conn.close()
+        if proc.is_alive():
+            proc.kill()
+        proc.join(1)
+
+
+# --- ГРАФИК ПО ИМЕНИ (БЕЗ ИНТЕРФЕЙСА) ---
+
+def chart_data_files(chart_name):
+    """Пути к файлам данных, связанным с графиком в charts_config.json."""
+    from modules.settings import CONFIG_FILE, DATA_FOLDER
+    from modules.utils import load_json
+    return [os.path.join(DATA_FOLDER, f) for f in load_json(CONFIG_FILE, {}).get(chart_name, [])]
+
+
+def chart_version(chart_name, theme=None):
+    """
+    Версия результата графика: код графика + версии (mtime, размер) связанных файлов + тема.
+    Пока версия та же, фигура та же — по ней считаются ETag и кэши.
+    """
+    from modules.settings import CHARTS_FOLDER
+    h = hashlib.sha256(f"{chart_name}|{theme}".encode("utf-8"))
+    for path in [os.path.join(CHARTS_FOLDER, chart_name)] + chart_data_files(chart_name):
+        try:
+            st = os.stat(path)
+            h.update(f"|{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}".encode("utf-8"))
+        except OSError:
+            h.update(f"|{os.path.basename(path)}:missing".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def render_chart_json(chart_name, theme=None, timeout=None):
+    """
+    Рендер графика без интерфейса: изолированный процесс, виджеты со значениями по умолчанию.
+    Returns: (status, payload) как у run_chart_sandboxed.
+    """
+    from modules.settings import CHARTS_FOLDER
+    chart_path = os.path.join(CHARTS_FOLDER, chart_name)
+    if not os.path.exists(chart_path):
+        return "error", f"График не найден: {chart_name}"
+    return run_chart_sandboxed(chart_path, chart_data_files(chart_name), chart_key=chart_name, theme=theme, timeout=timeout)
@@ -0,0 +1,122 @@
+import re
+import ast
+
+# --- ПРАВКИ КОДА БЛОКАМИ SEARCH/REPLACE ---
+# Вместо того чтобы просить модель переписать весь модуль, просим только изменения.
+# Для мелких правок это в разы меньше выходных токенов (и времени генерации).
+
+EDIT_FORMAT_PROMPT = (
+    "Ты Senior Python Developer. Внеси в модуль ТОЛЬКО нужные изменения.\n"
+    "НЕ переписывай модуль целиком. Верни один или несколько блоков правок строго в формате:\n"
+    "<<<<<<< SEARCH\n"
+    "<точный фрагмент текущего кода, несколько строк, включая отступы>\n"
+    "=======\n"
+    "<новый фрагмент>\n"
+    ">>>>>>> REPLACE\n"
+    "Фрагмент SEARCH должен один-в-один совпадать с текущим кодом и быть достаточно длинным, "
+    "чтобы встречаться в нем один раз. Чтобы добавить код, включи в SEARCH соседние строки. "
+    "Никакого текста вне блоков."
+)
+
+# Полная перезапись модуля (старый режим и запасной вариант, если правки не применились)
+REFACTOR_SYSTEM_PROMPT = ("Ты Senior Python Developer. "
+                          "Верни ТОЛЬКО валидный Python код модуля (def render). "
+                          "ВАЖНО: В конце функции верни объект `fig`.")
+
+
+def build_refactor_prompt(code_body, data_context, ai_request):
+    """Пользовательская часть запроса на правку графика: текущий код, колонки данных, пожелание."""
+    return (
+        f"### ТЕКУЩИЙ КОД:\n```python\n{code_body}\n```\n\n"
+        f"### ДАННЫЕ:\n{data_context}\n\n"
+        f"### ЗАПРОС ПОЛЬЗОВАТЕЛЯ:\n\"{ai_request}\"\n"
+    )
+
+
+# Каждый маркер — отдельная строка целиком: "# ======= ОСИ =======" внутри кода не разделитель
+_BLOCK_RE = re.compile(
+    r"^<{5,} ?SEARCH[ \t]*\r?\n(.*?)^={5,}[ \t]*\r?\n(.*?)^>{5,} ?REPLACE[ \t]*\r?$",
+    re.DOTALL | re.MULTILINE
+)
+
+
+class PatchError(Exception):
+    """Правки не удалось разобрать или применить."""
+
+
+def split_header(code):
+    """
+    Отделяет docstring модуля (в сгенерированных графиках там лежит весь исходный промпт).
+    Возвращает (header, body): header + body == code.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return "", code
+    if not tree.body:
+        return "", code
+    first = tree.body[0]
+    if not (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str)):
+        return "", code
+
+    lines = code.splitlines(keepends=True)
+    end = first.end_lineno
+    # Захватываем пустые строки после docstring, чтобы тело начиналось с кода
+    while end < len(lines) and not lines[end].strip():
+        end += 1
+    return "".join(lines[:end]), "".join(lines[end:])
+
+
+def parse_edit_blocks(text):
+    """Достает из ответа модели список пар (search, replace)."""
+    # Перевод строки перед следующим маркером к фрагменту не относится
+    blocks = [(re.sub(r"\r?\n\Z", "", m.group(1)), re.sub(r"\r?\n\Z", "", m.group(2)))
+              for m in _BLOCK_RE.finditer(text or "")]
+    if not blocks:
+        raise PatchError("В ответе нет блоков SEARCH/REPLACE")
+    return blocks
+
+
+def apply_edit_blocks(code, blocks):
+    """
+    Применяет правки по очереди. Бросает PatchError, если фрагмент не найден
+    или найден несколько раз (неясно, какое место правила модель).
+    """
+    for i, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            raise PatchError(f"Блок {i}: пустой SEARCH")
+        matches = code.count(search)
+        if matches > 1:
+            raise PatchError(f"Блок {i}: фрагмент SEARCH встречается в коде {matches} раз(а)")
+        if matches == 1:
+            code = code.replace(search, replace, 1)
+            continue
+        # Модели часто теряют хвостовые пробелы — пробуем сравнение построчно без них
+        code = _apply_loose(code, search, replace, i)
+    return code
+
+
+def _apply_loose(code, search, replace, block_no):
+    code_lines = code.splitlines()
+    search_lines = [l.rstrip() for l in search.strip("\n").splitlines()]
+    n = len(search_lines)
+    stripped = [l.rstrip() for l in code_lines]
+    starts = [start for start in range(len(code_lines) - n + 1) if stripped[start:start + n] == search_lines]
+    if not starts:
+        raise PatchError(f"Блок {block_no}: фрагмент SEARCH не найден в коде")
+    if len(starts) > 1:
+        raise PatchError(f"Блок {block_no}: фрагмент SEARCH встречается в коде {len(starts)} раз(а)")
+    start = starts[0]
+    new_lines = code_lines[:start] + replace.strip("\n").splitlines() + code_lines[start + n:]
+    return "\n".join(new_lines) + ("\n" if code.endswith("\n") else "")
+
+
+def estimate_tokens(text):
+    """Оценка числа токенов: tiktoken, если установлен, иначе ~4 символа на токен."""
+    if not text:
+        return 0
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        return max(1, len(text) // 4)
@@ -0,0 +1,380 @@
+import os
+import ast
+import threading
+from modules.settings import CHARTS_FOLDER, HANDLERS_FOLDER, CONFIG_FILE
+from modules.utils import load_json
+
+# --- КАКИЕ КОЛОНКИ НУЖНЫ ГРАФИКАМ (СТАТИЧЕСКИЙ АНАЛИЗ) ---
+# Код графиков и обработчиков разбирается через ast (не выполняется). Собираются имена колонок:
+# df["a"], df[["a", "b"]], df.loc[:, "a"], аргументы px.*(x=..., color=...), groupby/sort_values/agg
+# и другие вызовы методов таблицы, обращения df.a. Таблицами считаются переменные, полученные
+# из read_*/concat и из других таблиц: присваивания, переменные циклов и comprehension, with,
+# параметры lambda в df.apply(...). Лишние имена безвредны (при проекции берется пересечение
+# с реальными колонками).
+#
+# Если колонки выбираются динамически (df[col], df.columns, query("..."), вывод всей таблицы
+# через st.dataframe, px без x/y, df.sum()/set_index/pivot по всей таблице) или таблица уходит
+# туда, куда анализ не смотрит (своя функция, другая библиотека, функция в df.apply), анализ
+# "неполный" — для источника проекция не делается.
+#
+# По связям charts_config.json (график -> файлы) колонки собираются на источник: их можно
+# запрашивать у коннектора (проекция) и хранить только их (source_config["project_columns"]).
+
+PX_MODULES = ("plotly.express",)
+READ_FUNCS = {"read_table", "read_csv", "read_excel", "read_parquet", "read_json", "concat", "DataFrame", "merge"}
+
+# Обращения, после которых нужны все колонки таблицы
+ALL_COLUMNS_ATTRS = {
+    "columns", "dtypes", "select_dtypes", "query", "eval", "describe", "info", "filter", "keys", "items",
+    "to_dict", "to_records", "to_csv", "to_excel", "to_json", "to_parquet", "to_numpy", "values",
+    "itertuples", "iterrows", "corr", "cov", "T", "transpose", "melt", "stack",
+    # Свертки и перестройки всей таблицы: df.sum(), df.groupby("a").mean(), df.set_index("d")
+    "sum", "mean", "median", "min", "max", "std", "var", "sem", "prod", "count", "nunique", "mode",
+    "quantile", "cumsum", "cumprod", "pct_change", "diff", "rank", "abs", "round", "idxmax", "idxmin",
+    "set_index", "pivot", "pivot_table", "unstack", "explode", "resample", "rolling", "expanding",
+    "plot", "to_string", "to_html", "style",
+}
+# Методы, которые возвращают ту же таблицу (выбирают строки, а не колонки)
+ROW_METHODS = {"head", "tail", "sample", "dropna", "copy", "reset_index", "sort_values", "drop_duplicates", "fillna", "nlargest", "nsmallest"}
+# Атрибуты таблицы/серии, которые точно не колонки
+NON_COLUMN_ATTRS = {"str", "dt", "cat", "loc", "iloc", "at", "iat", "index", "shape", "empty", "size", "ndim", "name", "plot"}
+# Вызовы Streamlit, которые показывают таблицу целиком
+ST_TABLE_FUNCS = {"dataframe", "table", "data_editor", "write", "json"}
+# Функции, которым таблицу передавать можно: колонки не читают или результат — снова таблица
+SAFE_TABLE_FUNCS = {"len", "isinstance", "id", "bool"} | READ_FUNCS
+
+_CACHE = {}  # путь -> ((mtime_ns, size), результат)
+_CACHE_LOCK = threading.Lock()
+
+
+def _strings(node):
+    """Строковые константы узла: "a", ["a", "b"], ("a", "b"), {"a": ...} (ключи)."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [s for elt in node.elts for s in _strings(elt)]
+    if isinstance(node, ast.Dict):
+        return [s for key in node.keys if key is not None for s in _strings(key)]
+    return []
+
+
+def _root_name(node):
+    """Имя в начале цепочки df.a["b"].c(...) или None."""
+    while True:
+        if isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        elif isinstance(node, ast.Call):
+            node = node.func
+        elif isinstance(node, ast.Name):
+            return node.id
+        else:
+            return None
+
+
+def _carries_table(node, frames):
+    """Выражение несет таблицу (не одну колонку): df, df.groupby("a"), df.head(), [g for _, g in ...]."""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return any(_carries_table(e, frames) for e in node.elts)
+    if isinstance(node, (ast.ListComp, ast.SetComp, ast.GeneratorExp)):
+        return _carries_table(node.elt, frames)
+    if isinstance(node, ast.DictComp):
+        return _carries_table(node.value, frames)
+    if isinstance(node, ast.Dict):
+        return any(_carries_table(v, frames) for v in node.values)
+    if _root_name(node) not in frames:
+        return False
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        if isinstance(node, ast.Subscript) and _strings(node.slice):
+            return False  # df["a"]... — дальше идет одна колонка (ее имя уже собрано)
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return True
+
+
+def _selects_columns(node):
+    """В цепочке есть выбор колонок: df["a"].sum(), df.groupby("r")[["a"]].mean(), df.Revenue.max()."""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        if isinstance(node, ast.Subscript) and _strings(node.slice):
+            return True
+        if isinstance(node, ast.Call):
+            node = node.func
+            if isinstance(node, ast.Attribute):
+                node = node.value  # Имя метода — не колонка
+            continue
+        if isinstance(node, ast.Attribute) and node.attr not in NON_COLUMN_ATTRS:
+            return True
+        node = node.value
+    return False
+
+
+def _mentions(node, names):
+    return any(isinstance(n, ast.Name) and n.id in names for n in ast.walk(node))
+
+
+class _UsageVisitor(ast.NodeVisitor):
+    def __init__(self, frames, px_aliases, st_aliases, user_funcs):
+        self.frames = frames
+        self.user_funcs = user_funcs
+        self.px_aliases = px_aliases
+        self.st_aliases = st_aliases
+        self.loads = set()
+        self.stores = set()
+        self.reasons = []
+        self._methods = set()  # id узлов df.метод(...) — имя метода не колонка
+
+    def _dynamic(self, node, why):
+        self.reasons.append(f"строка {getattr(node, 'lineno', '?')}: {why}")
+
+    def _is_frame(self, node):
+        return _root_name(node) in self.frames
+
+    def _is_table(self, node):
+        """Выражение — таблица целиком (со всеми колонками): df, df[маска], df.head(), df.sort_values(...)."""
+        if isinstance(node, ast.Name):
+            return node.id in self.frames
+        if isinstance(node, ast.Subscript):
+            key = node.slice
+            row_key = isinstance(key, ast.Slice) or (not _strings(key) and _mentions(key, self.frames))
+            return row_key and self._is_table(node.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return node.func.attr in ROW_METHODS and self._is_table(node.func.value)
+        return False
+
+    def _escapes(self, node):
+        return _carries_table(node, self.frames)
+
+    def _whole_table(self, node):
+        """Выражение — вся таблица (или ее группы) без выбора колонок: df, df[маска], df.groupby("a")."""
+        return self._escapes(node) and not _selects_columns(node)
+
+    def visit_Subscript(self, node):
+        key = node.slice
+        if isinstance(node.value, ast.Attribute) and node.value.attr in ("loc", "at") and self._is_frame(node.value):
+            # df.loc[строки, колонки]: колонки — второй элемент
+            if isinstance(key, ast.Tuple) and len(key.elts) == 2:
+                cols = key.elts[1]
+                if not isinstance(cols, ast.Slice) and not _strings(cols):
+                    self._dynamic(node, "динамический выбор колонок в .loc")
+                self.loads.update(_strings(cols))
+        elif isinstance(node.value, ast.Attribute) and node.value.attr == "iloc" and self._is_table(node.value.value):
+            if isinstance(key, ast.Tuple):
+                self._dynamic(node, "колонки выбираются по позиции (.iloc)")
+        elif self._is_frame(node.value):
+            names = _strings(key)
+            if names:
+                (self.stores if isinstance(node.ctx, ast.Store) else self.loads).update(names)
+            elif isinstance(key, ast.Slice) or (isinstance(key, ast.Constant) and not isinstance(key.value, str)):
+                pass  # Срез строк / позиция
+            elif _mentions(key, self.frames):
+                pass  # Маска df[df["a"] > 1] — ее колонки соберутся при обходе
+            else:
+                self._dynamic(node, "колонка выбирается переменной")
+        else:
+            # row["a"], словари и т.п.: строковый ключ может оказаться колонкой — берем в надмножество
+            self.loads.update(s for s in _strings(key) if isinstance(node.ctx, ast.Load))
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if self._is_frame(node.value) and isinstance(node.ctx, ast.Load):
+            if node.attr in ALL_COLUMNS_ATTRS and self._whole_table(node.value):
+                self._dynamic(node, f"используется .{node.attr}")
+            elif id(node) not in self._methods and node.attr not in NON_COLUMN_ATTRS:
+                self.loads.add(node.attr)  # df.Revenue
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        func = node.func
+        self._methods.add(id(func))
+        args = list(node.args) + [kw.value for kw in node.keywords]
+        is_method = isinstance(func, ast.Attribute) and self._is_frame(func.value)
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in self.px_aliases:
+            self._visit_px(node)
+        elif not is_method and any(self._escapes(a) for a in args):
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if isinstance(func, ast.Attribute) and getattr(func.value, "id", None) in self.st_aliases and name in ST_TABLE_FUNCS:
+                self._dynamic(node, f"st.{name} показывает всю таблицу")
+            elif name not in SAFE_TABLE_FUNCS:
+                self._dynamic(node, f"таблица передается в {name or 'функцию'}()")
+        if is_method and any(isinstance(a, ast.Name) and a.id in self.user_funcs for a in args):
+            self._dynamic(node, f"своя функция в .{func.attr}()")
+        if is_method:
+            # groupby("a"), sort_values(by=[...]), agg({"a": "sum"}), agg(total=("a", "sum")), rename(...)
+            for arg in node.args:
+                self.loads.update(_strings(arg))
+            for kw in node.keywords:
+                if func.attr == "rename" and kw.arg == "columns" and isinstance(kw.value, ast.Dict):
+                    self.loads.update(_strings(kw.value))
+                    self.stores.update(s for v in kw.value.values for s in _strings(v))
+                elif func.attr == "assign" and kw.arg:
+                    self.stores.add(kw.arg)
+                else:
+                    self.loads.update(_strings(kw.value))
+        self.generic_visit(node)
+
+    def _visit_px(self, node):
+        has_columns = False
+        frame_arg = node.args[0] if node.args else None
+        for kw in node.keywords:
+            if kw.arg == "data_frame":
+                frame_arg = kw.value
+            if kw.arg in (None, "data_frame", "template", "title", "labels", "color_discrete_map",
+                          "color_discrete_sequence", "color_continuous_scale", "category_orders"):
+                continue
+            names = _strings(kw.value)
+            if names:
+                has_columns = True
+                self.loads.update(names)
+            elif isinstance(kw.value, (ast.Name, ast.JoinedStr, ast.Subscript)) and kw.arg in ("x", "y", "color", "names", "values", "size"):
+                self._dynamic(node, f"px: {kw.arg} задан переменной")
+        # px.line(df.set_index("d")), px.bar(df.groupby("r").sum()): без x/y строятся все колонки
+        if not has_columns and frame_arg is not None and self._escapes(frame_arg):
+            self._dynamic(node, "px без указания колонок (все колонки)")
+
+
+def _bindings(tree):
+    """Пары (имена, выражение-источник): присваивания, for/comprehension, with, :=, lambda в df.метод(...)."""
+    def names(target):
+        return [n.id for n in ast.walk(target) if isinstance(n, ast.Name)]
+
+    pairs = []
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Assign):
+            pairs.append(([x for t in n.targets for x in names(t)], n.value))
+        elif isinstance(n, (ast.AnnAssign, ast.AugAssign, ast.NamedExpr)) and n.value is not None:
+            pairs.append((names(n.target), n.value))
+        elif isinstance(n, (ast.For, ast.AsyncFor, ast.comprehension)):
+            pairs.append((names(n.target), n.iter))
+        elif isinstance(n, (ast.With, ast.AsyncWith)):
+            pairs.extend((names(i.optional_vars), i.context_expr) for i in n.items if i.optional_vars is not None)
+        elif isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute):
+            # df.apply(lambda row: ...): параметр lambda получает строки/части таблицы
+            pairs.extend(([a.arg for a in lam.args.args], n.func.value)
+                         for lam in list(n.args) + [kw.value for kw in n.keywords] if isinstance(lam, ast.Lambda))
+    return pairs
+
+
+def _find_frames(tree, initial=()):
+    """Имена переменных-таблиц: результаты read_*/concat/DataFrame и все, что из них получено."""
+    frames = set(initial)
+    bindings = _bindings(tree)
+    changed = True
+    while changed:
+        changed = False
+        for targets, value in bindings:
+            new = [t for t in targets if t not in frames]
+            if not new:
+                continue
+            is_frame = _root_name(value) in frames or _carries_table(value, frames) or any(
+                isinstance(c, ast.Call) and (getattr(c.func, "attr", None) or getattr(c.func, "id", None)) in READ_FUNCS
+                for c in ast.walk(value)
+            )
+            if is_frame:
+                frames.update(new)
+                changed = True
+    return frames
+
+
+def analyze_code(code, frame_params=()):
+    """
+    Колонки, которые использует код.
+    frame_params — имена параметров, в которых приходит таблица (у обработчика это df).
+
+    Returns: {"loads": set, "stores": set, "complete": bool, "reasons": [почему неполный]}.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {"loads": set(), "stores": set(), "complete": False, "reasons": [f"SyntaxError: {e.msg}"]}
+
+    px_aliases, st_aliases = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in PX_MODULES: px_aliases.add(alias.asname or alias.name)
+                if alias.name == "streamlit": st_aliases.add(alias.asname or alias.name)
+        elif isinstance(node, ast.ImportFrom) and node.module == "plotly":
+            px_aliases.update(a.asname or a.name for a in node.names if a.name == "express")
+
+    user_funcs = {n.name for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    visitor = _UsageVisitor(_find_frames(tree, frame_params), px_aliases, st_aliases, user_funcs)
+    visitor.visit(tree)
+    return {"loads": visitor.loads, "stores": visitor.stores,
+            "complete": not visitor.reasons, "reasons": visitor.reasons}
+
+
+def analyze_file(path, frame_params=()):
+    """analyze_code для файла с кэшем по версии файла. None, если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, tuple(frame_params))
+    version = (st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        result = analyze_code(f.read(), frame_params)
+    with _CACHE_LOCK:
+        _CACHE[key] = (version, result)
+    return result
+
+
+def _handler_params(path):
+    """Параметры handle(...), в которых приходят таблицы (все позиционные, кроме progress)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return ()
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "handle":
+            return tuple(a.arg for a in node.args.args if a.arg != "progress")
+    return ()
+
+
+def source_columns(source_config, charts_conf=None):
+    """
+    Колонки, которые нужно получить у источника, чтобы работали все его графики.
+
+    Returns: (отсортированный список | None, пояснение). None — проекция невозможна
+    (нет графиков, динамический выбор колонок или ничего не найдено).
+    """
+    filename = source_config.get("filename")
+    if charts_conf is None:
+        charts_conf = load_json(CONFIG_FILE, {})
+    charts = [c for c, files in charts_conf.items() if filename in files]
+    charts = [c for c in charts if os.path.exists(os.path.join(CHARTS_FOLDER, c))]
+    if not charts:
+        return None, "файл не связан ни с одним графиком"
+
+    needed = set()
+    for chart in charts:
+        usage = analyze_file(os.path.join(CHARTS_FOLDER, chart))
+        if not usage["complete"]:
+            return None, f"{chart}: {usage['reasons'][0]}"
+        needed |= usage["loads"]
+
+    handler = source_config.get("handler", "None")
+    if handler and handler != "None":
+        h_path = os.path.join(HANDLERS_FOLDER, handler)
+        usage = analyze_file(h_path, _handler_params(h_path))
+        if usage is None:
+            return None, f"обработчик {handler} не найден"
+        if not usage["complete"]:
+            return None, f"{handler}: {usage['reasons'][0]}"
+        # Колонки, которые обработчик создает сам, у источника не запрашиваются
+        needed = usage["loads"] | (needed - (usage["stores"] - usage["loads"]))
+
+    if not needed:
+        return None, "колонки не найдены"
+    return sorted(needed), f"графиков: {len(charts)}"
+
+
+def project_frame(df, columns):
+    """Оставляет в таблице только нужные колонки (в исходном порядке). Без совпадений — таблица как есть."""
+    if not columns:
+        return df
+    wanted = set(columns)
+    keep = [c for c in df.columns if c in wanted]
+    return df[keep] if keep and len(keep) < len(df.columns) else df
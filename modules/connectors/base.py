@@ -28,5 +28,16 @@ class BaseConnector:
     def load_data(self, config) -> pd.DataFrame:
         """
         Основной метод загрузки. Должен вернуть Pandas DataFrame.
+        Долгие загрузки периодически вызывают self.report_progress(config, rows=...).
         """
-        raise NotImplementedError("Метод load_data должен быть реализован")
\ No newline at end of file
+        raise NotImplementedError("Метод load_data должен быть реализован")
+
+    @staticmethod
+    def report_progress(config, rows=None, phase=None):
+        """
+        Сообщает интерфейсу, сколько строк получено, и проверяет отмену: если пользователь
+        нажал "⏹", бросает SyncCancelled (modules/sync_jobs.py). Без фоновой задачи ничего не делает.
+        """
+        progress = config.get("_progress")
+        if progress is not None:
+            progress.update(phase=phase, rows=rows)
\ No newline at end of file
@@ -2,6 +2,7 @@ import pandas as pd
 import streamlit as st
 import traceback
 from .base import BaseConnector
+from modules.sync_jobs import SyncCancelled
 
 try:
     import gspread
@@ -66,7 +67,9 @@ class GoogleSheetsConnector(BaseConnector):
                     raise Exception(f"Некорректная ссылка или ID: '{url}'. Скопируйте ссылку из браузера.")
             
             ws = sh.get_worksheet(0)
+            self.report_progress(config)  # Точка отмены перед чтением листа
             data = ws.get_all_records()
+            self.report_progress(config, rows=len(data))
             return pd.DataFrame(data)
 
         except PermissionError:
@@ -84,6 +87,9 @@ class GoogleSheetsConnector(BaseConnector):
             
         except gspread.exceptions.SpreadsheetNotFound:
             raise Exception(f"Таблица не найдена! Проверьте ссылку.")
+
+        except SyncCancelled:
+            raise
             
         except Exception as e:
             raise Exception(f"Ошибка чтения: {type(e).__name__} - {e}")
\ No newline at end of file
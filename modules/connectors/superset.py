@@ -79,6 +79,9 @@ class SupersetConnector(BaseConnector):
         except Exception as e:
             raise Exception(f"Ошибка соединения с Superset: {e}")
 
+        # Запрос выполняется одним HTTP-вызовом: отменить можно до него, но не во время
+        self.report_progress(config)
+
         # 2. Выполнение запроса через SQL Lab API
         execute_url = f"{host}/api/v1/sqllab/execute/"
         headers = {
@@ -1,6 +1,9 @@
 import pandas as pd
 import streamlit as st
 from .base import BaseConnector
+from modules.sync_jobs import SyncCancelled
+
+PROGRESS_EVERY_ROWS = 10_000
 
 class YTsaurusConnector(BaseConnector):
     @staticmethod
@@ -70,6 +73,17 @@ class YTsaurusConnector(BaseConnector):
             if not client.exists(path):
                 raise FileNotFoundError(f"Путь не найден в YT: {path}")
 
+            # Проекция колонок (config["_columns"] из modules/column_usage.py): читаем только их.
+            # Для таблицы со схемой — только те, что в ней есть (иначе YT вернет ошибку)
+            path_attrs = {}
+            columns = config.get("_columns")
+            if columns:
+                schema = [c["name"] for c in client.get(f"{path}/@schema")]
+                if schema:
+                    columns = [c for c in columns if c in set(schema)]
+                if columns:
+                    path_attrs["columns"] = columns
+
             # --- ИСПРАВЛЕНИЕ ОШИБКИ С RANGES ---
             if limit > 0:
                 # Вместо строки "lower_limit=..." передаем словарь с ключами
@@ -80,16 +94,24 @@ class YTsaurusConnector(BaseConnector):
                         "upper_limit": {"row_index": limit}
                     }
                 ]
-                table_path = yt.TablePath(path, ranges=read_ranges)
+                table_path = yt.TablePath(path, ranges=read_ranges, **path_attrs)
             else:
-                table_path = path
+                table_path = yt.TablePath(path, **path_attrs) if path_attrs else path
             # -----------------------------------
 
             rows_iterator = client.read_table(table_path, format="json")
-            rows = list(rows_iterator)
+            # Читаем потоком: прогресс в интерфейсе и точка отмены на каждой порции строк
+            rows = []
+            for row in rows_iterator:
+                rows.append(row)
+                if len(rows) % PROGRESS_EVERY_ROWS == 0:
+                    self.report_progress(config, rows=len(rows))
+            self.report_progress(config, rows=len(rows))
             
             df = pd.DataFrame(rows)
             return df
 
+        except SyncCancelled:
+            raise
         except Exception as e:
             raise Exception(f"YT Error: {e}")
\ No newline at end of file
@@ -1,20 +1,63 @@
 import pandas as pd
 import os
 import time
+import inspect
 import importlib.util
 from modules.settings import DATA_FOLDER, HANDLERS_FOLDER
 from modules.connector_loader import load_connectors
+from modules.sync_metrics import record_sync_run
+from modules.catalog import update_profile
+from modules.storage import write_columnar, read_table
+from modules.incremental import is_incremental, run_incremental, load_state, save_state, clear_state
+from modules.snapshots import take_snapshot
+from modules.sync_jobs import SyncProgress, SyncCancelled
 
-def sync_single_source(source_config):
+
+def _safe_snapshot(path, reason):
+    """Версия файла в истории; ошибка хранилища версий не должна ломать синхронизацию."""
+    try:
+        return take_snapshot(path, reason=reason)
+    except Exception as e:
+        print(f"Snapshot error ({os.path.basename(path)}): {e}")
+        return None
+
+def sync_single_source(source_config, progress=None):
     """
     Выполняет загрузку данных для одного источника.
+    Метрики запуска (время фаз, строки, байты) пишутся в телеметрию (modules/sync_metrics.py).
     
     Args:
         source_config (dict): Конфигурация источника из JSON.
+        progress (SyncProgress): Фаза/строки для интерфейса и флаг отмены (modules/sync_jobs.py).
         
     Returns:
         (success: bool, message: str, df: DataFrame|None)
     """
+    metrics = {
+        "filename": source_config.get("filename"),
+        "connector_id": source_config.get("connector_id"),
+        "handler": source_config.get("handler", "None"),
+        "fetch_s": 0.0, "handler_s": 0.0, "write_s": 0.0, "columnar_s": 0.0, "profile_s": 0.0, "snapshot_s": 0.0,
+        "rows": 0, "bytes": 0,
+    }
+    t_start = time.perf_counter()
+
+    success, message, df = _run_sync(source_config, metrics, progress or SyncProgress())
+
+    metrics["ok"] = success
+    metrics["message"] = message
+    metrics["total_s"] = round(time.perf_counter() - t_start, 4)
+    metrics["rows_per_s"] = round(metrics["rows"] / metrics["total_s"], 1) if success and metrics["total_s"] > 0 else 0.0
+    record_sync_run(metrics)
+
+    return success, message, df
+
+def _run_sync(source_config, metrics, progress):
+    """
+    Extract → Transform → Load. Заполняет metrics по ходу выполнения.
+    Отмена (progress.check) проверяется между фазами и внутри коннектора; после начала записи
+    синхронизация доводится до конца, чтобы файл и его копии не разошлись.
+    """
     try:
         # 1. Определяем коннектор
         connector_id = source_config.get("connector_id")
@@ -29,6 +72,7 @@ def sync_single_source(source_config):
                     source_config["config"] = {"url": source_config.get("url")}
             else:
                 connector_id = "base"
+        metrics["connector_id"] = connector_id
         # -------------------------------------------
 
         # 2. Загружаем класс коннектора
@@ -42,24 +86,50 @@ def sync_single_source(source_config):
         
         # 3. Загружаем данные (Extract)
         # Передаем словарь config (например: {"token": "...", "path": "//..."})
-        config_data = source_config.get("config", {})
+        # _progress — для отчета о строках и точек отмены внутри коннектора (см. BaseConnector.report_progress)
+        config_data = dict(source_config.get("config", {}), _progress=progress)
         
+        # Проекция: только колонки, которые используют графики источника (modules/column_usage.py).
+        # Коннектор может запросить их у сервера (_columns), остальные отбрасываются после загрузки
+        columns = None
+        if source_config.get("project_columns"):
+            from modules.column_usage import source_columns
+            columns, _ = source_columns(source_config)
+            if columns:
+                config_data["_columns"] = columns
+
         # Валидация (опционально)
         is_valid, err_msg = connector.validate(config_data)
         if not is_valid:
             return False, f"Ошибка конфигурации: {err_msg}", None
 
         # !!! САМОЕ ВАЖНОЕ: ВЫЗОВ ПЛАГИНА !!!
+        progress.update(phase="fetch")
+        t0 = time.perf_counter()
         df = connector.load_data(config_data)
+        metrics["fetch_s"] = round(time.perf_counter() - t0, 4)
+        progress.update(rows=len(df) if df is not None else 0)
+        if columns and df is not None:
+            from modules.column_usage import project_frame
+            df = project_frame(df, columns)
 
         if df is None or df.empty:
             return False, "Источник вернул пустой DataFrame", None
 
+        filename = source_config.get("filename")
+        if not filename:
+            filename = f"source_{int(time.time())}.csv"
+            
+        save_path = os.path.join(DATA_FOLDER, filename)
+
         # 4. Применяем ETL обработчик (Transform)
+        incremental = None  # (ключи строк результата, путь обработчика) для handle(df_new, df_prev)
         handler_name = source_config.get("handler", "None")
         if handler_name and handler_name != "None":
             h_path = os.path.join(HANDLERS_FOLDER, handler_name)
             if os.path.exists(h_path):
+                progress.update(phase="handler")
+                t0 = time.perf_counter()
                 try:
                     # Динамический импорт скрипта обработки
                     spec = importlib.util.spec_from_file_location(f"etl_{int(time.time())}", h_path)
@@ -67,28 +137,75 @@ def sync_single_source(source_config):
                     spec.loader.exec_module(mod)
                     
                     if hasattr(mod, "handle"):
-                        # Если нужно, можно передать старую версию файла для инкрементальной логики
-                        # Но пока просто передаем свежий df
-                        df = mod.handle(df)
+                        # handle(df, progress) может сам проверять отмену
+                        extra = {"progress": progress} if "progress" in inspect.signature(mod.handle).parameters else {}
+                        if is_incremental(mod.handle):
+                            # handle(df_new, df_prev): только новые/измененные строки + прошлый результат
+                            df, out_keys, inc = run_incremental(
+                                lambda df_new, df_prev: mod.handle(df_new, df_prev, **extra), df,
+                                load_state(filename, save_path, h_path) if os.path.exists(save_path) else None,
+                                lambda: read_table(save_path),
+                            )
+                            incremental = (out_keys, h_path)
+                            metrics["incremental"] = inc["mode"]
+                            metrics["delta_rows"] = inc["delta"]
+                        else:
+                            df = mod.handle(df, **extra)
                     else:
                         return False, f"В скрипте {handler_name} нет функции handle(df)", None
+                except SyncCancelled:
+                    raise
                 except Exception as e:
                     return False, f"Ошибка в ETL-скрипте: {e}", None
+                finally:
+                    metrics["handler_s"] = round(time.perf_counter() - t0, 4)
             else:
                 return False, f"Скрипт {handler_name} не найден", None
 
+        if df is None:
+            return False, f"Скрипт {handler_name} вернул None", None
+
         # 5. Сохраняем результат (Load)
-        filename = source_config.get("filename")
-        if not filename:
-            filename = f"source_{int(time.time())}.csv"
-            
-        save_path = os.path.join(DATA_FOLDER, filename)
+        # Последняя точка отмены: дальше файл, Arrow-копия, профиль и история пишутся вместе
+        progress.update(phase="write")
+
+        # Текущая версия файла уже в истории, если ее записала прошлая синхронизация
+        # (тогда проверка — один stat); иначе (файл правили руками) сохраняем ее перед перезаписью
+        _safe_snapshot(save_path, "before sync")
         
+        t0 = time.perf_counter()
         if filename.endswith(".xlsx"):
             df.to_excel(save_path, index=False)
         else:
             # По умолчанию CSV
             df.to_csv(save_path, index=False)
+        metrics["write_s"] = round(time.perf_counter() - t0, 4)
+        metrics["filename"] = filename
+        metrics["rows"] = len(df)
+        metrics["bytes"] = os.path.getsize(save_path)
+
+        # Ключи строк результата для следующего инкрементального запуска (привязаны к версии файла)
+        if incremental:
+            out_keys, h_path = incremental
+            if out_keys is not None:
+                save_state(filename, out_keys, save_path, h_path)
+            else:
+                clear_state(filename)
+
+        # 6. Arrow-копия для быстрого чтения без копий в памяти (read_table)
+        t0 = time.perf_counter()
+        write_columnar(df, save_path)
+        metrics["columnar_s"] = round(time.perf_counter() - t0, 4)
+
+        # 7. Профиль набора для каталога (промпты и интерфейс больше не перечитывают файл)
+        t0 = time.perf_counter()
+        update_profile(filename, df, save_path)
+        metrics["profile_s"] = round(time.perf_counter() - t0, 4)
+
+        # 8. Версия в истории (неизменившиеся куски файла повторно не пишутся)
+        t0 = time.perf_counter()
+        _safe_snapshot(save_path, "sync")
+        metrics["snapshot_s"] = round(time.perf_counter() - t0, 4)
             
         return True, "OK", df
 
@@ -0,0 +1,138 @@
+import os
+import json
+import inspect
+import threading
+from modules.settings import INCREMENTAL_FOLDER
+
+# --- ИНКРЕМЕНТАЛЬНЫЕ ОБРАБОТЧИКИ: handle(df_new, df_prev) ---
+# Обработчик, объявивший параметр df_prev, получает не всю свежую выгрузку, а только новые
+# и изменившиеся строки (df_new) и прошлый результат (df_prev, только для чтения; None при
+# полном пересчете). Его ответ дописывается к строкам прошлого результата, исходные строки
+# которых не изменились; строки, пропавшие из источника, удаляются.
+#
+# Строка источника узнается по хэшу значений (с номером повтора — одинаковые строки не сливаются).
+# Хэши строк результата хранятся рядом (data/incremental/<файл>.keys.npy) вместе с версией
+# файла результата и кода обработчика: если файл правили руками или код поменялся — полный пересчет.
+#
+# Чтобы знать, из какой исходной строки получена строка результата, в df_new есть колонка
+# ROW_KEY. Обработчик должен ее сохранить: по позиции строки не сопоставляются (sort_values и
+# т.п. меняют порядок). Если ее нет, результат сохраняется, но следующий запуск — полный.
+
+ROW_KEY = "_row_key"
+
+_LOCK = threading.Lock()
+
+
+def is_incremental(handle):
+    return "df_prev" in inspect.signature(handle).parameters
+
+
+def row_keys(df):
+    """uint64-ключ каждой строки: хэш значений + номер повтора такой же строки."""
+    import pandas as pd
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame({"h": hashes, "n": occurrence}), index=False).to_numpy()
+
+
+def _state_paths(filename):
+    base = os.path.join(INCREMENTAL_FOLDER, filename)
+    return f"{base}.keys.npy", f"{base}.json"
+
+
+def _version(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_state(filename, output_path, handler_path):
+    """Ключи строк прошлого результата или None, если состояния нет или оно устарело."""
+    import numpy as np
+    keys_path, meta_path = _state_paths(filename)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["output"] != _version(output_path) or meta["handler"] != _version(handler_path):
+            return None
+        keys = np.load(keys_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return keys if len(keys) == meta.get("rows") else None
+
+
+def save_state(filename, keys, output_path, handler_path):
+    """Запоминает ключи строк результата (после записи файла результата)."""
+    import numpy as np
+    os.makedirs(INCREMENTAL_FOLDER, exist_ok=True)
+    keys_path, meta_path = _state_paths(filename)
+    meta = {"output": _version(output_path), "handler": _version(handler_path), "rows": int(len(keys))}
+    with _LOCK:
+        tmp_path = f"{keys_path}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp_path, keys)
+        os.replace(tmp_path, keys_path)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def clear_state(filename):
+    for path in _state_paths(filename):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _result_keys(result):
+    """Ключи строк ответа обработчика из ROW_KEY или None (колонку удалили — не сопоставить)."""
+    if ROW_KEY in result.columns:
+        return result[ROW_KEY].to_numpy(dtype="uint64"), result.drop(columns=[ROW_KEY])
+    print(f"Incremental handler dropped '{ROW_KEY}': next run will be a full recompute")
+    return None, result
+
+
+def run_incremental(call_handle, df, prev_keys, read_prev):
+    """
+    Выполняет инкрементальный обработчик.
+
+    Args:
+        call_handle: функция (df_new, df_prev) -> DataFrame (сам вызов handle).
+        df: свежая выгрузка источника.
+        prev_keys: ключи строк прошлого результата (load_state) или None — полный пересчет.
+        read_prev: функция без аргументов, читающая прошлый результат.
+
+    Returns:
+        (DataFrame результата, ключи его строк | None, {"mode", "delta", "kept", "removed"}).
+    """
+    import numpy as np
+    import pandas as pd
+
+    keys = row_keys(df)
+    df_prev = None
+    if prev_keys is not None:
+        df_prev = read_prev()
+        if len(df_prev) != len(prev_keys):
+            prev_keys, df_prev = None, None  # Файл не соответствует состоянию — считаем заново
+
+    if prev_keys is None:
+        df_new = df.assign(**{ROW_KEY: keys})
+        result = call_handle(df_new, None)
+        out_keys, result = _result_keys(result) if result is not None else (None, result)
+        return result, out_keys, {"mode": "full", "delta": len(df), "kept": 0, "removed": 0}
+
+    is_new = ~np.isin(keys, prev_keys)
+    keep = np.isin(prev_keys, keys)
+    stats = {"mode": "delta", "delta": int(is_new.sum()), "kept": int(keep.sum()), "removed": int((~keep).sum())}
+    kept = df_prev[keep]
+    if not is_new.any():
+        return kept.reset_index(drop=True), prev_keys[keep], stats
+
+    delta_keys = keys[is_new]
+    result = call_handle(df[is_new].assign(**{ROW_KEY: delta_keys}), df_prev)
+    if result is None or result.empty:
+        return kept.reset_index(drop=True), prev_keys[keep], stats
+    out_keys, result = _result_keys(result)
+    merged = pd.concat([kept, result], ignore_index=True)
+    if out_keys is None:
+        return merged, None, stats
+    return merged, np.concatenate([prev_keys[keep], out_keys]), stats
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
+from modules.settings import DATA_FOLDER, RAW_DATA_FOLDER
+
+# --- ПРИЕМ ЗАГРУЖЕННЫХ ФАЙЛОВ ---
+# 1. Файл пишется порциями во временный файл рядом с целевым (.upload_*.tmp в DATA_FOLDER),
+#    sha256 считается в том же проходе; готовый файл встает на место атомарным os.replace.
+# 2. Индекс data/raw/index.json хранит только sha256 -> файл: повторная загрузка тех же байтов
+#    под тем же именем ничего не переписывает и не пересчитывает. Второй копии содержимого нет.
+# 3. Arrow-копия (modules/storage.py) и профиль для каталога считаются в фоне, прогресс — в get_jobs().
+
+CHUNK_SIZE = 4 * 1024 * 1024
+INDEX_FILE = os.path.join(RAW_DATA_FOLDER, "index.json")
+
+_INDEX_LOCK = threading.Lock()
+_JOBS = {}  # имя файла -> {"status": queued|running|done|error, "progress": 0..1, "message": str}
+_JOBS_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def _load_index():
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+    # Прежние версии хранили копию каждого файла в data/raw/<sha256>.<ext> — удаляем их
+    for digest, blob in index.pop("blobs", {}).items():
+        try:
+            os.remove(os.path.join(RAW_DATA_FOLDER, f"{digest}{blob.get('ext', '')}"))
+        except OSError:
+            pass
+    return index
+
+
+def _save_index(index):
+    os.makedirs(RAW_DATA_FOLDER, exist_ok=True)
+    tmp_path = f"{INDEX_FILE}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, INDEX_FILE)
+
+
+def forget_file(filename):
+    """Убирает удаленный файл из индекса загрузок."""
+    with _INDEX_LOCK:
+        index = _load_index()
+        if index["files"].pop(filename, None) is not None:
+            _save_index(index)
+
+
+def _version(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _is_current(entry, path):
+    """Запись индекса соответствует файлу на диске (его не переписали синхронизацией или руками)."""
+    try:
+        return _version(path) == entry["version"]
+    except OSError:
+        return False
+
+
+def _stream_to_disk(fileobj, dst_path, progress_cb=None):
+    """Копирует поток порциями, считая sha256. Возвращает (digest, size)."""
+    total = getattr(fileobj, "size", None)
+    digest = hashlib.sha256()
+    written = 0
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    with open(dst_path, "wb") as out:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+            digest.update(chunk)
+            written += len(chunk)
+            if progress_cb and total:
+                progress_cb(min(written / total, 1.0))
+    return digest.hexdigest(), written
+
+
+def ingest_upload(uploaded_file, filename=None, progress_cb=None):
+    """
+    Принимает загруженный файл (st.file_uploader) в DATA_FOLDER.
+
+    Returns:
+        (status, path): status — "new" (новое содержимое), "duplicate" (такие же байты уже
+        лежат под другим именем), "unchanged" (тот же файл уже загружен — ничего не переписано).
+    """
+    filename = filename or uploaded_file.name
+    target = os.path.join(DATA_FOLDER, filename)
+
+    # Временный файл — в той же папке (os.replace атомарен) и скрыт от списка файлов (точка, .tmp)
+    tmp_path = os.path.join(DATA_FOLDER, f".upload_{threading.get_ident()}_{int(time.time() * 1000)}.tmp")
+    try:
+        digest, size = _stream_to_disk(uploaded_file, tmp_path, progress_cb)
+
+        with _INDEX_LOCK:
+            index = _load_index()
+            known = index["files"].get(filename)
+            # Тот же файл уже лежит в DATA_FOLDER и с тех пор не менялся — делать нечего
+            if known and known["sha256"] == digest and _is_current(known, target):
+                return "unchanged", target
+
+            twins = [name for name, entry in index["files"].items()
+                     if name != filename and entry["sha256"] == digest
+                     and _is_current(entry, os.path.join(DATA_FOLDER, name))]
+            status = "duplicate" if twins else "new"
+
+            os.replace(tmp_path, target)
+            index["files"][filename] = {"sha256": digest, "size": size, "version": _version(target), "uploaded": time.time()}
+            _save_index(index)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    schedule_postprocess(target)
+    return status, target
+
+
+# --- ФОНОВАЯ ОБРАБОТКА: ARROW-КОПИЯ + ПРОФИЛЬ ---
+
+def _set_job(filename, **fields):
+    with _JOBS_LOCK:
+        _JOBS.setdefault(filename, {"status": "queued", "progress": 0.0, "message": ""}).update(fields)
+
+
+def _postprocess(path):
+    from modules.storage import PYARROW_AVAILABLE, convert_to_columnar, read_table
+    from modules.catalog import update_profile
+
+    filename = os.path.basename(path)
+    _set_job(filename, status="running", progress=0.0, started=time.time())
+    try:
+        if PYARROW_AVAILABLE:
+            # Конвертация — 90% шкалы, профиль — остаток
+            convert_to_columnar(path, progress_cb=lambda p: _set_job(filename, progress=round(p * 0.9, 3)))
+        update_profile(filename, read_table(path), path)
+        _set_job(filename, status="done", progress=1.0, message="", finished=time.time())
+    except Exception as e:
+        _set_job(filename, status="error", message=f"{type(e).__name__}: {e}", finished=time.time())
+
+
+def schedule_postprocess(path):
+    """Ставит файл в фоновую очередь (конвертация + профиль). Одновременно — не больше двух файлов."""
+    global _EXECUTOR
+    with _JOBS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest")
+    _set_job(os.path.basename(path), status="queued", progress=0.0, message="")
+    _EXECUTOR.submit(_postprocess, path)
+
+
+def get_jobs(active_only=False):
+    """Снимок состояния фоновых задач: {имя файла: {...}}."""
+    with _JOBS_LOCK:
+        jobs = {k: dict(v) for k, v in _JOBS.items()}
+    if active_only:
+        jobs = {k: v for k, v in jobs.items() if v["status"] in ("queued", "running")}
+    return jobs
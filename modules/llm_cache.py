@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from modules.settings import LLM_CACHE_FOLDER, LLM_CACHE_TTL_SEC, LLM_CACHE_MAX_MB
+
+# Время записи хранится и в поле created, и в mtime файла (TTL считается по нему),
+# время последнего попадания — в atime (по нему вытесняются записи сверх лимита размера).
+# Полный обход папки при вытеснении — не чаще раза в EVICT_EVERY_SEC или EVICT_EVERY_PUTS записей
+EVICT_EVERY_SEC = 60
+EVICT_EVERY_PUTS = 50
+
+# Счетчики общие для всего процесса (все сессии Streamlit)
+_STATS = {"hits": 0, "misses": 0}
+_LOCK = threading.Lock()
+_EVICT_STATE = {"last": 0.0, "puts": 0}
+
+
+def make_key(api_type, base_url, model_name, system_prompt, user_prompt):
+    """Ключ кэша: хэш от всего, что влияет на ответ модели."""
+    raw = json.dumps(
+        [api_type or "", base_url or "", model_name or "", system_prompt or "", user_prompt or ""],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(LLM_CACHE_FOLDER, f"{key}.json")
+
+
+def get(key, ttl=LLM_CACHE_TTL_SEC):
+    """Возвращает сохраненный ответ или None (промах / истек TTL)."""
+    path = _entry_path(key)
+    content = None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if time.time() - entry.get("created", 0) <= ttl:
+            content = entry.get("content")
+            # Обновляем только atime: при вытеснении по размеру живые записи уходят последними,
+            # а mtime (время записи) остается для TTL
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        else:
+            os.remove(path)
+    except (OSError, ValueError):
+        content = None
+
+    with _LOCK:
+        _STATS["hits" if content is not None else "misses"] += 1
+    return content
+
+
+def put(key, content, meta=None):
+    """Сохраняет ответ на диск (атомарно) и время от времени подрезает кэш (TTL и размер)."""
+    os.makedirs(LLM_CACHE_FOLDER, exist_ok=True)
+    created = time.time()
+    entry = {"created": created, "content": content}
+    if meta:
+        entry["meta"] = meta
+
+    path = _entry_path(key)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.utime(tmp_path, (created, created))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"LLM cache write error: {e}")
+        return
+
+    with _LOCK:
+        _EVICT_STATE["puts"] += 1
+        due = _EVICT_STATE["puts"] >= EVICT_EVERY_PUTS or created - _EVICT_STATE["last"] >= EVICT_EVERY_SEC
+        if due:
+            _EVICT_STATE["puts"], _EVICT_STATE["last"] = 0, created
+    if due:
+        _evict()
+
+
+def _evict(max_mb=LLM_CACHE_MAX_MB, ttl=LLM_CACHE_TTL_SEC):
+    """Удаляет просроченные записи (mtime), затем давно не читанные (atime), пока кэш не влезет в лимит."""
+    with _LOCK:
+        now = time.time()
+        entries = []
+        for e in os.scandir(LLM_CACHE_FOLDER):
+            if not e.name.endswith(".json"):
+                continue
+            try:
+                info = e.stat()
+            except OSError:
+                continue
+            if now - info.st_mtime > ttl:
+                _safe_remove(e.path)
+            else:
+                entries.append((info.st_atime, info.st_size, e.path))
+
+        total = sum(size for _, size, _ in entries)
+        limit = max_mb * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            _safe_remove(path)
+            total -= size
+
+
+def _safe_remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clear():
+    """Полностью очищает кэш и сбрасывает счетчики."""
+    with _LOCK:
+        if os.path.exists(LLM_CACHE_FOLDER):
+            for e in os.scandir(LLM_CACHE_FOLDER):
+                if e.name.endswith(".json"):
+                    _safe_remove(e.path)
+        _STATS["hits"] = 0
+        _STATS["misses"] = 0
+
+
+def get_stats():
+    """Счетчики попаданий/промахов и текущий размер кэша."""
+    entries, size = 0, 0
+    if os.path.exists(LLM_CACHE_FOLDER):
+        for e in os.scandir(LLM_CACHE_FOLDER):
+            if e.name.endswith(".json"):
+                entries += 1
+                try: size += e.stat().st_size
+                except OSError: pass
+    with _LOCK:
+        hits, misses = _STATS["hits"], _STATS["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": (hits / total) if total else 0.0,
+        "entries": entries,
+        "size_mb": size / (1024 * 1024),
+    }
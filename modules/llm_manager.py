@@ -1,7 +1,11 @@
 import os
 import json
+import time
+import threading
+import concurrent.futures
 from modules.settings import LLM_PROVIDERS_FILE
 from modules.utils import load_json, save_json
+from modules import llm_cache
 import streamlit as st
 
 # --- УПРАВЛЕНИЕ НАСТРОЙКАМИ ---
@@ -10,8 +14,27 @@ def get_providers():
     """Загружает список всех настроенных интеграций."""
     return load_json(LLM_PROVIDERS_FILE, {})
 
-def save_provider(name, api_type, api_key, base_url, models):
-    """Сохраняет или обновляет интеграцию."""
+def normalize_gemini_endpoint(value):
+    """
+    Адрес API для Gemini: только хост ("proxy.local:8443" или "http://127.0.0.1:9000").
+    SDK сам дописывает путь (/v1beta/...), поэтому адрес с путем — ошибка (ValueError).
+    """
+    value = (value or "").strip()
+    if not value:
+        return ""
+    scheme, sep, host = value.partition("://")
+    if not sep:
+        scheme, host = "", value
+    host = host.rstrip("/")
+    if not host or any(ch in host for ch in "/?#"):
+        raise ValueError(f"API endpoint для Gemini — только хост[:порт], без пути: {value}")
+    return f"{scheme}://{host}" if scheme else host
+
+def save_provider(name, api_type, api_key, base_url, models, api_endpoint=""):
+    """
+    Сохраняет или обновляет интеграцию.
+    api_endpoint — свой адрес API Gemini (только хост, см. normalize_gemini_endpoint).
+    """
     providers = get_providers()
     providers[name] = {
         "type": api_type,
@@ -19,7 +42,11 @@ def save_provider(name, api_type, api_key, base_url, models):
         "base_url": base_url,
         "models": [m.strip() for m in models.split(",") if m.strip()]
     }
+    api_endpoint = normalize_gemini_endpoint(api_endpoint)
+    if api_endpoint:
+        providers[name]["api_endpoint"] = api_endpoint
     save_json(LLM_PROVIDERS_FILE, providers)
+    invalidate_clients(name)
 
 def delete_provider(name):
     """Удаляет интеграцию."""
@@ -27,47 +54,121 @@ def delete_provider(name):
     if name in providers:
         del providers[name]
         save_json(LLM_PROVIDERS_FILE, providers)
+    invalidate_clients(name)
+
+# --- ПУЛ КЛИЕНТОВ ---
+# Клиенты живут на уровне процесса и общие для всех сессий Streamlit:
+# OpenAI-клиент держит пул HTTP-соединений (keep-alive, без повторного TLS),
+# поэтому создавать его на каждый запрос дорого.
+_CLIENT_POOL = {}
+_POOL_LOCK = threading.Lock()
+
+def invalidate_clients(provider_name=None):
+    """Сбрасывает закэшированных клиентов провайдера (или всех, если имя не задано)."""
+    with _POOL_LOCK:
+        for pool_key in list(_CLIENT_POOL):
+            if provider_name is None or pool_key[1] == provider_name:
+                # Не закрываем явно: клиентом может пользоваться соседняя сессия,
+                # соединения закроются сборщиком мусора после завершения запроса.
+                del _CLIENT_POOL[pool_key]
+
+def _get_openai_client(provider_name, api_key, base_url):
+    pool_key = ("openai", provider_name, api_key, base_url or "")
+    with _POOL_LOCK:
+        client = _CLIENT_POOL.get(pool_key)
+        if client is None:
+            from openai import OpenAI
+
+            client_args = {"api_key": api_key}
+            if base_url:
+                client_args["base_url"] = base_url
+            client = OpenAI(**client_args)
+            _CLIENT_POOL[pool_key] = client
+    return client
+
+def _get_gemini_model(provider_name, api_key, model_name, api_endpoint=None):
+    pool_key = ("gemini", provider_name, api_key, model_name, api_endpoint or "")
+    with _POOL_LOCK:
+        model = _CLIENT_POOL.get(pool_key)
+        if model is None:
+            import google.generativeai as genai
+            from google.generativeai import client as genai_client
+
+            # genai.configure меняет глобальное состояние SDK, поэтому делаем это под локом
+            # и сразу привязываем клиента к модели. Иначе модель возьмет глобальный клиент
+            # при первом запросе, когда его уже мог перенастроить другой провайдер.
+            if api_endpoint:
+                # Свой адрес (корпоративный прокси или локальная заглушка) доступен только через REST.
+                # base_url для Gemini не используется: там бывает полный URL в формате OpenAI
+                genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+            model._client = genai_client.get_default_generative_client()
+            _CLIENT_POOL[pool_key] = model
+    return model
 
 # --- ЕДИНАЯ ТОЧКА ВХОДА ДЛЯ ГЕНЕРАЦИИ ---
 
-def ask_llm(provider_name, model_name, system_prompt, user_prompt):
-    """
-    Универсальная функция запроса к любой LLM (OpenAI, DeepSeek, Gemini).
-    Возвращает (success: bool, content: str).
-    """
+class LLMError(Exception):
+    """Ошибка потокового запроса (ask_llm_stream не может вернуть (False, msg))."""
+
+def _resolve_provider(provider_name):
+    """Находит конфиг провайдера. Возвращает (conf, None) или (None, текст ошибки)."""
     providers = get_providers()
-    
+
     if provider_name == "Google Gemini (Legacy)":
-        return False, "Используйте нового провайдера для Gemini"
+        return None, "Используйте нового провайдера для Gemini"
 
     if provider_name not in providers:
-        return False, f"Провайдер '{provider_name}' не найден."
+        return None, f"Провайдер '{provider_name}' не найден."
 
     conf = providers[provider_name]
+    if not conf.get("key"):
+        return None, "Ошибка: Не указан API Key."
+    return conf, None
+
+def ask_llm(provider_name, model_name, system_prompt, user_prompt, use_cache=True):
+    """
+    Универсальная функция запроса к любой LLM (OpenAI, DeepSeek, Gemini).
+    Успешные ответы кэшируются на диске (см. modules/llm_cache.py),
+    use_cache=False — принудительный запрос к провайдеру (свежий ответ перезапишет кэш).
+    Возвращает (success: bool, content: str).
+    """
+    conf, err = _resolve_provider(provider_name)
+    if err:
+        return False, err
+
     api_type = conf.get("type", "openai")
     api_key = conf.get("key")
     base_url = conf.get("base_url")
-    
-    if not api_key:
-        return False, "Ошибка: Не указан API Key."
+
+    cache_key = llm_cache.make_key(api_type, base_url, model_name, system_prompt, user_prompt)
+    if use_cache:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return True, cached
+
+    success, content = _call_provider(provider_name, api_type, api_key, base_url, model_name, system_prompt, user_prompt,
+                                      api_endpoint=conf.get("api_endpoint"))
+    if success:
+        llm_cache.put(cache_key, content, meta={"provider": provider_name, "model": model_name})
+    return success, content
+
+def _call_provider(provider_name, api_type, api_key, base_url, model_name, system_prompt, user_prompt, api_endpoint=None):
+    """Непосредственный запрос к API провайдера (без кэша)."""
 
     # ==========================================
     # 1. ЛОГИКА GOOGLE GEMINI
     # ==========================================
     if api_type == "gemini":
         try:
-            import google.generativeai as genai
-            
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(model_name)
+            # Base URL для Gemini не используется; свой адрес (api_endpoint) — запросы идут через REST
+            model = _get_gemini_model(provider_name, api_key, model_name, api_endpoint)
             
             # Gemini лучше всего понимает сплошной текст
             full_prompt = f"{system_prompt}\n\nUser Request:\n{user_prompt}"
             
-            # Если указан Base URL (для корпоративных прокси Google), 
-            # то настройка сложнее, но обычно для Gemini Base URL не нужен.
-            # Оставляем стандартный вызов:
-            
             response = model.generate_content(full_prompt)
             
             if response and response.text:
@@ -83,14 +184,8 @@ def ask_llm(provider_name, model_name, system_prompt, user_prompt):
     # ==========================================
     elif api_type in ["openai", "deepseek", "other"]:
         try:
-            from openai import OpenAI
-            
-            # Настройка клиента
-            client_args = {"api_key": api_key}
-            if base_url:
-                client_args["base_url"] = base_url
-            
-            client = OpenAI(**client_args)
+            # Клиент из пула (переиспользует HTTP-соединения между вызовами)
+            client = _get_openai_client(provider_name, api_key, base_url)
             
             # Делаем запрос
             response = client.chat.completions.create(
@@ -118,4 +213,147 @@ def ask_llm(provider_name, model_name, system_prompt, user_prompt):
             print(f"CRITICAL LLM ERROR: {e}")
             return False, f"Ошибка API ({provider_name}): {e}"
             
-    return False, f"Неизвестный тип API: {api_type}"
\ No newline at end of file
+    return False, f"Неизвестный тип API: {api_type}"
+
+# --- ПОТОКОВАЯ ГЕНЕРАЦИЯ ---
+
+def ask_llm_stream(provider_name, model_name, system_prompt, user_prompt, use_cache=True):
+    """
+    Потоковый вариант ask_llm: генератор кусочков текста по мере их прихода от модели.
+    Подходит для st.write_stream (время ожидания = время до первого токена).
+    При ошибке бросает LLMError. Полный ответ после завершения попадает в кэш.
+    """
+    conf, err = _resolve_provider(provider_name)
+    if err:
+        raise LLMError(err)
+
+    api_type = conf.get("type", "openai")
+    api_key = conf.get("key")
+    base_url = conf.get("base_url")
+
+    cache_key = llm_cache.make_key(api_type, base_url, model_name, system_prompt, user_prompt)
+    if use_cache:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    if api_type == "gemini":
+        chunks_iter = _stream_gemini(provider_name, api_key, conf.get("api_endpoint"), model_name, system_prompt, user_prompt)
+    elif api_type in ["openai", "deepseek", "other"]:
+        chunks_iter = _stream_openai(provider_name, api_key, base_url, model_name, system_prompt, user_prompt)
+    else:
+        raise LLMError(f"Неизвестный тип API: {api_type}")
+
+    parts = []
+    for piece in chunks_iter:
+        parts.append(piece)
+        yield piece
+
+    content = "".join(parts)
+    if not content:
+        raise LLMError("Модель вернула пустой ответ.")
+    llm_cache.put(cache_key, content, meta={"provider": provider_name, "model": model_name})
+
+def _stream_gemini(provider_name, api_key, api_endpoint, model_name, system_prompt, user_prompt):
+    try:
+        model = _get_gemini_model(provider_name, api_key, model_name, api_endpoint)
+        full_prompt = f"{system_prompt}\n\nUser Request:\n{user_prompt}"
+        response = model.generate_content(full_prompt, stream=True)
+        for chunk in response:
+            # chunk.text бросает исключение, если кусок заблокирован фильтрами
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+    except Exception as e:
+        raise LLMError(f"Ошибка Gemini API: {e}")
+
+def _stream_openai(provider_name, api_key, base_url, model_name, system_prompt, user_prompt):
+    stream = None
+    try:
+        client = _get_openai_client(provider_name, api_key, base_url)
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.1,
+            stream=True
+        )
+        for chunk in stream:
+            if not getattr(chunk, "choices", None):
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        print(f"CRITICAL LLM ERROR: {e}")
+        raise LLMError(f"Ошибка API ({provider_name}): {e}")
+    finally:
+        # Если потребитель бросил генератор на полпути — закрываем HTTP-поток
+        if stream is not None:
+            stream.close()
+
+
+# --- ПАРАЛЛЕЛЬНАЯ ГЕНЕРАЦИЯ (HEDGING) ---
+
+def race_llm(targets, system_prompt, user_prompt, validate=None, stop_on_first_valid=True, use_cache=True):
+    """
+    Отправляет один и тот же запрос сразу нескольким моделям и отдает результаты по мере готовности.
+
+    Args:
+        targets: список пар (provider_name, model_name).
+        validate: функция text -> (valid: bool, message: str); без нее валиден любой непустой ответ.
+        stop_on_first_valid: остановить остальные запросы после первого валидного ответа.
+
+    Yields:
+        dict(provider, model, text, valid, message, elapsed) — в порядке завершения.
+    Остановка (или закрытие генератора) прерывает незавершенные потоки ответа.
+    """
+    stop_event = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(targets)))
+    futures = [
+        executor.submit(_race_worker, prov, model, system_prompt, user_prompt, validate, use_cache, stop_event)
+        for prov, model in targets
+    ]
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result is None:
+                continue  # Запрос отменен
+            yield result
+            if result["valid"] and stop_on_first_valid:
+                break
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _race_worker(provider_name, model_name, system_prompt, user_prompt, validate, use_cache, stop_event):
+    """Один участник гонки: читает поток ответа, пока его не остановят."""
+    if stop_event.is_set():
+        return None
+
+    t0 = time.perf_counter()
+    result = {"provider": provider_name, "model": model_name, "text": "", "valid": False, "message": ""}
+    stream = ask_llm_stream(provider_name, model_name, system_prompt, user_prompt, use_cache=use_cache)
+    parts = []
+    try:
+        for piece in stream:
+            if stop_event.is_set():
+                return None
+            parts.append(piece)
+    except LLMError as e:
+        result["message"] = str(e)
+    finally:
+        # Закрывает HTTP-поток, если нас остановили на середине ответа
+        stream.close()
+
+    result["text"] = "".join(parts)
+    if result["text"] and not result["message"]:
+        if validate:
+            result["valid"], result["message"] = validate(result["text"])
+        else:
+            result["valid"], result["message"] = True, "OK"
+    result["elapsed"] = time.perf_counter() - t0
+    return result
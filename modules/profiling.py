@@ -0,0 +1,318 @@
+import time
+import hashlib
+import datetime
+import contextvars
+from contextlib import contextmanager
+from modules.settings import RENDER_HISTORY_FILE
+from modules.utils import append_jsonl, read_jsonl
+
+# --- ПРОФИЛИРОВАНИЕ РЕНДЕРА ГРАФИКОВ ---
+
+RENDER_PHASES = ["load", "data_read", "render", "serialize", "export"]
+PHASE_LABELS = {
+    "load": "Загрузка модуля",
+    "data_read": "Чтение данных",
+    "render": "render()",
+    "serialize": "Сериализация фигуры",
+    "export": "Экспорт HTML",
+}
+RENDER_HISTORY_MAX = 5000
+
+# Время чтения данных внутри render() копится в переменной контекста: ее видит только поток
+# (сессия Streamlit), в котором идет профилируемый рендер. pandas не патчится — замер ставит
+# read_table (modules/storage.py); чтение в обход него (pd.read_* в коде графика) идет в фазу render.
+_READ_TIME = contextvars.ContextVar("render_read_time", default=None)
+
+
+@contextmanager
+def timed_read():
+    """Засчитывает чтение файла в фазу data_read, если в этом контексте идет профилируемый render()."""
+    acc = _READ_TIME.get()
+    if acc is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        acc[0] += time.perf_counter() - start
+
+
+class RenderProfiler:
+    """
+    Собирает тайминги фаз рендера по каждому графику страницы.
+    Отметки времени — смещения от начала прохода, чтобы можно было нарисовать водопад.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.charts = {}
+
+    def _chart(self, chart):
+        return self.charts.setdefault(chart, {"phases": {}, "spans": [], "payload_bytes": 0})
+
+    def _add(self, chart, phase, start, duration):
+        entry = self._chart(chart)
+        entry["phases"][phase] = entry["phases"].get(phase, 0.0) + duration
+        entry["spans"].append((phase, start - self.started, duration))
+
+    @contextmanager
+    def phase(self, chart, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(chart, phase, start, time.perf_counter() - start)
+
+    @contextmanager
+    def render_phase(self, chart):
+        """Фаза render(): время внутри read_table выделяется в отдельную фазу data_read."""
+        acc = [0.0]
+        token = _READ_TIME.set(acc)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            read_time = min(acc[0], total)
+            _READ_TIME.reset(token)
+            self._add(chart, "data_read", start, read_time)
+            self._add(chart, "render", start + read_time, total - read_time)
+
+    def set_payload(self, chart, nbytes):
+        self._chart(chart)["payload_bytes"] = nbytes
+
+    def set_code(self, chart, code):
+        """Хэш кода графика: в истории видно, после какой правки стало медленнее."""
+        self._chart(chart)["code_hash"] = hashlib.sha1(code.encode("utf-8")).hexdigest()[:8]
+
+    def save(self):
+        """Сохраняет профиль прохода в историю (по строке на график)."""
+        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for chart, entry in self.charts.items():
+            append_jsonl(RENDER_HISTORY_FILE, {
+                "ts": ts,
+                "page": self.page,
+                "chart": chart,
+                "code_hash": entry.get("code_hash", ""),
+                "phases": {k: round(v, 4) for k, v in entry["phases"].items()},
+                "total": round(sum(entry["phases"].values()), 4),
+                "payload_bytes": entry["payload_bytes"],
+            }, max_lines=RENDER_HISTORY_MAX)
+
+
+def load_render_history(page=None, limit=1000):
+    records = read_jsonl(RENDER_HISTORY_FILE, limit=limit)
+    if page is not None:
+        records = [r for r in records if r.get("page") == page]
+    return records
+
+
+def render_profile_panel(profiler, titles=None):
+    """Водопад текущего прохода + история по графикам страницы."""
+    import streamlit as st
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    titles = titles or {}
+    if not profiler.charts:
+        st.info("Нет замеров для этой страницы.")
+        return
+
+    # 1. Водопад: каждая фаза — отрезок на оси времени от начала прохода
+    fig = go.Figure()
+    for phase in RENDER_PHASES:
+        ys, xs, bases = [], [], []
+        for chart, entry in profiler.charts.items():
+            for span_phase, offset, duration in entry["spans"]:
+                if span_phase == phase:
+                    ys.append(titles.get(chart, chart))
+                    xs.append(duration * 1000)
+                    bases.append(offset * 1000)
+        if xs:
+            fig.add_trace(go.Bar(y=ys, x=xs, base=bases, orientation="h", name=PHASE_LABELS[phase]))
+    fig.update_layout(barmode="overlay", xaxis_title="мс от начала прохода",
+                      yaxis=dict(autorange="reversed"), height=120 + 40 * len(profiler.charts),
+                      margin=dict(l=10, r=10, t=30, b=10))
+    st.plotly_chart(fig, use_container_width=True, key="render_profile_waterfall")
+
+    # 2. Сводка по текущему проходу
+    rows = []
+    for chart, entry in profiler.charts.items():
+        row = {"График": titles.get(chart, chart)}
+        for phase in RENDER_PHASES:
+            row[PHASE_LABELS[phase] + ", мс"] = round(entry["phases"].get(phase, 0.0) * 1000, 1)
+        row["Всего, мс"] = round(sum(entry["phases"].values()) * 1000, 1)
+        row["Payload, KB"] = round(entry["payload_bytes"] / 1024, 1)
+        rows.append(row)
+    st.dataframe(pd.DataFrame(rows).sort_values("Всего, мс", ascending=False), hide_index=True, use_container_width=True)
+
+    # 3. История: регрессии после правок кода (смена code_hash)
+    history = load_render_history(profiler.page)
+    if len(history) > len(profiler.charts):
+        df_h = pd.DataFrame([
+            {"ts": r["ts"], "График": titles.get(r["chart"], r["chart"]),
+             "Всего, мс": r["total"] * 1000, "Версия кода": r.get("code_hash", "")}
+            for r in history
+        ])
+        import plotly.express as px
+        fig_h = px.line(df_h, x="ts", y="Всего, мс", color="График", markers=True, hover_data=["Версия кода"])
+        fig_h.update_layout(height=260, margin=dict(l=10, r=10, t=30, b=10), title="История рендера")
+        st.plotly_chart(fig_h, use_container_width=True, key="render_profile_history")
+
+
+# --- ПРОФИЛИРОВАНИЕ ЦЕЛОГО ПРОХОДА app.py ---
+# Кнопка "профилировать" ставит флаг в сессии; следующий завершенный проход скрипта
+# выполняется под cProfile. Без флага — только проверка словаря, накладных расходов нет.
+# app.py останавливает профилировщик в finally: с Python 3.12 он общий на процесс, и
+# не выключенный (проход прервал st.rerun() или исключение) не дал бы включить новый.
+
+RERUN_PROFILE_FLAG = "profile_next_run"
+RERUN_PROFILE_RESULT = "rerun_profile_result"
+RERUN_PROFILE_ERROR = "rerun_profile_error"
+
+
+def request_rerun_profile():
+    import streamlit as st
+    st.session_state[RERUN_PROFILE_FLAG] = True
+
+
+def start_rerun_profile():
+    """Вызывается в самом начале app.py. Возвращает профилировщик или None."""
+    import streamlit as st
+    if not st.session_state.get(RERUN_PROFILE_FLAG):
+        return None
+    import cProfile
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError as e:
+        # Уже работает другой профилировщик (отладчик или профилируемый проход другой сессии)
+        st.session_state[RERUN_PROFILE_FLAG] = False
+        st.session_state[RERUN_PROFILE_ERROR] = f"Профилирование не запустилось: {e}"
+        return None
+    st.session_state.pop(RERUN_PROFILE_ERROR, None)
+    return prof
+
+
+def finish_rerun_profile(prof, interrupted_by=None):
+    """
+    Вызывается в finally вокруг тела app.py: всегда останавливает профилировщик.
+    Проход, прерванный st.rerun(), не сохраняется — флаг остается, профилируется следующий.
+    """
+    if prof is None:
+        return
+    import streamlit as st
+    prof.disable()
+    if type(interrupted_by).__name__ == "RerunException":
+        return
+    st.session_state[RERUN_PROFILE_FLAG] = False
+    st.session_state[RERUN_PROFILE_RESULT] = _summarize_profile(prof)
+
+
+def _code_group(filename):
+    """К какой части проекта относится функция: наши модули, графики, обработчики или библиотеки."""
+    from modules.settings import BASE_DIR, CHARTS_FOLDER, HANDLERS_FOLDER
+    import os
+
+    if not filename or filename.startswith("<") or filename == "~":
+        return "builtins"
+    path = os.path.abspath(filename)
+    if path.startswith(CHARTS_FOLDER + os.sep):
+        return f"chart: {os.path.basename(path)}"
+    if path.startswith(HANDLERS_FOLDER + os.sep):
+        return f"handler: {os.path.basename(path)}"
+    modules_dir = os.path.join(BASE_DIR, "modules") + os.sep
+    if path.startswith(modules_dir):
+        rel = os.path.relpath(path, BASE_DIR)[:-3]
+        return rel.replace(os.sep, ".")
+    if path == os.path.join(BASE_DIR, "app.py"):
+        return "app.py"
+    parts = path.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            idx = parts.index(marker)
+            if idx + 1 < len(parts):
+                return f"lib: {parts[idx + 1].split('.')[0]}"
+    return "stdlib"
+
+
+def _summarize_profile(prof):
+    """Сводка по группам кода + топ функций + сырые данные для скачивания (.prof)."""
+    import os
+    import pstats
+    import tempfile
+
+    stats = pstats.Stats(prof)
+    groups, functions = {}, []
+    for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        group = _code_group(filename)
+        g = groups.setdefault(group, {"self_s": 0.0, "calls": 0})
+        g["self_s"] += tt
+        g["calls"] += nc
+        functions.append({
+            "group": group,
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "self_s": tt,
+            "cum_s": ct,
+        })
+    functions.sort(key=lambda r: r["cum_s"], reverse=True)
+
+    with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        stats.dump_stats(tmp_path)
+        with open(tmp_path, "rb") as f:
+            raw = f.read()
+    finally:
+        os.remove(tmp_path)
+
+    return {
+        "total_s": stats.total_tt,
+        "groups": groups,
+        "functions": functions[:300],
+        "raw": raw,
+        "ts": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def render_rerun_profile_panel():
+    """Результат последнего профилированного прохода (если есть)."""
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+
+    if st.session_state.get(RERUN_PROFILE_ERROR):
+        st.warning(st.session_state.pop(RERUN_PROFILE_ERROR), icon="🔬")
+    result = st.session_state.get(RERUN_PROFILE_RESULT)
+    if not result:
+        return
+
+    with st.expander(f"🔬 Профиль прохода ({result['ts']}, {result['total_s']:.2f} c.)", expanded=True):
+        df_g = pd.DataFrame([
+            {"Группа": g, "Собственное время, c": round(v["self_s"], 4), "Вызовов": v["calls"]}
+            for g, v in result["groups"].items()
+        ]).sort_values("Собственное время, c", ascending=False)
+        df_f = pd.DataFrame(result["functions"])
+
+        # "Пламя" в виде treemap: группа → функция, площадь = собственное время
+        fig = px.treemap(df_f[df_f["self_s"] > 0], path=["group", "function"], values="self_s")
+        fig.update_layout(height=420, margin=dict(l=0, r=0, t=0, b=0))
+        st.plotly_chart(fig, use_container_width=True, key="rerun_profile_treemap")
+
+        st.caption("По частям проекта (время внутри самих функций группы)")
+        st.dataframe(df_g, hide_index=True, use_container_width=True)
+        st.caption("Функции (сортируется кликом по заголовку)")
+        st.dataframe(df_f.rename(columns={"group": "Группа", "function": "Функция", "calls": "Вызовов",
+                                          "self_s": "Собств., c", "cum_s": "Всего, c"}),
+                     hide_index=True, use_container_width=True, height=300)
+
+        c_dl, c_clr = st.columns(2)
+        c_dl.download_button("⬇️ Скачать .prof", data=result["raw"], file_name="rerun.prof",
+                             mime="application/octet-stream", use_container_width=True,
+                             help="Открывается в snakeviz / pstats")
+        if c_clr.button("✕ Скрыть", use_container_width=True, key="rerun_profile_hide"):
+            del st.session_state[RERUN_PROFILE_RESULT]
+            st.rerun()
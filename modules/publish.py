@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import time
+import html
+import threading
+import concurrent.futures
+from modules.settings import PUBLISH_FOLDER, PAGES_CONFIG_FILE, TITLES_CONFIG_FILE
+from modules.utils import load_json
+
+# --- СТАТИЧЕСКИЕ СНИМКИ СТРАНИЦ ---
+# После синхронизации каждый график каждой страницы рендерится без интерфейса (изолированный
+# процесс, виджеты по умолчанию), фигура сохраняется в data/published/figures, а страница —
+# в статический HTML с одним общим plotly.js. Режим "Быстрый просмотр" показывает эти фигуры,
+# не запуская render(); API отдает HTML по /api/published/<страница>.html.
+# График перерисовывается, только если изменилась его версия (код, связанные файлы, тема).
+
+PUBLISH_THEME = "plotly_dark"
+FIGURES_DIR = os.path.join(PUBLISH_FOLDER, "figures")
+MANIFEST_FILE = os.path.join(PUBLISH_FOLDER, "manifest.json")
+
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="publish")
+_STATE_LOCK = threading.Lock()
+_STATE = {"running": False, "pending": False, "last_error": None}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotly_js}"></script>
+<style>
+  body {{ background: #0e1117; color: #fafafa; font-family: sans-serif; margin: 0 auto; max-width: 1400px; padding: 16px; }}
+  .chart {{ margin-bottom: 32px; }}
+  .error {{ color: #ff6b6b; }}
+  .meta {{ color: #888; font-size: 12px; }}
+</style>
+</head>
+<body>
+<h1>📊 {title}</h1>
+<p class="meta">Снимок от {published} · значения фильтров по умолчанию</p>
+{body}
+</body>
+</html>
+"""
+
+
+def page_slug(page):
+    return re.sub(r"[^\w-]+", "_", page).strip("_") or "page"
+
+
+def _figure_path(chart_name):
+    return os.path.join(FIGURES_DIR, f"{chart_name}.json")
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_manifest():
+    return load_json(MANIFEST_FILE, {"charts": {}, "pages": {}})
+
+
+def _ensure_plotly_js():
+    """Один файл plotly.js на все страницы (в имени версия — при обновлении plotly появится новый)."""
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+    name = f"plotly-{get_plotlyjs_version()}.min.js"
+    path = os.path.join(PUBLISH_FOLDER, name)
+    if not os.path.exists(path):
+        _write_atomic(path, get_plotlyjs())
+    return name
+
+
+def _publish_chart(chart_name, manifest):
+    """Рендерит график, если его версия изменилась. Returns: True, если фигура обновилась."""
+    from modules.chart_runtime import chart_version, render_chart_json
+
+    version = chart_version(chart_name, PUBLISH_THEME)
+    entry = manifest["charts"].get(chart_name, {})
+    if entry.get("version") == version and (entry.get("status") != "ok" or os.path.exists(_figure_path(chart_name))):
+        return False
+
+    t0 = time.perf_counter()
+    status, payload = render_chart_json(chart_name, theme=PUBLISH_THEME)
+    entry = {"version": version, "status": status, "published_at": time.time(),
+             "render_s": round(time.perf_counter() - t0, 3)}
+    if status == "ok":
+        _write_atomic(_figure_path(chart_name), payload)
+    else:
+        entry["message"] = payload
+        if status in ("timeout", "memory"):
+            entry["version"] = None  # Может пройти в следующий раз — не запоминаем версию
+    manifest["charts"][chart_name] = entry
+    return True
+
+
+def _render_page_html(page, charts, manifest, titles, plotly_js):
+    blocks = []
+    for i, chart_name in enumerate(charts):
+        title = html.escape(titles.get(chart_name, chart_name[:-3]))
+        entry = manifest["charts"].get(chart_name, {})
+        if entry.get("status") == "ok" and os.path.exists(_figure_path(chart_name)):
+            with open(_figure_path(chart_name), "r", encoding="utf-8") as f:
+                fig_json = f.read().replace("</", "<\\/")
+            blocks.append(
+                f'<div class="chart"><h3>{title}</h3><div id="chart_{i}"></div>'
+                f'<script>(function(){{var fig={fig_json};'
+                f'Plotly.newPlot("chart_{i}",fig.data,fig.layout,{{responsive:true,displaylogo:false}});}})();</script></div>'
+            )
+        else:
+            message = html.escape(entry.get("message", "нет снимка"))
+            blocks.append(f'<div class="chart"><h3>{title}</h3><p class="error">⚠️ {message}</p></div>')
+    return PAGE_TEMPLATE.format(
+        title=html.escape(page), plotly_js=plotly_js, body="\n".join(blocks),
+        published=time.strftime("%Y-%m-%d %H:%M"),
+    )
+
+
+def publish_all(pages=None):
+    """
+    Публикует страницы (по умолчанию все из pages_config.json).
+    Returns: {"pages": N, "rendered": графиков перерисовано, "errors": [...]}.
+    """
+    os.makedirs(FIGURES_DIR, exist_ok=True)
+    pages_conf = load_json(PAGES_CONFIG_FILE, {})
+    titles = load_json(TITLES_CONFIG_FILE, {})
+    manifest = load_manifest()
+    plotly_js = _ensure_plotly_js()
+
+    rendered, errors = 0, []
+    for page, charts in pages_conf.items():
+        if pages and page not in pages:
+            continue
+        changed = False
+        for chart_name in charts:
+            if _publish_chart(chart_name, manifest):
+                changed = True
+                rendered += 1
+            entry = manifest["charts"].get(chart_name, {})
+            if entry.get("status") != "ok":
+                errors.append(f"{chart_name}: {entry.get('message', entry.get('status'))}")
+
+        slug = page_slug(page)
+        page_entry = manifest["pages"].get(page, {})
+        html_path = os.path.join(PUBLISH_FOLDER, f"{slug}.html")
+        if changed or page_entry.get("charts") != charts or not os.path.exists(html_path):
+            _write_atomic(html_path, _render_page_html(page, charts, manifest, titles, plotly_js))
+            manifest["pages"][page] = {"file": f"{slug}.html", "charts": list(charts), "published_at": time.time()}
+        _write_atomic(MANIFEST_FILE, json.dumps(manifest, ensure_ascii=False, indent=1))
+
+    return {"pages": len(pages or pages_conf), "rendered": rendered, "errors": errors}
+
+
+# --- ФОНОВАЯ ПУБЛИКАЦИЯ ---
+
+def _publish_loop():
+    while True:
+        with _STATE_LOCK:
+            _STATE["pending"] = False
+        try:
+            publish_all()
+            _STATE["last_error"] = None
+        except Exception as e:
+            _STATE["last_error"] = f"{type(e).__name__}: {e}"
+            print(f"Publish error: {_STATE['last_error']}")
+        with _STATE_LOCK:
+            # Пока публиковали, пришла новая синхронизация — еще один проход
+            if not _STATE["pending"]:
+                _STATE["running"] = False
+                return
+
+
+def schedule_publish():
+    """Запускает публикацию в фоне. Повторные вызовы во время публикации сливаются в один следующий проход."""
+    with _STATE_LOCK:
+        if _STATE["running"]:
+            _STATE["pending"] = True
+            return
+        _STATE["running"] = True
+    _EXECUTOR.submit(_publish_loop)
+
+
+def get_publish_state():
+    with _STATE_LOCK:
+        return dict(_STATE)
+
+
+def get_published_page(page):
+    """
+    Опубликованные графики страницы для быстрого просмотра.
+    Returns: (время публикации или None, [(chart_name, figure_dict | None, сообщение)]).
+    """
+    manifest = load_manifest()
+    page_entry = manifest["pages"].get(page)
+    if not page_entry:
+        return None, []
+    result = []
+    for chart_name in page_entry["charts"]:
+        entry = manifest["charts"].get(chart_name, {})
+        figure = None
+        if entry.get("status") == "ok":
+            try:
+                with open(_figure_path(chart_name), "r", encoding="utf-8") as f:
+                    figure = json.load(f)
+            except (OSError, ValueError):
+                pass
+        result.append((chart_name, figure, entry.get("message", "")))
+    return page_entry.get("published_at"), result
@@ -12,6 +12,30 @@ CONFIG_FOLDER = os.path.join(BASE_DIR, "config")  # <--- ВОТ ЭТОЙ ПЕР
 RAW_DATA_FOLDER = os.path.join(BASE_DIR, "data", "raw")
 DATA_FOLDER = os.path.join(BASE_DIR, "data_sources")
 
+# Служебные кэши (переживают перезапуск, в Docker лежат в томе ./data)
+CACHE_FOLDER = os.path.join(BASE_DIR, "data", "cache")
+LLM_CACHE_FOLDER = os.path.join(CACHE_FOLDER, "llm")
+
+# Arrow-копии файлов данных, открываемые через memory map (см. modules/storage.py)
+COLUMNAR_FOLDER = os.path.join(BASE_DIR, "data", "columnar")
+
+# Каталог данных: профили файлов (схема, статистика, пример строк) — см. modules/catalog.py
+CATALOG_FOLDER = os.path.join(BASE_DIR, "data", "catalog")
+
+# Статические снимки страниц (HTML + фигуры по умолчанию) — см. modules/publish.py
+PUBLISH_FOLDER = os.path.join(BASE_DIR, "data", "published")
+
+# История версий файлов данных (куски + манифесты) — см. modules/snapshots.py
+SNAPSHOTS_FOLDER = os.path.join(BASE_DIR, "data", "snapshots")
+
+# Состояние инкрементальных обработчиков handle(df_new, df_prev) — см. modules/incremental.py
+INCREMENTAL_FOLDER = os.path.join(BASE_DIR, "data", "incremental")
+
+# Замеры производительности (история профилей рендера и т.п.)
+PERF_FOLDER = os.path.join(BASE_DIR, "data", "perf")
+RENDER_HISTORY_FILE = os.path.join(PERF_FOLDER, "render_history.jsonl")
+SYNC_METRICS_FILE = os.path.join(PERF_FOLDER, "sync_metrics.jsonl")
+
 # 2. ФАЙЛЫ КОНФИГУРАЦИИ (Все кладем в папку config)
 # Если ваши файлы лежат в корне, ПЕРЕМЕСТИТЕ их в папку 'config'
 CONFIG_FILE = os.path.join(CONFIG_FOLDER, "charts_config.json")
@@ -19,6 +43,7 @@ SOURCES_CONFIG_FILE = os.path.join(CONFIG_FOLDER, "sources_config.json")
 PAGES_CONFIG_FILE = os.path.join(CONFIG_FOLDER, "pages_config.json")
 TITLES_CONFIG_FILE = os.path.join(CONFIG_FOLDER, "titles_config.json")
 LLM_PROVIDERS_FILE = os.path.join(CONFIG_FOLDER, "llm_providers.json")
+APP_SETTINGS_FILE = os.path.join(CONFIG_FOLDER, "app_settings.json")  # Общие переключатели приложения
 
 # !!! НОВОЕ: Файл с темами !!!
 THEMES_CONFIG_FILE = os.path.join(CONFIG_FOLDER, "themes.json")
@@ -27,6 +52,23 @@ THEMES_CONFIG_FILE = os.path.join(CONFIG_FOLDER, "themes.json")
 CLIENT_SECRET_FILE = os.path.join(CONFIG_FOLDER, "client_secret.json")
 USER_TOKEN_FILE = os.path.join(CONFIG_FOLDER, "user_token.json")
 
+# Кэш ответов LLM
+LLM_CACHE_TTL_SEC = 7 * 24 * 3600   # Сколько живет ответ
+LLM_CACHE_MAX_MB = 50               # Лимит папки кэша (старые ответы удаляются первыми)
+
+# Изолированный рендер графиков (отдельный процесс)
+CHART_TIMEOUT_SEC = 30      # Лимит времени на render()
+CHART_MEMORY_MB = 2048      # Лимит адресного пространства процесса (pandas/plotly сами занимают ~0.5 GB)
+
+# Локальный HTTP API (python -m modules.api_server)
+API_HOST = "127.0.0.1"
+API_PORT = 8601
+API_CACHE_MB = 256          # Память под готовые ответы (фигуры, сконвертированные наборы)
+
+# Версии файлов данных
+SNAPSHOT_KEEP_LAST = 20     # Сколько последних версий хранить всегда
+SNAPSHOT_MAX_AGE_DAYS = 30  # Более старые: одна версия за день, пока не станут старше этого срока
+
 # Ссылки
 GUIDE_URL = "https://docs.google.com/document/d/1xCy8bnTMZTShal60hxKWTWmXCnN5OAB46gd9Ad0kowg/edit?usp=sharing"
 
@@ -39,7 +81,7 @@ SCOPES = [
 def init_project_structure():
     """Создает все необходимые папки при старте."""
     # Добавили CONFIG_FOLDER в список
-    for folder in [DATA_FOLDER, CHARTS_FOLDER, HANDLERS_FOLDER, RAW_DATA_FOLDER, CONFIG_FOLDER]:
+    for folder in [DATA_FOLDER, CHARTS_FOLDER, HANDLERS_FOLDER, RAW_DATA_FOLDER, CONFIG_FOLDER, LLM_CACHE_FOLDER, PERF_FOLDER, CATALOG_FOLDER, COLUMNAR_FOLDER, SNAPSHOTS_FOLDER, PUBLISH_FOLDER, INCREMENTAL_FOLDER]:
         if not os.path.exists(folder):
             os.makedirs(folder, exist_ok=True)
 
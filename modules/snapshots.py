@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import datetime
+import threading
+from modules.settings import SNAPSHOTS_FOLDER, DATA_FOLDER, SNAPSHOT_KEEP_LAST, SNAPSHOT_MAX_AGE_DAYS
+
+# --- ВЕРСИИ ФАЙЛОВ ДАННЫХ (CONTENT-ADDRESSED) ---
+# Файл режется на куски, каждый кусок хранится один раз (имя = sha256, содержимое сжато zlib).
+# Версия файла — манифест (<id>.json) и список кусков (<id>.chunks), поэтому восстановить можно любую версию
+# сразу, без цепочки дельт. Почти одинаковые версии (ежедневные выгрузки, правка обработчиком)
+# делят большую часть кусков.
+#
+# Текст (CSV) режется по границам строк, зависящим от содержимого: вставка строки в начало
+# меняет только соседний кусок. Бинарные форматы (XLSX, Parquet — уже сжаты) — фиксированными кусками.
+
+CHUNKS_DIR = os.path.join(SNAPSHOTS_FOLDER, "chunks")
+MANIFESTS_DIR = os.path.join(SNAPSHOTS_FOLDER, "manifests")
+
+TEXT_EXTENSIONS = (".csv", ".txt", ".json", ".tsv")
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+BOUNDARY_MASK = 0xFF        # Граница после строки, у которой crc32 & mask == 0 (в среднем раз в 256 строк)
+BINARY_CHUNK = 256 * 1024
+GC_GRACE_SEC = 3600         # Куски моложе этого не удаляются: их может прямо сейчас использовать другой процесс
+
+_LOCK = threading.Lock()
+_LIST_CACHE = {}  # имя файла -> (mtime папки манифестов, список версий); свои записи сбрасывают его явно
+
+
+def _iter_chunks(path):
+    """Куски файла: по строкам с границами по содержимому (текст) или фиксированные (бинарные)."""
+    with open(path, "rb") as f:
+        if not path.lower().endswith(TEXT_EXTENSIONS):
+            while True:
+                block = f.read(BINARY_CHUNK)
+                if not block:
+                    return
+                yield block
+
+        buf, size = [], 0
+        for line in f:
+            buf.append(line)
+            size += len(line)
+            if size >= MAX_CHUNK or (size >= MIN_CHUNK and (zlib.crc32(line) & BOUNDARY_MASK) == 0):
+                yield b"".join(buf)
+                buf, size = [], 0
+        if buf:
+            yield b"".join(buf)
+
+
+def _chunk_path(digest):
+    return os.path.join(CHUNKS_DIR, digest[:2], digest)
+
+
+def _store_chunk(data):
+    """Кладет кусок в хранилище (если такого еще нет). Возвращает (digest, сколько байт записано)."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    if os.path.exists(path):
+        # Отметка использования: gc() не тронет кусок, пока версия с ним записывается
+        os.utime(path)
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    packed = zlib.compress(data, 6)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(packed)
+    os.replace(tmp_path, path)
+    return digest, len(packed)
+
+
+def _manifest_dir(filename):
+    return os.path.join(MANIFESTS_DIR, filename)
+
+
+def _version(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _chunks_file(filename, snap_id):
+    return os.path.join(_manifest_dir(filename), f"{snap_id}.chunks")
+
+
+def list_snapshots(filename):
+    """Версии файла, новые первыми. Список кэшируется до изменения папки манифестов."""
+    folder = _manifest_dir(filename)
+    try:
+        dir_mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return []
+    cached = _LIST_CACHE.get(filename)
+    if cached and cached[0] == dir_mtime:
+        return [dict(m) for m in cached[1]]
+
+    result = []
+    for name in sorted(os.listdir(folder), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                m = json.load(f)
+        except (OSError, ValueError):
+            continue
+        m["id"] = name[:-5]
+        result.append(m)
+    _LIST_CACHE[filename] = (dir_mtime, result)
+    return [dict(m) for m in result]
+
+
+def _read_chunks(filename, snap_id):
+    with open(_chunks_file(filename, snap_id), "r", encoding="utf-8") as f:
+        return f.read().split()
+
+
+def take_snapshot(path, reason="manual", filename=None, created=None):
+    """
+    Сохраняет текущее содержимое файла как версию.
+    Если файл не менялся с последней версии — ничего не делает (проверка по mtime/размеру, без чтения).
+
+    filename — под каким именем хранить (по умолчанию имя самого файла),
+    created — время версии (по умолчанию сейчас).
+
+    Returns:
+        id версии или None (файла нет / изменений нет).
+    """
+    filename = filename or os.path.basename(path)
+    if not os.path.exists(path):
+        return None
+
+    with _LOCK:
+        version = _version(path)
+        latest = list_snapshots(filename)[:1]
+        if latest and latest[0].get("version") == version and filename == os.path.basename(path):
+            return None
+
+        whole = hashlib.sha256()
+        chunks, stored, size = [], 0, 0
+        for data in _iter_chunks(path):
+            digest, written = _store_chunk(data)
+            whole.update(data)
+            chunks.append(digest)
+            stored += written
+            size += len(data)
+
+        sha = whole.hexdigest()
+        if latest and latest[0].get("sha256") == sha:
+            # Содержимое то же (файл просто переписали) — запоминаем новую mtime, версию не плодим
+            _update_manifest(filename, latest[0]["id"], version=version)
+            return None
+
+        created = created or time.time()
+        snap_id = datetime.datetime.fromtimestamp(created).strftime("%Y%m%d-%H%M%S-%f")
+        manifest = {
+            "filename": filename, "created": created, "reason": reason,
+            "size": size, "stored_bytes": stored, "sha256": sha, "version": version,
+        }
+        folder = _manifest_dir(filename)
+        os.makedirs(folder, exist_ok=True)
+        # Сначала список кусков, потом манифест: версия видна, только когда записана целиком
+        tmp_path = os.path.join(folder, f".{snap_id}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(chunks))
+        os.replace(tmp_path, _chunks_file(filename, snap_id))
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(folder, f"{snap_id}.json"))
+        _LIST_CACHE.pop(filename, None)
+
+    if apply_retention(filename):
+        gc()
+    return snap_id
+
+
+def _update_manifest(filename, snap_id, **fields):
+    path = os.path.join(_manifest_dir(filename), f"{snap_id}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.update(fields)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    _LIST_CACHE.pop(filename, None)
+
+
+def restore_snapshot(filename, snap_id, target=None):
+    """
+    Восстанавливает версию в DATA_FOLDER (или в target). Текущее содержимое сначала
+    сохраняется как версия, так что откат тоже можно отменить. Замена файла атомарная.
+    """
+    target = target or os.path.join(DATA_FOLDER, filename)
+    with open(os.path.join(_manifest_dir(filename), f"{snap_id}.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    chunks = _read_chunks(filename, snap_id)
+
+    take_snapshot(target, reason="before restore", filename=filename)
+
+    tmp_path = f"{target}.{threading.get_ident()}.restore"
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk_id in chunks:
+                with open(_chunk_path(chunk_id), "rb") as f:
+                    data = zlib.decompress(f.read())
+                digest.update(data)
+                out.write(data)
+        if digest.hexdigest() != manifest["sha256"]:
+            raise ValueError("Контрольная сумма версии не совпала — хранилище повреждено")
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # Восстановленное состояние — новая версия (куски уже в хранилище, пишется только манифест)
+    take_snapshot(target, reason=f"restore {snap_id}", filename=filename)
+    return target
+
+
+# --- ХРАНЕНИЕ И ОЧИСТКА ---
+
+def apply_retention(filename, keep_last=SNAPSHOT_KEEP_LAST, max_age_days=SNAPSHOT_MAX_AGE_DAYS):
+    """
+    Политика хранения: keep_last последних версий — всегда; более старые прореживаются
+    до одной версии за день и удаляются совсем, когда становятся старше max_age_days.
+    Куски удаленных версий освобождает gc().
+    """
+    snaps = list_snapshots(filename)
+    cutoff = time.time() - max_age_days * 86400
+    seen_days = set()
+    removed = 0
+    for i, snap in enumerate(snaps):
+        day = datetime.date.fromtimestamp(snap["created"])
+        if i < keep_last:
+            seen_days.add(day)
+            continue
+        if snap["created"] >= cutoff and day not in seen_days:
+            seen_days.add(day)
+            continue
+        _remove_version(filename, snap["id"])
+        removed += 1
+    return removed
+
+
+def _remove_version(filename, snap_id):
+    # Манифест первым: без него версия уже не видна, даже если список кусков удалить не выйдет
+    for path in (os.path.join(_manifest_dir(filename), f"{snap_id}.json"), _chunks_file(filename, snap_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    _LIST_CACHE.pop(filename, None)
+
+
+def remove_history(filename):
+    """Удаляет все версии файла (при удалении самого файла) и освобождает их куски."""
+    for snap in list_snapshots(filename):
+        _remove_version(filename, snap["id"])
+    try:
+        os.rmdir(_manifest_dir(filename))
+    except OSError:
+        pass
+    gc()
+
+
+def gc():
+    """
+    Удаляет куски, на которые не ссылается ни один манифест и которые не использовались
+    последние GC_GRACE_SEC (синхронизация может идти в нескольких процессах). Возвращает (файлов, байт) удалено.
+    """
+    with _LOCK:
+        referenced = set()
+        if os.path.isdir(MANIFESTS_DIR):
+            for fname in os.listdir(MANIFESTS_DIR):
+                folder = _manifest_dir(fname)
+                for name in os.listdir(folder):
+                    # Учитываются и списки без манифеста (запись версии прервалась) — их куски целы
+                    if not name.endswith(".chunks"):
+                        continue
+                    try:
+                        referenced.update(_read_chunks(fname, name[:-7]))
+                    except OSError:
+                        continue
+
+        removed, freed = 0, 0
+        if os.path.isdir(CHUNKS_DIR):
+            for prefix in os.listdir(CHUNKS_DIR):
+                folder = os.path.join(CHUNKS_DIR, prefix)
+                for name in os.listdir(folder):
+                    if name in referenced:
+                        continue
+                    path = os.path.join(folder, name)
+                    try:
+                        if time.time() - os.path.getmtime(path) < GC_GRACE_SEC:
+                            continue
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+    return removed, freed
+
+
+def get_stats():
+    """Объем версий "как есть" против реально занятого места (эффект дедупликации и сжатия)."""
+    logical = 0
+    versions = 0
+    if os.path.isdir(MANIFESTS_DIR):
+        for fname in os.listdir(MANIFESTS_DIR):
+            for snap in list_snapshots(fname):
+                logical += snap.get("size", 0)
+                versions += 1
+    stored = 0
+    if os.path.isdir(CHUNKS_DIR):
+        for root, _, files in os.walk(CHUNKS_DIR):
+            stored += sum(os.path.getsize(os.path.join(root, n)) for n in files)
+    return {
+        "versions": versions,
+        "logical_mb": round(logical / (1024 * 1024), 2),
+        "stored_mb": round(stored / (1024 * 1024), 2),
+        "ratio": round(logical / stored, 2) if stored else 0.0,
+    }
+
+
+def import_legacy_backups(backup_folder):
+    """Переносит копии из старой папки backups в хранилище версий (однократно при старте)."""
+    if not os.path.isdir(backup_folder):
+        return 0
+    imported = 0
+    for name in os.listdir(backup_folder):
+        path = os.path.join(backup_folder, name)
+        if not os.path.isfile(path):
+            continue
+        # Копия делалась до первой обработки — в истории она старше текущего файла
+        take_snapshot(path, reason="legacy backup", filename=name, created=os.path.getmtime(path))
+        os.remove(path)
+        imported += 1
+    try:
+        os.rmdir(backup_folder)
+    except OSError:
+        pass
+    return imported
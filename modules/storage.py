@@ -0,0 +1,286 @@
+import os
+import threading
+import contextlib
+from modules.settings import COLUMNAR_FOLDER
+from modules.profiling import timed_read
+
+# --- ЧТЕНИЕ ДАННЫХ ЧЕРЕЗ ОБЩУЮ КОЛОНОЧНУЮ КОПИЮ ---
+# Рядом с каждым файлом данных лежит Arrow-копия без сжатия (data/columnar/<имя>.arrow).
+# Она открывается через memory map: страницы файла живут в page cache ОС и одни на все
+# сессии и процессы (графики в песочнице, синхронизация, API), а не копируются в память каждого.
+# read_table берет копию, если она соответствует текущей версии файла, иначе читает оригинал.
+# Оригиналы остаются на месте: старые графики читают их напрямую через pd.read_csv.
+#
+# Открытые файлы — DatasetHandle со счетчиком ссылок. Новая версия выкладывается атомарной
+# заменой: уже открытые таблицы продолжают видеть старую (ее страницы живут, пока на них
+# есть ссылки), новые чтения открывают новую.
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+CSV_CHUNK_ROWS = 200_000  # Размер порции при потоковой конвертации CSV
+MAX_IDLE_HANDLES = 64     # Сколько неиспользуемых открытых файлов держать про запас
+
+_HANDLES = {}  # путь к копии -> DatasetHandle текущей версии
+_HANDLES_LOCK = threading.Lock()
+
+
+def columnar_path(path):
+    return os.path.join(COLUMNAR_FOLDER, os.path.basename(path) + ".arrow")
+
+
+def _legacy_columnar_path(path):
+    """Parquet-копии прошлых версий (заменены на .arrow, удаляются при перезаписи)."""
+    return os.path.join(COLUMNAR_FOLDER, os.path.basename(path) + ".parquet")
+
+
+def is_columnar_fresh(path):
+    """Копия актуальна, если ее mtime совпадает с mtime оригинала (ставится при записи копии)."""
+    try:
+        return os.stat(columnar_path(path)).st_mtime_ns == os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+
+# --- ОТКРЫТЫЕ КОПИИ (MEMORY MAP) ---
+
+class DatasetHandle:
+    """Открытая Arrow-копия. table ссылается на страницы файла, без копии в памяти процесса."""
+
+    def __init__(self, path, version):
+        import pyarrow as pa
+        self.path = path
+        self.version = version
+        self.refs = 0
+        self.retired = False
+        self._source = pa.memory_map(path, "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+
+    def to_pandas(self, columns=None, shared=False):
+        """
+        DataFrame из копии. shared=True — колонки pandas ArrowDtype поверх тех же страниц (без копии,
+        общие для всех сессий); иначе обычный DataFrame numpy (копия, которую можно менять на месте).
+        """
+        table = self.table.select(columns) if columns else self.table
+        if shared:
+            import pandas as pd
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        return table.to_pandas()
+
+    def close(self):
+        # Буферы уже выданных таблиц держат отображение сами — закрывается только файл
+        self.table = None
+        self._source.close()
+
+
+def _version(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _retire(cpath):
+    """Выводит из оборота текущий handle копии: закроется, когда отпустят последнюю ссылку."""
+    handle = _HANDLES.pop(cpath, None)
+    if handle:
+        handle.retired = True
+        if handle.refs == 0:
+            handle.close()
+
+
+def _trim_idle():
+    idle = [p for p, h in _HANDLES.items() if h.refs == 0]
+    for cpath in idle[:max(0, len(idle) - MAX_IDLE_HANDLES)]:
+        _retire(cpath)
+
+
+def acquire(path):
+    """Handle свежей копии файла данных (refs + 1) или None, если копии нет или она устарела."""
+    if not PYARROW_AVAILABLE or not is_columnar_fresh(path):
+        return None
+    cpath = columnar_path(path)
+    with _HANDLES_LOCK:
+        try:
+            version = _version(cpath)
+        except OSError:
+            return None
+        handle = _HANDLES.get(cpath)
+        if handle and handle.version != version:
+            _retire(cpath)  # Копию заменили — новые чтения идут в новую версию
+            handle = None
+        if handle is None:
+            try:
+                handle = DatasetHandle(cpath, version)
+            except Exception as e:
+                print(f"Columnar open error ({os.path.basename(path)}): {e}")
+                return None
+            _HANDLES[cpath] = handle
+            _trim_idle()
+        handle.refs += 1
+        return handle
+
+
+def release(handle):
+    with _HANDLES_LOCK:
+        handle.refs -= 1
+        if handle.refs == 0 and handle.retired:
+            handle.close()
+
+
+@contextlib.contextmanager
+def open_dataset(path):
+    """
+    with open_dataset(path) as handle: handle.table (pyarrow.Table) / handle.to_pandas(...).
+    handle = None, если свежей копии нет (тогда читать через read_table).
+    """
+    handle = acquire(path)
+    try:
+        yield handle
+    finally:
+        if handle is not None:
+            release(handle)
+
+
+def read_table(path, columns=None, shared=False):
+    """
+    Читает файл данных в DataFrame: Arrow-копия, если свежая, иначе CSV/XLSX/Parquet по расширению.
+    shared=True — без копии в памяти (колонки ArrowDtype), для кода, который только читает данные.
+    """
+    import pandas as pd
+
+    with timed_read():  # Фаза data_read в профиле рендера
+        handle = acquire(path)
+        if handle is not None:
+            try:
+                return handle.to_pandas(columns, shared=shared)
+            finally:
+                release(handle)
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, columns=columns)
+        if path.endswith(".csv"):
+            return pd.read_csv(path, usecols=columns)
+        return pd.read_excel(path, usecols=columns)
+
+
+# --- ЗАПИСЬ КОПИЙ ---
+
+def _publish(tmp_path, path, source_mtime_ns):
+    """Атомарно выкладывает копию и помечает ее версией оригинала."""
+    target = columnar_path(path)
+    os.utime(tmp_path, ns=(source_mtime_ns, source_mtime_ns))
+    try:
+        os.replace(tmp_path, target)
+    except PermissionError:
+        # Windows не заменяет отображенный в память файл: закрываем неиспользуемый handle и пробуем снова
+        with _HANDLES_LOCK:
+            _retire(target)
+        os.replace(tmp_path, target)
+    try:
+        os.remove(_legacy_columnar_path(path))
+    except OSError:
+        pass
+
+
+def _tmp_path(path):
+    return f"{columnar_path(path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_ipc(table, tmp_path):
+    import pyarrow as pa
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def write_columnar(df, path):
+    """Arrow-копия из уже загруженного DataFrame (после синхронизации или обработчика)."""
+    if not PYARROW_AVAILABLE:
+        return False
+    tmp_path = _tmp_path(path)
+    try:
+        import pyarrow as pa
+        source_mtime = os.stat(path).st_mtime_ns
+        os.makedirs(COLUMNAR_FOLDER, exist_ok=True)
+        _write_ipc(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        _publish(tmp_path, path, source_mtime)
+        return True
+    except Exception as e:
+        print(f"Columnar write error ({os.path.basename(path)}): {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def convert_to_columnar(path, progress_cb=None):
+    """
+    Конвертирует CSV/XLSX/Parquet в Arrow-копию. CSV и Parquet читаются порциями (память не растет
+    с размером файла), progress_cb(доля 0..1) вызывается по мере чтения.
+    Если файл изменится во время конвертации, копия получится "несвежей" и не будет использоваться.
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow не установлен")
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source_mtime = os.stat(path).st_mtime_ns
+    os.makedirs(COLUMNAR_FOLDER, exist_ok=True)
+    tmp_path = _tmp_path(path)
+
+    try:
+        if path.endswith(".csv"):
+            total = max(1, os.path.getsize(path))
+            try:
+                writer, sink, schema = None, None, None
+                with open(path, "rb") as raw:
+                    for chunk in pd.read_csv(raw, chunksize=CSV_CHUNK_ROWS):
+                        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                        if writer is None:
+                            schema = table.schema
+                            sink = pa.OSFile(tmp_path, "wb")
+                            writer = pa.ipc.new_file(sink, schema)
+                        writer.write_table(table)
+                        if progress_cb:
+                            progress_cb(min(raw.tell() / total, 0.99))
+                if writer is not None:
+                    writer.close()
+                    sink.close()
+                else:
+                    _write_ipc(pa.Table.from_pandas(pd.read_csv(path), preserve_index=False), tmp_path)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError):
+                # Типы колонок "поплыли" между порциями (число в первой, текст в следующей) — читаем целиком
+                if writer is not None:
+                    writer.close()
+                    sink.close()
+                _write_ipc(pa.Table.from_pandas(pd.read_csv(path), preserve_index=False), tmp_path)
+        elif path.endswith(".parquet"):
+            pf = pq.ParquetFile(path)
+            total = max(1, pf.metadata.num_rows)
+            done = 0
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, pf.schema_arrow) as writer:
+                for batch in pf.iter_batches(batch_size=CSV_CHUNK_ROWS):
+                    writer.write_batch(batch)
+                    done += batch.num_rows
+                    if progress_cb:
+                        progress_cb(min(done / total, 0.99))
+        else:
+            _write_ipc(pa.Table.from_pandas(pd.read_excel(path), preserve_index=False), tmp_path)
+
+        _publish(tmp_path, path, source_mtime)
+        if progress_cb:
+            progress_cb(1.0)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_columnar(path):
+    with _HANDLES_LOCK:
+        _retire(columnar_path(path))
+    for cpath in (columnar_path(path), _legacy_columnar_path(path)):
+        try:
+            os.remove(cpath)
+        except OSError:
+            pass
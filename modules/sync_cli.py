@@ -0,0 +1,213 @@
+"""
+Синхронизация источников без интерфейса (cron, оркестраторы).
+
+Читает config/sources_config.json, берет токен Google из config/user_token.json
+(сохраняется при входе через интерфейс с "Запомнить меня") и выполняет sync_single_source
+для всех или выбранных источников. Запуск из папки проекта (пути берутся от текущей папки):
+
+    python -m modules.sync_cli                          # все активные источники
+    python -m modules.sync_cli --source sales.csv --source users.xlsx
+    python -m modules.sync_cli --threads 8 --processes 2 --report sync_report.json
+    python -m modules.sync_cli --list
+
+После синхронизации пересобираются статические снимки страниц (modules/publish.py), если не указан --no-publish.
+
+Коды выхода: 0 — все источники обновлены, 1 — часть источников с ошибкой,
+2 — ошибка запуска (нет конфига, неизвестный источник, нечего обновлять).
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import threading
+import concurrent.futures
+
+from modules.settings import SOURCES_CONFIG_FILE, USER_TOKEN_FILE
+from modules.utils import load_json, save_json
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+GOOGLE_CONNECTORS = ("google_sheets",)
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(f"[{datetime.datetime.now():%H:%M:%S}] {message}", file=sys.stderr, flush=True)
+
+
+def load_stored_creds():
+    """
+    Учетные данные Google из файла токена (без Streamlit). Протухший токен обновляется
+    по refresh_token и сохраняется обратно. Returns: Credentials или None.
+    """
+    if not os.path.exists(USER_TOKEN_FILE):
+        return None
+    try:
+        with open(USER_TOKEN_FILE, "r", encoding="utf-8") as f:
+            if not json.load(f):
+                return None  # После выхода из аккаунта файл содержит {}
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+        creds = Credentials.from_authorized_user_file(USER_TOKEN_FILE)
+        if creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+            tmp_path = f"{USER_TOKEN_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(creds.to_json())
+            os.replace(tmp_path, USER_TOKEN_FILE)
+        return creds if creds.valid else None
+    except Exception as e:
+        log(f"Токен Google не загружен: {type(e).__name__}: {e}")
+        return None
+
+
+def select_sources(s_conf, names=None, include_inactive=False):
+    """Источники для запуска. Returns: (список, неизвестные имена)."""
+    sources = [s for s in s_conf.get("sources", []) if include_inactive or s.get("active", True)]
+    if not names:
+        return sources, []
+    by_name = {s.get("filename"): s for s in s_conf.get("sources", [])}
+    unknown = [n for n in names if n not in by_name]
+    return [by_name[n] for n in names if n in by_name], unknown
+
+
+def _sync_one(src, creds):
+    fname = src.get("filename")
+    entry = {"filename": fname, "connector_id": src.get("connector_id", "base"), "pid": os.getpid()}
+    task = src.copy()
+    task["config"] = src.get("config", {}).copy()
+    if entry["connector_id"] in GOOGLE_CONNECTORS:
+        if creds is None:
+            entry.update(ok=False, message="Нет сохраненного токена Google: войдите через интерфейс с 'Запомнить меня'",
+                         duration_s=0.0, rows=0)
+            log(f"❌ {fname}: {entry['message']}")
+            return entry
+        task["config"]["_injected_creds"] = creds
+
+    t0 = time.perf_counter()
+    try:
+        from modules.data_loader import sync_single_source
+        ok, msg, df = sync_single_source(task)
+    except Exception as e:
+        ok, msg, df = False, f"{type(e).__name__}: {e}", None
+    entry.update(ok=ok, message=msg, duration_s=round(time.perf_counter() - t0, 3),
+                 rows=len(df) if df is not None else 0)
+    outcome = f"{entry['rows']} строк" if ok else msg
+    log(f"{'✅' if ok else '❌'} {fname}: {outcome} ({entry['duration_s']} s)")
+    return entry
+
+
+def run_batch(sources, threads, need_google):
+    """Пачка источников в потоках одного процесса. Токен читается в самом процессе (объект не передается между процессами)."""
+    creds = load_stored_creds() if need_google else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        return list(executor.map(lambda s: _sync_one(s, creds), sources))
+
+
+def run_sync(sources, threads=5, processes=1):
+    """
+    Запускает синхронизацию: processes процессов, в каждом threads потоков.
+    Процессы имеют смысл, когда узкое место — CPU (разбор ответов, запись XLSX, обработчики).
+    """
+    need_google = any(s.get("connector_id") in GOOGLE_CONNECTORS for s in sources)
+    processes = max(1, min(processes, len(sources)))
+    if processes == 1:
+        return run_batch(sources, threads, need_google)
+
+    # По очереди раскладываем источники по процессам; тяжелые не соберутся в одном
+    batches = [sources[i::processes] for i in range(processes)]
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_batch, batch, threads, need_google) for batch in batches]
+        for future, batch in zip(futures, batches):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                # Процесс упал целиком (например, OOM) — все его источники считаются неудачными
+                results.extend({"filename": s.get("filename"), "connector_id": s.get("connector_id", "base"),
+                                "ok": False, "message": f"Процесс синхронизации упал: {type(e).__name__}: {e}",
+                                "duration_s": 0.0, "rows": 0} for s in batch)
+    # Порядок отчета — как в конфиге, а не по процессам
+    order = {s.get("filename"): i for i, s in enumerate(sources)}
+    return sorted(results, key=lambda r: order.get(r["filename"], 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless data source sync (no Streamlit UI required)")
+    parser.add_argument("--source", action="append", dest="sources", metavar="FILENAME",
+                        help="Источник по имени файла (можно несколько раз); по умолчанию все активные")
+    parser.add_argument("--include-inactive", action="store_true", help="Вместе с выключенными источниками")
+    parser.add_argument("--threads", type=int, default=5, help="Потоков на процесс (как в интерфейсе — 5)")
+    parser.add_argument("--processes", type=int, default=1, help="Число процессов")
+    parser.add_argument("--report", help="Куда сохранить JSON-отчет (по умолчанию — stdout)")
+    parser.add_argument("--list", action="store_true", help="Показать источники и выйти")
+    parser.add_argument("--no-publish", action="store_true", help="Не пересобирать статические снимки страниц")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(SOURCES_CONFIG_FILE):
+        log(f"Нет конфига источников: {SOURCES_CONFIG_FILE}")
+        return EXIT_USAGE
+    s_conf = load_json(SOURCES_CONFIG_FILE, {})
+
+    if args.list:
+        for s in s_conf.get("sources", []):
+            print(f"{'+' if s.get('active', True) else '-'} {s.get('connector_id', 'base'):15} {s.get('filename')}")
+        return EXIT_OK
+
+    sources, unknown = select_sources(s_conf, args.sources, args.include_inactive)
+    if unknown:
+        log(f"Неизвестные источники: {', '.join(unknown)}")
+        return EXIT_USAGE
+    if not sources:
+        log("Нечего обновлять")
+        return EXIT_USAGE
+
+    log(f"Синхронизация: {len(sources)} источник(ов), процессов {args.processes}, потоков {args.threads}")
+    started = time.time()
+    results = run_sync(sources, threads=args.threads, processes=args.processes)
+    finished = time.time()
+
+    failed = [r for r in results if not r["ok"]]
+    if not args.no_publish and len(failed) < len(results):
+        # Снимки для быстрого просмотра; перерисовываются только графики с изменившимися данными
+        try:
+            from modules.publish import publish_all
+            published = publish_all()
+            log(f"Снимки страниц: {published['pages']} стр., перерисовано графиков: {published['rendered']}")
+        except Exception as e:
+            log(f"Снимки страниц не обновлены: {type(e).__name__}: {e}")
+    if not args.sources:
+        # Как кнопка "Обновить ВСЕ": отметка времени видна в интерфейсе
+        s_conf = load_json(SOURCES_CONFIG_FILE, {})
+        s_conf["last_updated"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        save_json(SOURCES_CONFIG_FILE, s_conf)
+
+    report = {
+        "started": datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "finished": datetime.datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+        "duration_s": round(finished - started, 3),
+        "threads": args.threads,
+        "processes": args.processes,
+        "total": len(results),
+        "ok": len(results) - len(failed),
+        "failed": len(failed),
+        "sources": results,
+    }
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    log(f"Готово: {report['ok']}/{report['total']} за {report['duration_s']} s")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
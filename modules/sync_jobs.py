@@ -0,0 +1,167 @@
+import time
+import datetime
+import threading
+import concurrent.futures
+from modules.settings import SOURCES_CONFIG_FILE
+from modules.utils import load_json, save_json
+
+# --- ФОНОВАЯ СИНХРОНИЗАЦИЯ ИСТОЧНИКОВ ---
+# Кнопки "↻" и "Обновить ВСЕ" только ставят задачи: синхронизация идет в пуле потоков процесса
+# сервера (один на все сессии), страница не ждет самый медленный коннектор.
+# Прогресс (фаза, строки) пишется в get_sync_jobs() и показывается фрагментом с опросом.
+# Отмена кооперативная: коннектор и обработчик проверяют флаг между порциями данных
+# (SyncProgress.update) — зависший сетевой вызов прервется только после возврата из него.
+
+MAX_SYNC_WORKERS = 5
+DONE_VISIBLE_SEC = 60  # Сколько показывать "✅" после успешного обновления
+
+PHASES = {
+    "queued": "в очереди",
+    "connect": "подключение",
+    "fetch": "загрузка",
+    "handler": "обработчик",
+    "write": "запись",
+}
+
+_JOBS = {}  # имя файла -> {"status": queued|running|done|error|cancelled, "phase", "rows", "message", ...}
+_CANCEL = {}  # имя файла -> threading.Event текущей задачи
+_JOBS_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+class SyncCancelled(Exception):
+    """Синхронизацию отменил пользователь."""
+
+
+class SyncProgress:
+    """
+    Прогресс одной синхронизации. Передается коннектору (config["_progress"]) и обработчику
+    (если handle объявил параметр progress). Без фоновой задачи (CLI) — только счетчики.
+    """
+
+    def __init__(self, filename=None, cancel_event=None):
+        self.filename = filename
+        self.cancel_event = cancel_event or threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        """Точка отмены: бросает SyncCancelled, если пользователь нажал "⏹"."""
+        if self.cancel_event.is_set():
+            raise SyncCancelled("Отменено пользователем")
+
+    def update(self, phase=None, rows=None):
+        """Сообщает фазу и/или число полученных строк, заодно проверяет отмену."""
+        fields = {}
+        if phase is not None: fields["phase"] = phase
+        if rows is not None: fields["rows"] = int(rows)
+        if fields and self.filename:
+            _set_job(self.filename, **fields)
+        self.check()
+
+
+def _set_job(filename, **fields):
+    with _JOBS_LOCK:
+        if filename in _JOBS:
+            _JOBS[filename].update(fields)
+
+
+def _finish_batch(batch, ok):
+    with _JOBS_LOCK:
+        batch["left"] -= 1
+        batch["ok"] += int(ok)
+        if batch["left"]:
+            return
+    if batch["ok"]:
+        # Статические снимки страниц пересобираются один раз на пачку (неизменившиеся графики не рендерятся)
+        from modules.publish import schedule_publish
+        schedule_publish()
+    if batch["mark_updated"]:
+        s_conf = load_json(SOURCES_CONFIG_FILE, {})
+        s_conf["last_updated"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        save_json(SOURCES_CONFIG_FILE, s_conf)
+
+
+def _run_job(source_config, progress, batch):
+    filename = progress.filename
+    _set_job(filename, status="running", phase="connect", started=time.time())
+    ok = False
+    try:
+        if progress.cancelled:
+            raise SyncCancelled("Отменено до запуска")
+        from modules.data_loader import sync_single_source
+        ok, msg, df = sync_single_source(source_config, progress=progress)
+        if ok:
+            _set_job(filename, status="done", phase=None, rows=len(df), message="", finished=time.time())
+        else:
+            status = "cancelled" if progress.cancelled else "error"
+            _set_job(filename, status=status, phase=None, message=msg, finished=time.time())
+    except SyncCancelled as e:
+        _set_job(filename, status="cancelled", phase=None, message=str(e), finished=time.time())
+    except Exception as e:
+        _set_job(filename, status="error", phase=None, message=f"{type(e).__name__}: {e}", finished=time.time())
+    finally:
+        with _JOBS_LOCK:
+            if _CANCEL.get(filename) is progress.cancel_event:
+                del _CANCEL[filename]
+        _finish_batch(batch, ok)
+
+
+def submit_syncs(sources, mark_updated=False):
+    """
+    Ставит источники в фоновую очередь. Источник, который уже обновляется, второй раз не ставится.
+    mark_updated=True — по завершении всей пачки записать last_updated (кнопка "Обновить ВСЕ").
+
+    Returns: список имен файлов, принятых в очередь.
+    """
+    global _EXECUTOR
+    accepted = []
+    with _JOBS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_SYNC_WORKERS, thread_name_prefix="sync")
+        for src in sources:
+            filename = src.get("filename")
+            if not filename or filename in _CANCEL:
+                continue
+            _CANCEL[filename] = threading.Event()
+            _JOBS[filename] = {"status": "queued", "phase": "queued", "rows": 0, "message": "",
+                               "submitted": time.time(), "started": None, "finished": None}
+            accepted.append(src)
+        batch = {"left": len(accepted), "ok": 0, "mark_updated": mark_updated}
+        for src in accepted:
+            progress = SyncProgress(src["filename"], _CANCEL[src["filename"]])
+            _EXECUTOR.submit(_run_job, src, progress, batch)
+    return [src["filename"] for src in accepted]
+
+
+def cancel_sync(filename=None):
+    """Просит остановиться задачу файла (или все, если filename=None). Returns: сколько задач отменено."""
+    with _JOBS_LOCK:
+        events = list(_CANCEL.values()) if filename is None else [_CANCEL[filename]] if filename in _CANCEL else []
+        for event in events:
+            event.set()
+    return len(events)
+
+
+def get_sync_jobs(active_only=False):
+    """Снимок состояния задач синхронизации: {имя файла: {...}}."""
+    with _JOBS_LOCK:
+        jobs = {k: dict(v) for k, v in _JOBS.items()}
+    if active_only:
+        jobs = {k: v for k, v in jobs.items() if v["status"] in ("queued", "running")}
+    return jobs
+
+
+def format_job(job):
+    """Короткая строка статуса для сайдбара."""
+    rows = f" · {job['rows']:,} строк".replace(",", " ") if job.get("rows") else ""
+    if job["status"] in ("queued", "running"):
+        elapsed = time.time() - (job.get("started") or job["submitted"])
+        return f"⏳ {PHASES.get(job.get('phase'), job.get('phase') or '...')}{rows} · {elapsed:.0f} c"
+    if job["status"] == "done":
+        return f"✅ обновлен{rows}"
+    if job["status"] == "cancelled":
+        return "⏹ отменено"
+    return f"❌ {job['message']}"
@@ -0,0 +1,65 @@
+import datetime
+from modules.settings import SYNC_METRICS_FILE
+from modules.utils import append_jsonl, read_jsonl
+
+# --- ТЕЛЕМЕТРИЯ СИНХРОНИЗАЦИЙ ---
+# Каждый запуск sync_single_source пишет одну строку в JSON Lines (простой локальный time-series).
+
+SYNC_METRICS_MAX = 20000
+
+
+def record_sync_run(metrics):
+    """Сохраняет метрики одного запуска синхронизации."""
+    record = dict(metrics)
+    record.setdefault("ts", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    try:
+        append_jsonl(SYNC_METRICS_FILE, record, max_lines=SYNC_METRICS_MAX)
+    except OSError as e:
+        print(f"Sync metrics write error: {e}")
+
+
+def load_sync_history(limit=5000):
+    return read_jsonl(SYNC_METRICS_FILE, limit=limit)
+
+
+def render_sync_telemetry():
+    """Тренды по источникам и топ самых медленных (для сайдбара)."""
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+
+    history = load_sync_history()
+    if not history:
+        st.caption("Пока нет запусков синхронизации.")
+        return
+
+    df = pd.DataFrame(history)
+    df["ts"] = pd.to_datetime(df["ts"])
+    ok = df[df["ok"] == True]
+
+    # 1. Самые медленные источники (медиана по успешным запускам)
+    if not ok.empty:
+        slow = (
+            ok.groupby("filename")
+            .agg(runs=("total_s", "size"), total_s=("total_s", "median"), fetch_s=("fetch_s", "median"),
+                 handler_s=("handler_s", "median"), write_s=("write_s", "median"),
+                 rows=("rows", "last"), mb=("bytes", "last"), rows_per_s=("rows_per_s", "median"))
+            .sort_values("total_s", ascending=False)
+            .reset_index()
+        )
+        slow["mb"] = (slow["mb"] / (1024 * 1024)).round(2)
+        st.caption("🐢 Самые медленные источники (медиана)")
+        st.dataframe(slow.head(10).round(2), hide_index=True, use_container_width=True)
+
+        # 2. Тренд длительности по источникам
+        fig = px.line(ok, x="ts", y="total_s", color="filename", markers=True,
+                      hover_data=["rows", "fetch_s", "handler_s", "write_s"])
+        fig.update_layout(height=260, margin=dict(l=10, r=10, t=10, b=10), showlegend=False,
+                          yaxis_title="сек", xaxis_title=None)
+        st.plotly_chart(fig, use_container_width=True, key="sync_telemetry_trend")
+
+    # 3. Ошибки
+    failed = df[df["ok"] != True]
+    if not failed.empty:
+        st.caption(f"❌ Ошибок за период: {len(failed)}")
+        st.dataframe(failed[["ts", "filename", "message"]].tail(5), hide_index=True, use_container_width=True)
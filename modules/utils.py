@@ -2,6 +2,17 @@ import os
 import json
 import re
 import io
+import threading
+import contextlib
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: только блокировка внутри процесса
+    FCNTL_AVAILABLE = False
+
+_JSONL_LOCK = threading.Lock()
+_JSONL_LINES = {}  # путь -> (размер файла, число строк): чтобы не пересчитывать файл на каждую запись
 
 class ChartExporter:
     """
@@ -58,6 +69,71 @@ def save_json(filepath, data):
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
+@contextlib.contextmanager
+def _jsonl_file_lock(filepath):
+    """Блокировка между процессами (sync_cli --processes N): flock на соседнем файле .lock."""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    with open(f"{filepath}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _count_lines(filepath):
+    count = 0
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            count += block.count(b"\n")
+    return count
+
+def append_jsonl(filepath, record, max_lines=None):
+    """
+    Дописывает запись в JSON Lines файл.
+    При max_lines файл, набравший max_lines строк, переименовывается в <файл>.1 (прошлый .1 удаляется):
+    файл не перечитывается на каждую запись, read_jsonl читает обе части.
+    """
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _JSONL_LOCK, _jsonl_file_lock(filepath):
+        with open(filepath, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            size = os.fstat(f.fileno()).st_size
+        if not max_lines:
+            return
+        cached = _JSONL_LINES.get(filepath)
+        if cached and cached[0] == size - len(line.encode("utf-8")):
+            lines = cached[1] + 1
+        else:
+            lines = _count_lines(filepath)  # Первая запись в процессе или файл дописывал другой процесс
+        if lines >= max_lines:
+            os.replace(filepath, f"{filepath}.1")
+            _JSONL_LINES[filepath] = (0, 0)
+        else:
+            _JSONL_LINES[filepath] = (size, lines)
+
+def _read_jsonl_file(filepath):
+    if not os.path.exists(filepath):
+        return []
+    records = []
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            try: records.append(json.loads(line))
+            except ValueError: continue
+    return records
+
+def read_jsonl(filepath, limit=None):
+    """
+    Читает JSON Lines файл вместе с прошлой частью <файл>.1 (битые строки пропускаются).
+    limit — только последние N записей.
+    """
+    records = _read_jsonl_file(filepath)
+    if not limit or len(records) < limit:
+        records = _read_jsonl_file(f"{filepath}.1") + records
+    return records[-limit:] if limit else records
+
 def sanitize_filename(name):
     name = name.lower().replace(" ", "_")
     name = re.sub(r'[^a-z0-9_]', '', name)
@@ -1,19 +1,26 @@
 import streamlit as st
-import pandas as pd
 import os
 import time
+import tempfile
 
-# --- ИМПОРТЫ ДЛЯ AI ---
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+# SDK моделей (openai, google.generativeai) и pandas здесь не импортируются:
+# мастера открываются редко, а импорт стоит секунды на холодном старте.
+# SDK подгружает llm_manager при первом запросе, pandas — функции, которым он нужен.
 from modules.settings import THEMES_CONFIG_FILE # Импорт пути конфига
 from modules.settings import DATA_FOLDER, CHARTS_FOLDER, CONFIG_FILE, SOURCES_CONFIG_FILE, HANDLERS_FOLDER, PAGES_CONFIG_FILE, TITLES_CONFIG_FILE
 from modules.utils import sanitize_filename, load_json, save_json
 from modules.auth import is_authenticated
 
+# Системный промпт для генерации кода графика
+CHART_SYSTEM_PROMPT = (
+    "Ты Senior Python Developer. Ты меняешь код Streamlit/Plotly по запросу. "
+    "Верни ТОЛЬКО валидный Python код всего модуля. Без маркдауна.\n"
+    "ВАЖНО ПО PLOTLY 5.X:\n"
+    "1. НИКОГДА не используй устаревшие параметры: 'titlefont', 'tickfont' внутри осей.\n"
+    "2. Правильный синтаксис шрифтов: dict(title=dict(text='Name', font=dict(size=14))).\n"
+    "3. Вместо 'margin' в layout используй update_layout(margin=dict(l=..., r=...))."
+)
+
 # --- HELPER: ОЧИСТКА КОДА ОТ AI ---
 def clean_gemini_code(text):
     """Убирает маркдаун обертки ```python ... ``` если они есть."""
@@ -27,6 +34,90 @@ def clean_gemini_code(text):
             text = text.split("```")[0]
     return text.strip()
 
+def save_generated_chart(py_name, code_text, provider_name, model_name, final_prompt):
+    """Сохраняет сгенерированный код графика вместе с промптом в шапке модуля."""
+    safe_prompt = final_prompt.replace('"""', "'''")
+    file_content = f'"""\n--- GENERATED BY {provider_name} ({model_name}) ---\nPROMPT:\n{safe_prompt}\n"""\n\n{code_text}'
+    with open(os.path.join(CHARTS_FOLDER, py_name), "w", encoding="utf-8") as f:
+        f.write(file_content)
+
+def build_chart_prompt(py_name, cols_info, goal, chart_format, chart_controls, colors, dark_mode):
+    """Собирает промпт генерации графика: задача, стиль (палитра и тема), колонки и технический стандарт."""
+    # --- ФОРМИРОВАНИЕ ИНСТРУКЦИИ ПО СТИЛЮ ---
+    theme_mode_instruction = ""
+    if dark_mode:
+        theme_mode_instruction = (
+            "ВАЖНО: График будет отображаться на ТЕМНОМ фоне (Streamlit Dark Mode).\n"
+            "- Используй `template='plotly_dark'`.\n"
+            "- Убедись, что цвета линий/баров контрастны к темному фону.\n"
+            "- Сетку делай полупрозрачной белой или серой.\n"
+        )
+    else:
+        theme_mode_instruction = (
+            "График будет на СВЕТЛОМ фоне.\n"
+            "- Используй `template='plotly_white'` или 'plotly'.\n"
+        )
+
+    style_instruction = (
+        f"\n\n### ДИЗАЙН И ЦВЕТА:\n"
+        f"{theme_mode_instruction}"
+        f"Используй СТРОГО следующую цветовую палитру: {', '.join(colors)}.\n"
+        f"Первый цвет ({colors[0]}) используй для основных данных/линий.\n"
+        f"Второй цвет ({colors[1]}) для второстепенных элементов.\n"
+        f"Третий цвет ({colors[2]}) для фона или акцентов.\n"
+        "График должен быть стильным, минималистичным и корпоративным.\n"
+    )
+
+    controls_instruction = ""
+    if chart_controls:
+        controls_instruction = f"ЭЛЕМЕНТЫ УПРАВЛЕНИЯ: {chart_controls}. Используй st.selectbox/slider внутри render."
+
+    return (
+        "РОЛЬ: Ты Senior Python Developer (Streamlit/Plotly). Твоя цель — писать чистый, читаемый код.\n"
+        f"ЗАДАЧА: {goal}\n"
+        f"ВИД: {chart_format}\n{style_instruction}\n"
+        f"КОНТЕКСТ ДАННЫХ: Файлы `files`. Колонки:\n{cols_info}\n\n"
+
+        "--- ТЕХНИЧЕСКИЙ СТАНДАРТ ---\n"
+        "1. СИГНАТУРА:\n"
+        f"   `def render(files, chart_key='{py_name}'):`\n"
+        "   (chart_key нужен для уникальности ключей виджетов).\n\n"
+
+        "2. ЛОГИКА:\n"
+        "   - Загрузи данные через `read_table(f, shared=True)` из modules.storage (pd.concat):\n"
+        "     одна копия данных в памяти на все сессии (колонки ArrowDtype, только для чтения).\n"
+        "   - Используй стандартные `st.selectbox` / `st.slider` для фильтрации.\n"
+        "   - ОБЯЗАТЕЛЬНО: В каждом виджете используй `key=f'{chart_key}_name'`.\n"
+        "   - Построй график `fig` через Plotly Express.\n"
+        "   - Примени тему: `fig.update_layout(template='plotly_dark')` (или white).\n"
+        "   - ВЕРНИ объект `fig` в конце функции.\n"
+        "   - Также выведи его: `st.plotly_chart(fig, use_container_width=True)`.\n\n"
+
+        "--- ПРИМЕР ЧИСТОГО КОДА ---\n"
+        "```python\n"
+        "import streamlit as st\nimport plotly.express as px\nimport pandas as pd\n"
+        "from modules.storage import read_table  # CSV/XLSX/Parquet через общую Arrow-копию\n\n"
+        "def render(files, chart_key='unique_id'):\n"
+        "    if not files: return\n"
+        "    # 1. Load\n"
+        "    df = pd.concat([read_table(f, shared=True) for f in files], ignore_index=True)\n"
+        "    \n"
+        "    # 2. Filter (Standard Streamlit)\n"
+        "    years = sorted(df['Year'].unique())\n"
+        "    sel_year = st.selectbox('Год', years, key=f'{chart_key}_year')\n"
+        "    df_filtered = df[df['Year'] == sel_year]\n"
+        "    \n"
+        "    # 3. Plot\n"
+        "    fig = px.bar(df_filtered, x='Month', y='Revenue')\n"
+        "    fig.update_layout(template='plotly_dark', margin=dict(t=40, b=40))\n"
+        "    \n"
+        "    # 4. Render & Return\n"
+        "    st.plotly_chart(fig, use_container_width=True)\n"
+        "    return fig\n"
+        "```\n"
+        "ВЕРНИ ТОЛЬКО КОД."
+    )
+
 # --- CALLBACKS ---
 def add_source_callback():
     if "wiz_sources" in st.session_state:
@@ -46,7 +137,7 @@ def wizard_create_chart():
     st.write("### 1. Настройка файла")
     display_title = st.text_input("Название графика (видит пользователь)", placeholder="Динамика Выручки 2024")
     filename_base = st.text_input("Техническое ID файла (латиница)", placeholder="revenue_2024")
-    file = st.file_uploader("Данные", type=["csv", "xlsx"])
+    file = st.file_uploader("Данные", type=["csv", "xlsx", "parquet"])
     
     # 2. Формирование задачи
     st.write("### 2. Формирование задачи")
@@ -163,7 +254,7 @@ def wizard_create_chart():
 
     # --- ВЫБОР AI ПРОВАЙДЕРА ---
     st.write("### 3. Выбор Интеллекта")
-    from modules.llm_manager import get_providers, ask_llm
+    from modules.llm_manager import get_providers, ask_llm_stream, LLMError
     providers = get_providers()
     
     llm_ready = False
@@ -179,6 +270,24 @@ def wizard_create_chart():
         sel_prov = c_prov.selectbox("Интеграция", prov_names, key="wiz_prov_sel")
         avail_models = providers[sel_prov]["models"]
         sel_model = c_mod.selectbox("Модель", avail_models, key="wiz_mod_sel")
+        use_cache = st.checkbox("♻️ Брать готовый ответ из кэша", value=True, key="wiz_use_cache",
+                                help="Повторный запрос с той же задачей вернется мгновенно. Снимите, чтобы сгенерировать заново.")
+
+        # --- ПАРАЛЛЕЛЬНАЯ ГЕНЕРАЦИЯ НА НЕСКОЛЬКИХ МОДЕЛЯХ ---
+        hedge_mode = st.toggle("⚡ Параллельно на нескольких моделях", key="wiz_hedge",
+                               help="Один и тот же запрос уходит сразу в несколько моделей. Медленный или сломанный ответ не тормозит создание графика.")
+        hedge_targets, hedge_pick, hedge_dry_run = [], False, False
+        if hedge_mode:
+            all_targets = [f"{p} / {m}" for p, conf in providers.items() for m in conf["models"]]
+            default_target = f"{sel_prov} / {sel_model}"
+            picked = st.multiselect("Модели", all_targets,
+                                    default=[default_target] if default_target in all_targets else [],
+                                    key="wiz_hedge_targets")
+            hedge_targets = [tuple(t.split(" / ", 1)) for t in picked]
+            hedge_pick = st.radio("Результат", ["Первый валидный", "Выбрать из всех"],
+                                  horizontal=True, key="wiz_hedge_mode") == "Выбрать из всех"
+            hedge_dry_run = st.checkbox("🧪 Пробный запуск render на выборке данных", key="wiz_hedge_dry",
+                                        help="Ответ считается валидным, только если render отработал на первых строках файла без ошибок.")
 
     st.divider()
     
@@ -194,12 +303,11 @@ def wizard_create_chart():
             # Читаем значения, которые сохранил фрагмент в сессию
             current_colors = st.session_state.get("wiz_active_colors", ["#000", "#000", "#000"])
             current_dark_mode = st.session_state.get("wiz_active_dark", False)
-            colors_prompt_str = ", ".join(current_colors)
             # ----------------------------------------------------
 
             # 1. Сохраняем файл
-            path = os.path.join(DATA_FOLDER, file.name)
-            with open(path, "wb") as f: f.write(file.getbuffer())
+            from modules.ingest import ingest_upload
+            _, path = ingest_upload(file)
 
             # 2. Регистрируем
             py_name = sanitize_filename(filename_base)
@@ -220,86 +328,10 @@ def wizard_create_chart():
                 save_json(PAGES_CONFIG_FILE, p_conf)
 
             # 3. Промпт (Анализ колонок)
-            try:
-                if path.endswith('.csv'): df_preview = pd.read_csv(path, nrows=5)
-                else: df_preview = pd.read_excel(path, nrows=5)
-                cols_info = "\n".join([f"- `{c}` ({t})" for c, t in zip(df_preview.columns, df_preview.dtypes)])
-            except Exception as e:
-                cols_info = f"Error reading cols: {e}"
-
-            # --- ФОРМИРОВАНИЕ ИНСТРУКЦИИ ПО СТИЛЮ ---
-            # Теперь current_dark_mode определен выше!
-            theme_mode_instruction = ""
-            if current_dark_mode:
-                theme_mode_instruction = (
-                    "ВАЖНО: График будет отображаться на ТЕМНОМ фоне (Streamlit Dark Mode).\n"
-                    "- Используй `template='plotly_dark'`.\n"
-                    "- Убедись, что цвета линий/баров контрастны к темному фону.\n"
-                    "- Сетку делай полупрозрачной белой или серой.\n"
-                )
-            else:
-                theme_mode_instruction = (
-                    "График будет на СВЕТЛОМ фоне.\n"
-                    "- Используй `template='plotly_white'` или 'plotly'.\n"
-                )
-
-            style_instruction = (
-                f"\n\n### ДИЗАЙН И ЦВЕТА:\n"
-                f"{theme_mode_instruction}"
-                f"Используй СТРОГО следующую цветовую палитру: {colors_prompt_str}.\n"
-                f"Первый цвет ({current_colors[0]}) используй для основных данных/линий.\n"
-                f"Второй цвет ({current_colors[1]}) для второстепенных элементов.\n"
-                f"Третий цвет ({current_colors[2]}) для фона или акцентов.\n"
-                "График должен быть стильным, минималистичным и корпоративным.\n"
-            )
-
-            controls_instruction = ""
-            if chart_controls:
-                controls_instruction = f"ЭЛЕМЕНТЫ УПРАВЛЕНИЯ: {chart_controls}. Используй st.selectbox/slider внутри render."
-
-            final_prompt = (
-                "РОЛЬ: Ты Senior Python Developer (Streamlit/Plotly). Твоя цель — писать чистый, читаемый код.\n"
-                f"ЗАДАЧА: {goal}\n"
-                f"ВИД: {chart_format}\n{style_instruction}\n"
-                f"КОНТЕКСТ ДАННЫХ: Файлы `files`. Колонки:\n{cols_info}\n\n"
-
-                "--- ТЕХНИЧЕСКИЙ СТАНДАРТ ---\n"
-                "1. СИГНАТУРА:\n"
-                f"   `def render(files, chart_key='{py_name}'):`\n"
-                "   (chart_key нужен для уникальности ключей виджетов).\n\n"
-
-                "2. ЛОГИКА:\n"
-                "   - Загрузи данные (pd.concat).\n"
-                "   - Используй стандартные `st.selectbox` / `st.slider` для фильтрации.\n"
-                "   - ОБЯЗАТЕЛЬНО: В каждом виджете используй `key=f'{chart_key}_name'`.\n"
-                "   - Построй график `fig` через Plotly Express.\n"
-                "   - Примени тему: `fig.update_layout(template='plotly_dark')` (или white).\n"
-                "   - ВЕРНИ объект `fig` в конце функции.\n"
-                "   - Также выведи его: `st.plotly_chart(fig, use_container_width=True)`.\n\n"
-
-                "--- ПРИМЕР ЧИСТОГО КОДА ---\n"
-                "```python\n"
-                "import streamlit as st\nimport plotly.express as px\nimport pandas as pd\n\n"
-                "def render(files, chart_key='unique_id'):\n"
-                "    if not files: return\n"
-                "    # 1. Load\n"
-                "    df = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)\n"
-                "    \n"
-                "    # 2. Filter (Standard Streamlit)\n"
-                "    years = sorted(df['Year'].unique())\n"
-                "    sel_year = st.selectbox('Год', years, key=f'{chart_key}_year')\n"
-                "    df_filtered = df[df['Year'] == sel_year]\n"
-                "    \n"
-                "    # 3. Plot\n"
-                "    fig = px.bar(df_filtered, x='Month', y='Revenue')\n"
-                "    fig.update_layout(template='plotly_dark', margin=dict(t=40, b=40))\n"
-                "    \n"
-                "    # 4. Render & Return\n"
-                "    st.plotly_chart(fig, use_container_width=True)\n"
-                "    return fig\n"
-                "```\n"
-                "ВЕРНИ ТОЛЬКО КОД."
-            )
+            from modules.catalog import describe_for_prompt
+            cols_info = describe_for_prompt(path)
+            final_prompt = build_chart_prompt(py_name, cols_info, goal, chart_format, chart_controls,
+                                              current_colors, current_dark_mode)
 
             # --- РАЗВИЛКА: АВТО ИЛИ РУЧНОЙ ---
             if btn_manual:
@@ -317,41 +349,103 @@ def wizard_create_chart():
             elif btn_auto:
                 if not llm_ready:
                     st.error("Сначала настройте AI интеграцию!")
+                elif hedge_mode:
+                    if not hedge_targets:
+                        st.error("Выберите хотя бы одну модель!")
+                    else:
+                        _run_hedged_generation(hedge_targets, py_name, path, final_prompt,
+                                               pick_manually=hedge_pick, dry_run=hedge_dry_run, use_cache=use_cache)
                 else:
-                    with st.spinner(f"🤖 {sel_prov} ({sel_model}) пишет код..."):
-                        # Генерируем
-                        system_msg = (
-                        "Ты Senior Python Developer. Ты меняешь код Streamlit/Plotly по запросу. "
-                        "Верни ТОЛЬКО валидный Python код всего модуля. Без маркдауна.\n"
-                        "ВАЖНО ПО PLOTLY 5.X:\n"
-                        "1. НИКОГДА не используй устаревшие параметры: 'titlefont', 'tickfont' внутри осей.\n"
-                        "2. Правильный синтаксис шрифтов: dict(title=dict(text='Name', font=dict(size=14))).\n"
-                        "3. Вместо 'margin' в layout используй update_layout(margin=dict(l=..., r=...))."
-                    )
-                        success, result_text = ask_llm(sel_prov, sel_model, system_msg, final_prompt)
+                    # Генерируем (код печатается по мере генерации)
+                    system_msg = CHART_SYSTEM_PROMPT
+                    st.caption(f"🤖 {sel_prov} ({sel_model}) пишет код...")
+                    try:
+                        with st.container(height=300):
+                            result_text = st.write_stream(ask_llm_stream(sel_prov, sel_model, system_msg, final_prompt, use_cache=use_cache))
+                        success = True
+                    except LLMError as e:
+                        success, result_text = False, str(e)
+
+                    if success:
+                        # Очистка кода и сохранение файла
+                        save_generated_chart(py_name, clean_gemini_code(result_text), sel_prov, sel_model, final_prompt)
                         
-                        if success:
-                            # Очистка кода
-                            if "```python" in result_text: 
-                                code_text = result_text.split("```python")[1].split("```")[0].strip()
-                            elif "```" in result_text:
-                                code_text = result_text.split("```")[1].strip()
-                            else:
-                                code_text = result_text.strip()
-                            
-                            # Сохранение файла
-                            safe_prompt = final_prompt.replace('"""', "'''")
-                            file_content = f'"""\n--- GENERATED BY {sel_prov} ({sel_model}) ---\nPROMPT:\n{safe_prompt}\n"""\n\n{code_text}'
-                            
-                            with open(os.path.join(CHARTS_FOLDER, py_name), "w", encoding="utf-8") as f:
-                                f.write(file_content)
-                            
-                            st.success(f"✅ График сгенерирован через {sel_prov}!")
-                            time.sleep(1)
-                            st.rerun()
-                        else:
-                            st.error(f"Ошибка генерации: {result_text}")
-                            st.session_state.gen_prompt = final_prompt
+                        st.success(f"✅ График сгенерирован через {sel_prov}!")
+                        time.sleep(1)
+                        st.rerun()
+                    else:
+                        st.error(f"Ошибка генерации: {result_text}")
+                        st.session_state.gen_prompt = final_prompt
+
+    # --- ВЫБОР ИЗ ПАРАЛЛЕЛЬНЫХ ВАРИАНТОВ ---
+    if st.session_state.get("wiz_candidates"):
+        _candidates_picker()
+
+def _run_hedged_generation(targets, py_name, data_path, final_prompt, pick_manually=False, dry_run=False, use_cache=True):
+    """Гонка моделей: первый валидный ответ сохраняется сразу, либо все варианты идут на выбор."""
+    from modules.llm_manager import race_llm
+    from modules.chart_runtime import validate_chart_code, make_sample_files
+
+    candidates = []
+    # Выборка данных для пробного запуска живет, пока идет гонка, и удаляется при любом выходе
+    with tempfile.TemporaryDirectory(prefix="chart_sample_") as sample_dir:
+        sample_files = None
+        if dry_run:
+            try:
+                sample_files = make_sample_files([data_path], sample_dir)
+            except Exception as e:
+                st.warning(f"Не удалось подготовить выборку, пробный запуск пропущен: {e}")
+
+        def validate(text):
+            return validate_chart_code(clean_gemini_code(text), sample_files=sample_files, chart_key=py_name[:-3])
+
+        with st.status(f"⚡ Генерация на {len(targets)} моделях...", expanded=True) as status:
+            for res in race_llm(targets, CHART_SYSTEM_PROMPT, final_prompt, validate=validate,
+                                stop_on_first_valid=not pick_manually, use_cache=use_cache):
+                icon = "✅" if res["valid"] else "❌"
+                st.write(f"{icon} **{res['provider']} / {res['model']}** — {res['elapsed']:.1f} c. {'' if res['valid'] else res['message']}")
+                candidates.append(res)
+
+            valid = [c for c in candidates if c["valid"]]
+            if not valid:
+                status.update(label="Ни одна модель не вернула валидный код", state="error")
+                st.session_state.gen_prompt = final_prompt
+                return
+            status.update(label=f"Готово: валидных ответов {len(valid)}", state="complete", expanded=False)
+
+    if pick_manually:
+        # Выбор рисуется ниже в этом же проходе (_candidates_picker)
+        st.session_state.wiz_candidates = {"py_name": py_name, "prompt": final_prompt, "results": valid}
+        return
+
+    winner = valid[0]
+    save_generated_chart(py_name, clean_gemini_code(winner["text"]), winner["provider"], winner["model"], final_prompt)
+    st.success(f"✅ График сгенерирован через {winner['provider']} ({winner['model']})!")
+    time.sleep(1)
+    st.rerun()
+
+def _candidates_picker():
+    """Показывает валидные варианты из параллельной генерации и сохраняет выбранный."""
+    data = st.session_state.wiz_candidates
+    results = data["results"]
+
+    st.divider()
+    st.write("### 4. Выберите вариант")
+    labels = [f"{r['provider']} / {r['model']} ({r['elapsed']:.1f} c.)" for r in results]
+    idx = st.radio("Вариант", range(len(results)), format_func=lambda i: labels[i], key="wiz_cand_idx")
+    st.code(clean_gemini_code(results[idx]["text"]), language="python")
+
+    c_save, c_drop = st.columns(2)
+    if c_save.button("💾 Сохранить выбранный", type="primary", use_container_width=True, key="wiz_cand_save"):
+        chosen = results[idx]
+        save_generated_chart(data["py_name"], clean_gemini_code(chosen["text"]), chosen["provider"], chosen["model"], data["prompt"])
+        del st.session_state.wiz_candidates
+        st.success("✅ График сохранен!")
+        time.sleep(1)
+        st.rerun()
+    if c_drop.button("❌ Отменить", use_container_width=True, key="wiz_cand_drop"):
+        del st.session_state.wiz_candidates
+        st.rerun()
                         
 # --- WIZARD: MANAGE SOURCES (FIXED: NO RERUN) ---
 @st.dialog("⚙️ Пайплайн данных", width="large")
@@ -482,6 +576,20 @@ def wizard_manage_sources():
             except: h_idx = 0
             src["handler"] = st.selectbox("ETL Обработчик", handlers_list, index=h_idx, key=f"h_{i}")
 
+            # 5. Проекция колонок по коду графиков (modules/column_usage.py)
+            from modules.column_usage import source_columns
+            used_cols, used_note = source_columns(src)
+            src["project_columns"] = st.checkbox(
+                "✂️ Загружать только колонки, которые используют графики", value=src.get("project_columns", False),
+                key=f"proj_{i}", disabled=used_cols is None and not src.get("project_columns", False),
+                help="Колонки находятся анализом кода графиков и обработчика. После правки графика, "
+                     "которому нужна новая колонка, обновите источник."
+            )
+            if used_cols:
+                st.caption(f"Нужно колонок: {len(used_cols)} ({used_note}) — " + ", ".join(f"`{c}`" for c in used_cols[:20]))
+            else:
+                st.caption(f"Проекция недоступна: {used_note}")
+
     st.divider()
 
     # --- КНОПКА СОХРАНЕНИЯ ---
@@ -596,6 +704,18 @@ def wizard_manage_llm():
     
     # 1. СПИСОК СУЩЕСТВУЮЩИХ
     with tab_list:
+        # Статистика кэша ответов
+        from modules import llm_cache
+        stats = llm_cache.get_stats()
+        c_st, c_clr = st.columns([0.75, 0.25], vertical_alignment="center")
+        c_st.caption(
+            f"♻️ Кэш ответов: {stats['entries']} шт. ({stats['size_mb']:.1f} MB) · "
+            f"попаданий {stats['hits']} / промахов {stats['misses']} ({stats['hit_rate']:.0%})"
+        )
+        if c_clr.button("🧹 Очистить", key="clear_llm_cache", use_container_width=True):
+            llm_cache.clear()
+            st.rerun()
+
         providers = get_providers()
         if not providers:
             st.info("Нет настроенных интеграций.")
@@ -604,6 +724,8 @@ def wizard_manage_llm():
                 with st.expander(f"🔌 {name} ({data['type']})"):
                     st.write(f"**Models:** {', '.join(data['models'])}")
                     st.write(f"**Base URL:** {data['base_url'] if data['base_url'] else 'Default'}")
+                    if data.get("api_endpoint"):
+                        st.write(f"**API endpoint:** {data['api_endpoint']}")
                     
                     c1, c2 = st.columns([0.8, 0.2])
                     if c2.button("🗑️ Удалить", key=f"del_prov_{name}"):
@@ -619,7 +741,13 @@ def wizard_manage_llm():
         
         col_type, col_url = st.columns(2)
         p_type = col_type.selectbox("Тип API", ["openai", "deepseek", "gemini", "other"], help="DeepSeek и 'other' используют формат OpenAI")
-        base_url = col_url.text_input("Base URL (Прокси)", placeholder="https://api.openai.com/v1", help="Оставьте пустым для стандарта")
+        if p_type == "gemini":
+            base_url = ""
+            api_endpoint = col_url.text_input("API endpoint (хост)", placeholder="gemini-proxy.company.local:8443",
+                                              help="Только хост[:порт], без пути. Оставьте пустым для стандарта (gRPC)")
+        else:
+            api_endpoint = ""
+            base_url = col_url.text_input("Base URL (Прокси)", placeholder="https://api.openai.com/v1", help="Оставьте пустым для стандарта")
         
         api_key = st.text_input("API Key", type="password")
         
@@ -630,9 +758,13 @@ def wizard_manage_llm():
         
         if st.button("💾 Сохранить интеграцию", type="primary"):
             if new_name and api_key and models_str:
-                save_provider(new_name, p_type, api_key, base_url, models_str)
-                st.success(f"Интеграция '{new_name}' сохранена!")
-                time.sleep(1)
-                st.rerun()
+                try:
+                    save_provider(new_name, p_type, api_key, base_url, models_str, api_endpoint=api_endpoint)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Интеграция '{new_name}' сохранена!")
+                    time.sleep(1)
+                    st.rerun()
             else:
                 st.error("Заполните Название, API Key и список моделей.")
\ No newline at end of file